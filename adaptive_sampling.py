@@ -0,0 +1,262 @@
+"""
+Adaptive Sampling
+=================
+Stratified, adaptively sized pixel samples for clustering an AOI with as
+few transferred pixels as the answer needs:
+
+1. Pilot: a small uniform sample gives the distribution of the alteration
+   score (weighted index sum) and a first clustering.
+2. Strata: score quantiles of the pilot split the AOI pixels into strata,
+   counted next to the data (no pixel transfer). Points are allocated in
+   proportion to stratum size times score spread (Neyman allocation) with a
+   floor per stratum, so rare high-alteration pixels are oversampled.
+3. Size: pixels needed per cluster for a target confidence-interval
+   half-width on every cluster mean (relative to the feature's spread over
+   the AOI), from the pilot's within-cluster spreads and each cluster's
+   expected share of the stratified sample, with a finite-population
+   correction for the AOI's pixel count.
+4. Rounds: stratified batches are drawn until the cluster means stop moving
+   and meet the target, or the planned size is reached. Every stratum's
+   pixels are put in one seeded random order and each round takes the
+   next range of it, so rounds never redraw a pixel.
+
+Every sampled pixel carries a design weight (stratum pixels / stratum
+samples), so weighted cluster statistics and areas stay unbiased.
+"""
+
+import math
+
+import numpy as np
+
+from backends import SCORE_WEIGHTS
+
+
+# Pilot score quantiles splitting the strata (bulk, upper, top 10%)
+SCORE_QUANTILES = (0.5, 0.9)
+
+# Smallest share of every batch given to each non-empty stratum
+MIN_STRATUM_SHARE = 0.2
+
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+
+
+def alteration_score(X):
+    """Weighted index sum (same weights as the cluster priority score)."""
+    return np.asarray(X, dtype=np.float64) @ np.asarray(SCORE_WEIGHTS)
+
+
+def stratum_edges(scores, quantiles=SCORE_QUANTILES):
+    """Score thresholds between strata (duplicates dropped)."""
+    return np.unique(np.quantile(scores, quantiles)).tolist()
+
+
+def assign_strata(scores, edges):
+    """Stratum of every score: the number of edges it exceeds."""
+    return np.searchsorted(np.asarray(edges, dtype=np.float64), scores, side='left')
+
+
+def allocate(counts, spreads, n, min_share=MIN_STRATUM_SHARE):
+    """
+    Points per stratum for a batch of ``n``.
+
+    Args:
+        counts (np.ndarray): Pixels per stratum in the AOI
+        spreads (np.ndarray): Score standard deviation per stratum
+        n (int): Batch size
+        min_share (float): Floor on each non-empty stratum's share
+
+    Returns:
+        np.ndarray: Integer points per stratum (at most the stratum size)
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    present = counts > 0
+    if not present.any():
+        return np.zeros(len(counts), dtype=np.int64)
+    share = counts * np.maximum(np.asarray(spreads, dtype=np.float64), 1e-9)
+    share = np.where(present, np.maximum(share / share.sum(), min_share), 0.0)
+    share /= share.sum()
+    return np.minimum(np.round(share * n), counts).astype(np.int64)
+
+
+def design_weights(strata, counts):
+    """Pixels each sample stands for: stratum size / stratum samples."""
+    strata = np.asarray(strata, dtype=np.int64)
+    sampled = np.bincount(strata, minlength=len(counts))
+    return np.asarray(counts, dtype=np.float64)[strata] / np.maximum(sampled[strata], 1)
+
+
+def cluster_spreads(X, labels, weights, n_clusters):
+    """
+    Weighted per-cluster feature standard deviations and effective sizes.
+
+    Returns:
+        tuple: (std (k, n_features), n_eff (k,)) - n_eff is Kish's
+        effective sample size (sum w)^2 / sum w^2
+    """
+    w_sum = np.bincount(labels, weights=weights, minlength=n_clusters)
+    w_sq = np.bincount(labels, weights=weights * weights, minlength=n_clusters)
+    safe = np.maximum(w_sum, 1e-12)
+    std = np.empty((n_clusters, X.shape[1]))
+    for j in range(X.shape[1]):
+        column = X[:, j].astype(np.float64)
+        mean = np.bincount(labels, weights=weights * column, minlength=n_clusters) / safe
+        sq = np.bincount(labels, weights=weights * column * column, minlength=n_clusters) / safe
+        std[:, j] = np.sqrt(np.maximum(sq - mean ** 2, 0))
+    n_eff = w_sum ** 2 / np.maximum(w_sq, 1e-12)
+    return std, n_eff
+
+
+def half_widths(X, labels, weights, n_clusters, scale, z=Z_95):
+    """Largest CI half-width of each cluster's feature means, in units of ``scale``."""
+    std, n_eff = cluster_spreads(X, labels, weights, n_clusters)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        width = z * std / np.sqrt(n_eff)[:, None] / scale
+    return np.where(n_eff[:, None] > 1, width, np.inf).max(axis=1)
+
+
+def planned_size(X, labels, n_clusters, scale, sample_share, population, tolerance,
+                 z=Z_95):
+    """
+    Sample size for a ``tolerance`` half-width on every cluster mean.
+
+    Args:
+        X, labels: Pilot features and cluster labels
+        scale (np.ndarray): Per-feature spread over the AOI
+        sample_share (np.ndarray): Expected share of each cluster in the
+            stratified sample
+        population (int): Valid pixels in the AOI (finite-population correction)
+        tolerance (float): Target half-width, in units of ``scale``
+
+    Returns:
+        int: Planned number of pixels
+    """
+    std, _ = cluster_spreads(X, labels, np.ones(len(X)), n_clusters)
+    per_cluster = (z * std / (tolerance * scale)).max(axis=1) ** 2
+    present = sample_share > 0
+    if not present.any():
+        return len(X)
+    n0 = float(np.max(per_cluster[present] / sample_share[present]))
+    if population > 0:
+        n0 = n0 / (1 + n0 / population)
+    return int(math.ceil(n0))
+
+
+class AdaptiveSampler:
+    """
+    Draws a stratified sample in rounds until the clustering converges.
+
+    Args:
+        draw (callable): ``draw(points_per_stratum, edges, ranges, seed)``
+            returning (X, coords, strata) for a stratified sample of the
+            AOI; ``ranges`` is the (start, stop) share of each stratum's
+            seeded random pixel order to take, disjoint across rounds
+        count (callable): ``count(edges)`` returning pixels per stratum
+        n_clusters (int): K-Means clusters
+        max_pixels (int): Cap on the adaptive sample
+        tolerance (float): Target half-width of the cluster means and
+            largest centroid shift between rounds, both relative to each
+            feature's spread over the AOI
+        rounds (int): The planned size is drawn in about this many batches
+        max_rounds (int): Hard limit on batches
+        random_state (int): Seed of the K-Means fits and sample draws
+    """
+
+    def __init__(self, draw, count, n_clusters, max_pixels, tolerance=0.05, rounds=4,
+                 max_rounds=8, random_state=42):
+        self.draw = draw
+        self.count = count
+        self.n_clusters = n_clusters
+        self.max_pixels = max_pixels
+        self.tolerance = tolerance
+        self.rounds = rounds
+        self.max_rounds = max_rounds
+        self.random_state = random_state
+
+    def run(self, X_pilot):
+        """
+        Sample adaptively, starting from a uniform pilot sample.
+
+        Returns:
+            tuple: (X, coords, weights, info) - weights are design weights
+            (pixels represented per sample); info summarizes the plan,
+            rounds and convergence
+        """
+        from sklearn.cluster import KMeans
+
+        k = self.n_clusters
+        scores = alteration_score(X_pilot)
+        edges = stratum_edges(scores)
+        pilot_strata = assign_strata(scores, edges)
+        n_strata = len(edges) + 1
+
+        counts = np.asarray(self.count(edges), dtype=np.float64)
+        population = int(counts.sum())
+        spreads = np.array([scores[pilot_strata == h].std() if np.any(pilot_strata == h)
+                            else 0.0 for h in range(n_strata)])
+
+        # Pilot clustering: spreads per cluster and where the clusters live
+        pilot = KMeans(n_clusters=k, random_state=self.random_state, n_init=3).fit(X_pilot)
+        scale = np.maximum(X_pilot.std(axis=0).astype(np.float64), 1e-6)
+        alloc_share = allocate(counts, spreads, 10 ** 6) / 1e6
+        in_stratum = np.zeros((n_strata, k))
+        np.add.at(in_stratum, (pilot_strata, pilot.labels_), 1)
+        in_stratum /= np.maximum(in_stratum.sum(axis=1, keepdims=True), 1)
+        sample_share = alloc_share @ in_stratum
+
+        planned = planned_size(X_pilot, pilot.labels_, k, scale, sample_share, population,
+                               self.tolerance)
+        planned = int(min(max(planned, len(X_pilot)), self.max_pixels, max(population, 1)))
+        batch = max(int(math.ceil(planned / self.rounds)), 4 * k)
+
+        X = np.empty((0, X_pilot.shape[1]), dtype=np.float32)
+        coords = np.empty((0, 2))
+        strata = np.empty(0, dtype=np.int64)
+        centers = pilot.cluster_centers_
+        drawn = np.zeros(n_strata)
+        history = []
+        converged = False
+
+        for _ in range(self.max_rounds):
+            n_next = min(batch, planned - len(X))
+            if n_next <= 0:
+                break
+            points = np.minimum(allocate(counts, spreads, n_next), counts - drawn)
+            if points.sum() <= 0:
+                break
+            safe = np.maximum(counts, 1)
+            ranges = np.column_stack([drawn / safe, (drawn + points) / safe])
+            Xb, cb, sb = self.draw(points.astype(np.int64), edges, ranges, self.random_state)
+            drawn += points
+            if len(Xb) == 0:
+                break
+            X = np.concatenate([X, Xb])
+            coords = np.concatenate([coords, cb])
+            strata = np.concatenate([strata, np.asarray(sb, dtype=np.int64)])
+            if len(X) <= k:
+                continue
+
+            weights = design_weights(strata, counts)
+            fit = KMeans(n_clusters=k, init=centers, n_init=1,
+                         random_state=self.random_state).fit(X, sample_weight=weights)
+            shift = float(np.max(np.abs(fit.cluster_centers_ - centers) / scale))
+            width = float(np.max(half_widths(X, fit.labels_, weights, k, scale)))
+            centers = fit.cluster_centers_
+            history.append({'n': len(X), 'centroid_shift': round(shift, 4),
+                            'half_width': round(width, 4)})
+            if shift <= self.tolerance and width <= self.tolerance:
+                converged = True
+                break
+
+        info = {
+            'pilot': len(X_pilot),
+            'planned': planned,
+            'sampled': len(X),
+            'population': population,
+            'strata_edges': [round(e, 4) for e in edges],
+            'strata_pixels': counts.astype(np.int64).tolist(),
+            'strata_samples': np.bincount(strata, minlength=n_strata).tolist(),
+            'rounds': history,
+            'converged': converged
+        }
+        return X, coords, design_weights(strata, counts), info
@@ -2,18 +2,135 @@
 Mineral Exploration Analysis Engine
 =====================================
 Core module for satellite-based hydrothermal alteration zone detection
-using Google Earth Engine and Sentinel-2 imagery.
+using Sentinel-2 imagery on Google Earth Engine or local band stacks.
 
 Target: Chile's IV Region (Coquimbo/La Serena) - Copper Exploration
 Author: Data Science Portfolio Project
 """
 
-import ee
 import numpy as np
-from sklearn.cluster import KMeans
+import contextvars
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import pandas as pd
 
+from backends import EarthEngineBackend, FEATURE_BANDS
+from adaptive_sampling import AdaptiveSampler
+from classification import CHUNK_PIXELS, NODATA, classify_arrays, classify_scene
+from centroid_store import CentroidStore
+from cluster_stats import StreamingClusterStats, grouped_cluster_stats
+from cluster_table import SUB_TARGET_DTYPE, ClusterTable
+from instrumentation import RunProfile, annotate, record
+from k_selection import select_k
+from regional_scan import (REGION_IV_BOUNDS, SCAN_LEVELS, RefinementQueue, anomaly_score,
+                           box_area_km2, box_grid, split_box)
+from request_scheduler import RemoteCallFailed, RequestScheduler, shared_scheduler
+from single_flight import SingleFlight
+from tile_pyramid import PRIORITY_RGBA, TILE_ZOOMS, TilePyramid, robust_range
+
+
+# Radii above this are analyzed tile by tile (single composites hit GEE limits)
+MAX_SINGLE_RADIUS_KM = 25
+DEFAULT_TILE_KM = 20
+
+# Streaming clustering: pixels per sample pull and per mini-batch update
+STREAM_CHUNK_SIZE = 50_000
+MINI_BATCH_SIZE = 4096
+
+# Automatic cluster count (n_clusters='auto'): candidate range, scoring
+# method, subsample size and time budget of the sweep
+K_RANGE = (2, 8)
+K_SELECTION_METHOD = 'calinski_harabasz'
+K_SELECTION_SAMPLES = 5000
+K_SELECTION_BUDGET_S = 15.0
+
+# Drill targets: minimum spacing between recommended collars, and the
+# smallest connected group of samples kept as a sub-target
+MIN_DRILL_SPACING_KM = 0.5
+MIN_SUB_TARGET_POINTS = 5
+
+# A warm-started fit is kept unless its inertia per sample is this much
+# worse than the stored fit it started from
+WARM_START_TOLERANCE = 0.25
+
+# Regional scan: coarse tile edge, compute budget (fraction of a uniform
+# finest-level pass) and the smallest anomaly score worth refining
+SCAN_TILE_KM = 20
+SCAN_BUDGET_FRACTION = 0.25
+SCAN_MIN_SCORE = 0.05
+
+# Share of the scan budget kept for refinement (the coarse pass samples
+# fewer pixels per tile if needed, but never fewer than the floor)
+SCAN_REFINE_SHARE = 0.5
+SCAN_MIN_TILE_PIXELS = 200
+
+# Map tile overlays (tile_dir): pixel budget and finest scale (m) of the
+# rasters they are rendered from, and the index layers shown
+TILE_RASTER_PIXELS = 1_000_000
+TILE_RASTER_MIN_SCALE = 20
+TILE_INDEX_LAYERS = ['iron_oxide', 'clay_minerals']
+
+# Adaptive sampling (sampling='adaptive'): uniform pilot size and the target
+# confidence half-width / convergence of cluster means, relative to each
+# index's spread over the AOI
+ADAPTIVE_PILOT_PIXELS = 500
+ADAPTIVE_TOLERANCE = 0.1
+
+
+def _resolve_date_window(start_date=None, end_date=None):
+    """Fill in the default date range: last 6 months up to today."""
+    if end_date is None:
+        end_date = datetime.now().strftime('%Y-%m-%d')
+    if start_date is None:
+        start = datetime.now() - timedelta(days=180)
+        start_date = start.strftime('%Y-%m-%d')
+    return start_date, end_date
+
+
+def analysis_key(lat, lon, radius_km=10, start_date=None, end_date=None,
+                 cloud_cover_max=20, clustering='client', tile_km=None,
+                 num_pixels=5000, scale=60, n_clusters=4, sampling='fixed'):
+    """
+    Normalized identity of an analysis request.
+    
+    Coordinates are rounded to 1e-5 degrees (~1 m), numbers are compared as
+    floats and the default date window is resolved, so requests that would
+    compute the same result get the same key.
+    
+    Returns:
+        tuple: Hashable key
+    """
+    start_date, end_date = _resolve_date_window(start_date, end_date)
+    return (round(float(lat), 5), round(float(lon), 5), float(radius_km),
+            str(start_date), str(end_date), float(cloud_cover_max), clustering,
+            None if tile_km is None else float(tile_km), int(num_pixels), float(scale),
+            str(n_clusters), sampling)
+
+
+def analysis_id(key):
+    """Short stable identifier of an analysis key (file names, cache keys)."""
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:16]
+
+
+def _match_cluster_ids(kmeans, previous_centroids):
+    """
+    Renumber a fitted KMeans so each cluster takes the id of the closest
+    previous centroid (one-to-one assignment), keeping ids stable across runs.
+    """
+    from scipy.optimize import linear_sum_assignment
+    
+    cost = np.linalg.norm(previous_centroids[:, None, :] - kmeans.cluster_centers_[None, :, :],
+                          axis=2)
+    _, order = linear_sum_assignment(cost)
+    new_ids = np.empty_like(order)
+    new_ids[order] = np.arange(len(order))
+    
+    kmeans.cluster_centers_ = kmeans.cluster_centers_[order]
+    kmeans.labels_ = new_ids[kmeans.labels_]
+
 
 class MineralExplorationAnalyzer:
     """
@@ -21,37 +138,36 @@ class MineralExplorationAnalyzer:
     associated with copper mineralization (iron oxides, clay minerals).
     """
     
-    def __init__(self):
-        """Initialize Google Earth Engine with support for Streamlit Cloud"""
-        try:
-            # Check if running on Streamlit Cloud (secrets available)
-            try:
-                import streamlit as st
-                if 'gee' in st.secrets:
-                    # Use service account authentication for Streamlit Cloud
-                    credentials = ee.ServiceAccountCredentials(
-                        email=st.secrets['gee']['client_email'],
-                        key_data=st.secrets['gee']['private_key']
-                    )
-                    ee.Initialize(credentials)
-                    print("✅ Google Earth Engine initialized (Streamlit Cloud)")
-                else:
-                    # Local development - use standard authentication
-                    ee.Initialize()
-                    print("✅ Google Earth Engine initialized (Local)")
-            except ImportError:
-                # Streamlit not available - local development
-                ee.Initialize()
-                print("✅ Google Earth Engine initialized (Local)")
-                
-        except Exception as e:
-            print(f"❌ GEE initialization error: {e}")
-            print("💡 Run: earthengine authenticate")
-            try:
-                import streamlit as st
-                st.error("Google Earth Engine authentication failed. Check secrets configuration.")
-            except ImportError:
-                pass
+    def __init__(self, backend=None, sample_cache=None, credentials=None, scheduler=None,
+                 centroid_store=None):
+        """
+        Initialize the analyzer.
+        
+        Args:
+            backend: Raster backend (default: EarthEngineBackend, which
+                initializes Google Earth Engine). Pass a LocalRasterBackend
+                to run the pipeline offline on local band stacks.
+            sample_cache (SampleCache): Optional on-disk cache of sample pulls
+            credentials: GEE service-account dict or JSON key path for the
+                default backend (see EarthEngineBackend)
+            scheduler (RequestScheduler): Scheduler the backend's blocking
+                calls go through (default: the process-wide Earth Engine
+                scheduler for remote backends, retries only for local ones)
+            centroid_store (CentroidStore): Optional store of fitted centroids
+                used to warm-start clustering near previous runs
+        """
+        if backend is None:
+            backend = EarthEngineBackend(credentials=credentials)
+        if scheduler is None:
+            if getattr(backend, 'remote', False):
+                scheduler = shared_scheduler()
+            else:
+                scheduler = RequestScheduler(max_concurrent=None)
+        self.backend = backend
+        self.scheduler = scheduler
+        self.centroid_store = centroid_store
+        self.sample_cache = sample_cache
+        self.flights = SingleFlight()
     
     def get_sentinel2_data(self, lat, lon, radius_km=10, start_date=None, end_date=None, 
                           cloud_cover_max=20):
@@ -67,35 +183,16 @@ class MineralExplorationAnalyzer:
             cloud_cover_max (int): Maximum cloud cover percentage
             
         Returns:
-            ee.Image: Median composite of Sentinel-2 imagery
+            tuple: (composite, aoi) - median composite and area of interest
         """
         # Default date range: last 6 months
-        if end_date is None:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        if start_date is None:
-            start = datetime.now() - timedelta(days=180)
-            start_date = start.strftime('%Y-%m-%d')
+        start_date, end_date = _resolve_date_window(start_date, end_date)
         
         # Define area of interest (circular buffer)
-        point = ee.Geometry.Point([lon, lat])
-        aoi = point.buffer(radius_km * 1000)  # Convert km to meters
-        
-        # Fetch Sentinel-2 Surface Reflectance data
-        s2_collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-            .filterBounds(aoi) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', cloud_cover_max))
-        
-        # Cloud masking function
-        def mask_clouds(image):
-            qa = image.select('QA60')
-            # Bits 10 and 11 are clouds and cirrus
-            cloud_mask = qa.bitwiseAnd(1 << 10).eq(0).And(
-                        qa.bitwiseAnd(1 << 11).eq(0))
-            return image.updateMask(cloud_mask).divide(10000)  # Scale to reflectance
-        
-        # Apply cloud mask and get median composite
-        s2_composite = s2_collection.map(mask_clouds).median().clip(aoi)
+        aoi = self.backend.make_aoi(lat, lon, radius_km)
+        
+        # Cloud-masked median composite clipped to the AOI
+        s2_composite = self.backend.get_composite(aoi, start_date, end_date, cloud_cover_max)
         
         return s2_composite, aoi
     
@@ -107,304 +204,1280 @@ class MineralExplorationAnalyzer:
         - Iron Oxide Index: (B4 - B2) / (B4 + B2)
         - Clay Minerals: B11 / B12 (SWIR ratio)
         - NDVI: (B8 - B4) / (B8 + B4) - for vegetation masking
+        - Ferrous Iron: B12 / B8
         
         Args:
-            image (ee.Image): Sentinel-2 image
+            image: Sentinel-2 image (ee.Image or LocalScene)
             
         Returns:
-            dict: Dictionary of index images
+            Image of the same type with the index bands added
         """
-        # Band selection
-        red = image.select('B4')
-        blue = image.select('B2')
-        nir = image.select('B8')
-        swir1 = image.select('B11')
-        swir2 = image.select('B12')
-        
-        # Iron Oxide Index (Ferric Iron)
-        # High values = iron oxide presence (gossans, oxidized zones)
-        iron_oxide = red.subtract(blue).divide(red.add(blue)).rename('iron_oxide')
-        
-        # Clay Minerals Index (Hydroxyl-bearing minerals)
-        # High values = clay alteration (kaolinite, alunite)
-        clay_minerals = swir1.divide(swir2).rename('clay_minerals')
-        
-        # NDVI for vegetation masking
-        # Exclude vegetated areas (false positives)
-        ndvi = nir.subtract(red).divide(nir.add(red)).rename('ndvi')
-        
-        # Ferrous Iron Index (additional indicator)
-        # B12 / B8 ratio
-        ferrous_iron = swir2.divide(nir).rename('ferrous_iron')
-        
-        # Combine all indices
-        indices = image.addBands([iron_oxide, clay_minerals, ndvi, ferrous_iron])
-        
-        return indices
+        return self.backend.calculate_band_ratios(image)
     
     def identify_alteration_zones(self, image_with_indices, aoi, n_clusters=4, 
-                                  ndvi_threshold=0.3):
+                                  ndvi_threshold=0.3, cache_params=None,
+                                  clustering='client', num_pixels=5000, scale=60,
+                                  sampling='fixed'):
         """
         Apply K-Means clustering to identify alteration zones.
         
         Args:
-            image_with_indices (ee.Image): Image with calculated indices
-            aoi (ee.Geometry): Area of interest
-            n_clusters (int): Number of clusters for K-Means
+            image_with_indices: Image with calculated indices
+            aoi: Area of interest (backend-specific)
+            n_clusters (int): Number of clusters for K-Means, or 'auto' to
+                choose it with a scored sweep (see select_k)
             ndvi_threshold (float): NDVI threshold to mask vegetation
+            cache_params (dict): Request parameters identifying the sample
+                (location, date window, cloud cover) for the sample cache
+                and the centroid store
+            clustering (str): 'client' pulls sampled pixels and clusters them
+                with scikit-learn; 'server' trains and classifies next to the
+                data and only returns per-cluster aggregates and true areas;
+                'streaming' pulls a large sample in chunks into mini-batch
+                K-Means with bounded memory
+            num_pixels (int): Pixels sampled (training pixels in server mode);
+                the upper bound of an adaptive sample
+            scale (float): Sampling scale in meters
+            sampling (str): 'fixed' samples ``num_pixels`` uniformly;
+                'adaptive' (client clustering) sizes a stratified sample from
+                the AOI and a target confidence on the cluster means and
+                stops once they converge (see adaptive_sampling)
             
         Returns:
-            tuple: (clustered_image, cluster_stats, drill_targets)
+            ClusterTable: Cluster statistics sorted by confidence (None on failure)
         """
-        # Mask out vegetation (NDVI > threshold)
-        non_veg_mask = image_with_indices.select('ndvi').lt(ndvi_threshold)
-        masked_indices = image_with_indices.updateMask(non_veg_mask)
-        
-        # Select features for clustering
-        features = masked_indices.select(['iron_oxide', 'clay_minerals', 'ferrous_iron'])
-        
-        # Sample points for clustering (for performance)
-        sample = features.sample(
-            region=aoi,
-            scale=60,  # 60m resolution (faster processing)
-            numPixels=5000,
-            geometries=True
-        )
-        
-        # Get sample data as numpy array
         try:
-            sample_data = sample.getInfo()
-            
-            # Extract feature values
-            feature_list = []
-            coords_list = []
-            
-            for feature in sample_data['features']:
-                props = feature['properties']
-                coords = feature['geometry']['coordinates']
-                
-                # Skip if any value is None/null
-                if all(props.get(band) is not None for band in ['iron_oxide', 'clay_minerals', 'ferrous_iron']):
-                    feature_list.append([
-                        props['iron_oxide'],
-                        props['clay_minerals'],
-                        props['ferrous_iron']
-                    ])
-                    coords_list.append(coords)
+            if clustering == 'server':
+                if n_clusters == 'auto':
+                    # Choose k on a small client-side sample first
+                    X, _ = self.scheduler.call(
+                        self.backend.sample_features,
+                        image_with_indices, aoi, ndvi_threshold=ndvi_threshold,
+                        scale=scale, num_pixels=K_SELECTION_SAMPLES
+                    )
+                    n_clusters = self._select_k(X)
+                stats = self.scheduler.call(
+                    self.backend.cluster_aggregates,
+                    image_with_indices, aoi,
+                    n_clusters=n_clusters,
+                    ndvi_threshold=ndvi_threshold,
+                    scale=scale,
+                    num_pixels=num_pixels
+                )
+                if 'cluster_centers' in stats:
+                    annotate('cluster_centers', stats['cluster_centers'])
+                return self._build_cluster_records(stats, area_km2=stats['area_km2'])
             
-            # Convert to numpy array
-            X = np.array(feature_list)
-            coords_array = np.array(coords_list)
+            if clustering == 'streaming':
+                stats = self._cluster_streaming(image_with_indices, aoi, n_clusters,
+                                                ndvi_threshold, scale, num_pixels,
+                                                request=cache_params)
+                if stats is None:
+                    return None
+                return self._build_cluster_records(stats, area_km2=stats['area_km2'])
             
-            # Apply K-Means clustering
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-            cluster_labels = kmeans.fit_predict(X)
+            if sampling == 'adaptive':
+                X, coords_array, weights, n_clusters = self._sample_adaptive(
+                    image_with_indices, aoi, n_clusters, ndvi_threshold, scale, num_pixels)
+                return self._cluster_samples(X, coords_array, n_clusters, request=cache_params,
+                                             scale=scale, sample_weight=weights)
             
-            # Analyze clusters to identify high-priority zones
-            cluster_stats = self._analyze_clusters(X, cluster_labels, kmeans, coords_array)
+            # Sample non-vegetated pixels (60m resolution for faster processing)
+            X, coords_array = self._sample_features(
+                image_with_indices, aoi,
+                ndvi_threshold=ndvi_threshold,
+                scale=scale,
+                num_pixels=num_pixels,
+                cache_params=cache_params
+            )
             
-            return cluster_stats
+            return self._cluster_samples(X, coords_array, n_clusters, request=cache_params,
+                                         scale=scale)
             
+        except RemoteCallFailed:
+            # Throttling/outage, not an absence of alteration: report it
+            raise
         except Exception as e:
             print(f"Clustering error: {e}")
             return None
     
-    def _analyze_clusters(self, features, labels, kmeans, coords):
+    def _cluster_samples(self, X, coords, n_clusters, request=None, scale=60,
+                         sample_weight=None):
         """
-        Analyze clusters to prioritize drill targets.
+        Fit K-Means on sampled features and analyze the resulting clusters.
         
-        High-priority zones: High iron oxide + high clay minerals
+        With a centroid store and the request's location and date window,
+        the fit starts from the centroids of a nearby previous run (single
+        init). If that fit is clearly worse than the stored one, a full fit
+        is done instead and its clusters are matched to the previous ids.
+        ``sample_weight`` (design weights of a stratified sample) weights
+        the fit and the cluster statistics.
         """
-        cluster_data = []
+        from sklearn.cluster import KMeans
         
-        for cluster_id in range(kmeans.n_clusters):
-            cluster_mask = labels == cluster_id
-            cluster_features = features[cluster_mask]
-            cluster_coords = coords[cluster_mask]
-            
-            if len(cluster_features) == 0:
-                continue
-            
-            # Calculate cluster statistics
-            mean_iron = np.mean(cluster_features[:, 0])
-            mean_clay = np.mean(cluster_features[:, 1])
-            mean_ferrous = np.mean(cluster_features[:, 2])
-            
-            # Priority score: weighted combination of indices
-            # Iron oxide (40%) + Clay minerals (40%) + Ferrous iron (20%)
-            priority_score = (mean_iron * 0.4) + (mean_clay * 0.4) + (mean_ferrous * 0.2)
+        if n_clusters == 'auto':
+            n_clusters = self._select_k(X)
+        
+        group = previous = None
+        if self.centroid_store is not None and request is not None:
+            group = CentroidStore.group(FEATURE_BANDS, n_clusters,
+                                        request['start_date'], request['end_date'])
+            previous = self.centroid_store.get(group, request['lat'], request['lon'])
+        
+        # Weights scaled to mean 1 keep inertia per sample comparable
+        fit_weight = None
+        if sample_weight is not None:
+            fit_weight = sample_weight * (len(X) / sample_weight.sum())
+        
+        kmeans = None
+        if previous is not None:
+            centroids, previous_inertia = previous
+            warm = KMeans(n_clusters=n_clusters, init=centroids, n_init=1,
+                          random_state=42).fit(X, sample_weight=fit_weight)
+            if warm.inertia_ / len(X) <= previous_inertia * (1 + WARM_START_TOLERANCE):
+                kmeans = warm
+                record('kmeans_warm_starts')
+            else:
+                record('kmeans_warm_start_fallbacks')
+        
+        if kmeans is None:
+            # Apply K-Means clustering
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42,
+                            n_init=10).fit(X, sample_weight=fit_weight)
+            if previous is not None:
+                _match_cluster_ids(kmeans, previous[0])
+        
+        cluster_labels = kmeans.labels_
+        record('n_samples', len(X))
+        record('kmeans_iterations', int(kmeans.n_iter_))
+        
+        annotate('cluster_centers', kmeans.cluster_centers_)
+        if group is not None:
+            self.centroid_store.put(group, request['lat'], request['lon'],
+                                    kmeans.cluster_centers_, kmeans.inertia_ / len(X))
+        
+        # Analyze clusters to identify high-priority zones
+        return self._analyze_clusters(X, cluster_labels, kmeans, coords, scale=scale,
+                                      request=request, weights=sample_weight)
+    
+    def _cluster_streaming(self, image_with_indices, aoi, n_clusters, ndvi_threshold, scale,
+                           num_pixels, chunk_size=STREAM_CHUNK_SIZE, request=None):
+        """
+        Mini-batch K-Means over a large pixel sample pulled in chunks.
+        
+        Pass 1 pulls every chunk once, updates the model incrementally and
+        spills the chunk to a temporary directory; pass 2 reads the chunks
+        back memory-mapped, labels them and accumulates per-cluster
+        statistics. Memory stays bounded by the chunk size.
+        
+        Returns:
+            dict: Per-cluster statistics (see grouped_cluster_stats) with
+            area_km2, or None if no pixels were sampled
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        
+        n_chunks = max(1, -(-num_pixels // chunk_size))
+        model = stats = None
+        
+        with tempfile.TemporaryDirectory(prefix='stream_chunks_') as spill_dir:
+            spilled = []
+            for chunk in range(n_chunks):
+                X, coords = self.scheduler.call(
+                    self.backend.sample_chunk,
+                    image_with_indices, aoi, ndvi_threshold=ndvi_threshold,
+                    scale=scale, num_pixels=num_pixels, chunk=chunk, n_chunks=n_chunks
+                )
+                record('stream_chunks')
+                if model is None and len(X):
+                    if n_clusters == 'auto':
+                        n_clusters = self._select_k(X)
+                    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3)
+                    stats = StreamingClusterStats(n_clusters, len(FEATURE_BANDS))
+                for start in range(0, len(X), MINI_BATCH_SIZE):
+                    batch = X[start:start + MINI_BATCH_SIZE]
+                    # The first update initializes the centers from the batch
+                    if len(batch) >= n_clusters or hasattr(model, 'cluster_centers_'):
+                        model.partial_fit(batch)
+                if len(X):
+                    paths = (os.path.join(spill_dir, f"{chunk}_X.npy"),
+                             os.path.join(spill_dir, f"{chunk}_coords.npy"))
+                    np.save(paths[0], X)
+                    np.save(paths[1], coords)
+                    spilled.append(paths)
             
-            # Normalize score to 0-100
-            confidence = min(max(priority_score * 100, 0), 100)
+            if model is None or not hasattr(model, 'cluster_centers_'):
+                return None
             
-            # Determine alteration type
-            if mean_iron > 0.2 and mean_clay > 1.1:
-                alteration_type = "Mixed (Iron Oxide + Clay)"
-                priority = "High"
-            elif mean_iron > 0.2:
-                alteration_type = "Iron Oxide Dominant"
-                priority = "Medium"
-            elif mean_clay > 1.1:
-                alteration_type = "Clay Dominant"
-                priority = "Medium"
-            else:
-                alteration_type = "Low Alteration"
-                priority = "Low"
+            for x_path, coords_path in spilled:
+                X = np.load(x_path, mmap_mode='r')
+                coords = np.load(coords_path, mmap_mode='r')
+                stats.update(X, model.predict(X), coords)
+        
+        record('n_samples', int(stats.counts.sum()))
+        record('minibatch_steps', int(model.n_steps_))
+        annotate('cluster_centers', model.cluster_centers_)
+        result = stats.result()
+        coords, labels = stats.subsample()
+        area_km2 = self._add_spatial_detail(result, coords, labels, request=request)
+        
+        # Sub-targets count retained subsample rows: scale them to the
+        # cluster's full pixel count so their share of it is unbiased
+        kept = np.bincount(labels, minlength=stats.n_clusters)
+        for cluster_id, targets in zip(result['cluster_id'], result.get('sub_targets', [])):
+            if len(targets):
+                targets['n_pixels'] = np.round(targets['n_pixels'] * stats.counts[cluster_id]
+                                               / max(kept[cluster_id], 1))
+        result['area_km2'] = area_km2 if area_km2 is not None else \
+            result['count'] * (scale / 1000) ** 2
+        return result
+    
+    def identify_alteration_zones_tiled(self, lat, lon, radius_km, start_date, end_date,
+                                        cloud_cover_max=20, tile_km=DEFAULT_TILE_KM,
+                                        max_workers=4, n_clusters=4, ndvi_threshold=0.3,
+                                        tile_num_pixels=5000, cache_params=None):
+        """
+        Tiled variant of the composite -> indices -> sample -> cluster pipeline
+        for large AOIs.
+        
+        The AOI is split into square tiles which are composited and sampled
+        concurrently (bounded worker pool); a single global K-Means model is
+        fitted on the pooled samples so cluster ids mean the same everywhere.
+        Each tile's sample is proportional to its area, so tiles clipped by
+        the AOI edge are not oversampled and the pooled sample stays
+        self-weighting.
+        
+        Args:
+            lat, lon (float): AOI center
+            radius_km (float): AOI radius
+            start_date, end_date (str): Date window 'YYYY-MM-DD'
+            cloud_cover_max (int): Maximum cloud cover percentage
+            tile_km (float): Tile edge length in kilometers
+            max_workers (int): Tiles fetched concurrently
+            n_clusters (int): Number of clusters for K-Means, or 'auto'
+            ndvi_threshold (float): NDVI threshold to mask vegetation
+            tile_num_pixels (int): Pixels sampled per full ``tile_km`` square
+            cache_params (dict): Request parameters for the sample cache
             
-            # Calculate centroid (representative location)
-            centroid_lon = np.mean(cluster_coords[:, 0])
-            centroid_lat = np.mean(cluster_coords[:, 1])
+        Returns:
+            tuple: (cluster_stats, n_tiles)
+        """
+        tiles = self.backend.make_tiles(lat, lon, radius_km, tile_km)
+        areas = self.scheduler.call(self.backend.tile_areas_km2, tiles)
+        tile_pixels = np.round(tile_num_pixels * areas / tile_km ** 2).astype(int)
+        
+        def sample_tile(item):
+            tile_id, tile = item
+            if tile_pixels[tile_id] <= 0:
+                return np.empty((0, len(FEATURE_BANDS))), np.empty((0, 2))
+            image = self.backend.get_composite(tile, start_date, end_date, cloud_cover_max)
+            indices = self.backend.calculate_band_ratios(image)
+            tile_params = None
+            if cache_params is not None:
+                tile_params = dict(cache_params, tile_km=tile_km, tile_id=tile_id)
+            return self._sample_features(indices, tile, ndvi_threshold=ndvi_threshold,
+                                         scale=60, num_pixels=int(tile_pixels[tile_id]),
+                                         cache_params=tile_params)
+        
+        # Tile workers inherit the caller's context (active RunProfile)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, sample_tile, item)
+                       for item in enumerate(tiles)]
+            samples = [future.result() for future in futures]
+        
+        # Pool the tile samples and fit one global model
+        samples = [(X, coords) for X, coords in samples if len(X)]
+        if not samples:
+            return None, len(tiles)
+        X = np.concatenate([X for X, _ in samples])
+        coords = np.concatenate([coords for _, coords in samples])
+        
+        return self._cluster_samples(X, coords, n_clusters, request=cache_params), len(tiles)
+    
+    def _sample_features(self, image_with_indices, aoi, ndvi_threshold, scale,
+                         num_pixels, cache_params=None):
+        """
+        Sample features through the backend, served from the sample cache
+        when the same request was pulled before.
+        """
+        source = getattr(self.backend, 'source', None)
+        if self.sample_cache is None or cache_params is None or source is None:
+            return self.scheduler.call(
+                self.backend.sample_features,
+                image_with_indices, aoi, ndvi_threshold=ndvi_threshold,
+                scale=scale, num_pixels=num_pixels
+            )
+        
+        key = self.sample_cache.make_key(
+            backend=f"{self.backend.name}:{source}",
+            ndvi_threshold=ndvi_threshold,
+            scale=scale,
+            num_pixels=num_pixels,
+            **cache_params
+        )
+        cached = self.sample_cache.get(key)
+        if cached is not None:
+            record('sample_cache_hits')
+            return cached
+        
+        X, coords = self.scheduler.call(
+            self.backend.sample_features,
+            image_with_indices, aoi, ndvi_threshold=ndvi_threshold,
+            scale=scale, num_pixels=num_pixels
+        )
+        ttl = self.sample_cache.ttl_for_window(cache_params.get('end_date'))
+        self.sample_cache.put(key, X, coords, ttl=ttl)
+        return X, coords
+    
+    def _sample_adaptive(self, image_with_indices, aoi, n_clusters, ndvi_threshold, scale,
+                         max_pixels):
+        """
+        Uniform pilot, then stratified rounds until the cluster means
+        converge (see AdaptiveSampler); the plan is attached to the run
+        results.
+        
+        Returns:
+            tuple: (X, coords, design weights, n_clusters) - 'auto' cluster
+            counts are resolved on the pilot
+        """
+        X_pilot, _ = self.scheduler.call(
+            self.backend.sample_features,
+            image_with_indices, aoi, ndvi_threshold=ndvi_threshold,
+            scale=scale, num_pixels=min(ADAPTIVE_PILOT_PIXELS, max_pixels)
+        )
+        if n_clusters == 'auto':
+            n_clusters = self._select_k(X_pilot)
+        
+        def draw(class_points, edges, ranges, seed):
+            return self.scheduler.call(
+                self.backend.sample_stratified,
+                image_with_indices, aoi, ndvi_threshold=ndvi_threshold, scale=scale,
+                edges=edges, class_points=class_points, ranges=ranges, seed=seed
+            )
+        
+        def count(edges):
+            return self.scheduler.call(
+                self.backend.stratum_counts,
+                image_with_indices, aoi, ndvi_threshold=ndvi_threshold, scale=scale,
+                edges=edges
+            )
+        
+        sampler = AdaptiveSampler(draw, count, n_clusters, max_pixels,
+                                  tolerance=ADAPTIVE_TOLERANCE)
+        X, coords, weights, info = sampler.run(X_pilot)
+        annotate('adaptive_sampling', info)
+        record('pixels_transferred', info['pilot'] + info['sampled'])
+        print(f"🎯 Adaptive sample: {info['sampled']:,} of {info['planned']:,} planned pixels "
+              f"({'converged' if info['converged'] else 'not converged'})")
+        return X, coords, weights, n_clusters
+    
+    def _select_k(self, X):
+        """
+        Cluster count for ``X`` from a parallel, subsampled, time-boxed
+        sweep over K_RANGE; the scores are attached to the run results.
+        """
+        selection = select_k(X, *K_RANGE, method=K_SELECTION_METHOD,
+                             max_samples=K_SELECTION_SAMPLES,
+                             time_budget_s=K_SELECTION_BUDGET_S)
+        annotate('k_selection', selection)
+        record('k_selection_s', selection['elapsed_s'])
+        print(f"🔢 Selected k={selection['k']} ({selection['method']})")
+        return selection['k']
+    
+    def _analyze_clusters(self, features, labels, kmeans, coords, scale=60, request=None,
+                          weights=None):
+        """
+        Analyze clusters to prioritize drill targets.
+        
+        High-priority zones: High iron oxide + high clay minerals
+        """
+        stats = grouped_cluster_stats(features, labels, coords, kmeans.n_clusters,
+                                      weights=weights)
+        area_km2 = self._add_spatial_detail(stats, coords, labels, request=request)
+        if area_km2 is None:
+            area_km2 = stats.get('weight', stats['count']) * (scale / 1000) ** 2
+        return self._build_cluster_records(stats, area_km2=area_km2)
+    
+    def _add_spatial_detail(self, stats, coords, labels, request=None):
+        """
+        Index the labeled samples spatially, split every cluster into
+        connected sub-targets (samples linked within twice the typical
+        sample spacing) and rasterize them into footprint polygons.
+        The index is attached to the run results.
+        
+        Returns:
+            np.ndarray: Geodesic area per cluster, or None with too few samples
+        """
+        from footprints import cluster_footprints
+        from spatial_index import SpatialIndex
+        
+        if len(coords) < 2:
+            return None
+        index = SpatialIndex(coords, labels)
+        spacing_km = index.spacing_km()
+        link_km = 2 * spacing_km
+        stats['sub_targets'] = [
+            index.sub_targets(cluster_id, link_km, min_points=MIN_SUB_TARGET_POINTS)
+            for cluster_id in stats['cluster_id']
+        ]
+        annotate('spatial_index', index)
+        record('sub_targets', sum(len(targets) for targets in stats['sub_targets']))
+        
+        aoi = None
+        if request is not None and 'radius_km' in request:
+            aoi = (request['lat'], request['lon'], request['radius_km'])
+        footprints = cluster_footprints(index, stats['cluster_id'],
+                                        stats.get('weight', stats['count']),
+                                        cell_km=spacing_km, max_distance_km=link_km, aoi=aoi)
+        stats['footprints'] = footprints['polygons']
+        annotate('valid_area_km2', round(footprints['valid_area_km2'], 2))
+        return footprints['area_km2']
+    
+    def _build_cluster_records(self, stats, area_km2=None):
+        """
+        Turn per-cluster statistics into a prioritized cluster table.
+        
+        Args:
+            stats (dict): Output of grouped_cluster_stats
+            area_km2 (np.ndarray): Per-cluster area (default: 60m pixel count)
             
-            cluster_data.append({
-                'cluster_id': cluster_id,
-                'latitude': centroid_lat,
-                'longitude': centroid_lon,
-                'confidence_score': round(confidence, 1),
-                'alteration_type': alteration_type,
-                'priority': priority,
-                'mean_iron_oxide': round(mean_iron, 3),
-                'mean_clay_minerals': round(mean_clay, 3),
-                'area_km2': round(len(cluster_features) * 0.0036, 2),  # 60m pixels
-                'n_pixels': len(cluster_features),
-                'sample_points': cluster_coords.tolist()[:10]  # First 10 points
-            })
-        
-        # Sort by confidence score
-        cluster_data.sort(key=lambda x: x['confidence_score'], reverse=True)
-        
-        return cluster_data
-    
-    def generate_drill_targets(self, cluster_stats, top_n=5):
+        Returns:
+            ClusterTable: One row per cluster, sorted by confidence score
+        """
+        if area_km2 is None:
+            area_km2 = stats['count'] * 0.0036  # 60m pixels
+        
+        mean = np.asarray(stats['mean'], dtype=np.float64).reshape(-1, len(FEATURE_BANDS))
+        mean_iron, mean_clay, mean_ferrous = mean.T
+        
+        # Priority score: weighted combination of indices
+        # Iron oxide (40%) + Clay minerals (40%) + Ferrous iron (20%)
+        priority_score = (mean_iron * 0.4) + (mean_clay * 0.4) + (mean_ferrous * 0.2)
+        
+        # Normalize score to 0-100
+        confidence = np.round(np.clip(priority_score * 100, 0, 100), 1)
+        
+        # Determine alteration type
+        iron, clay = mean_iron > 0.2, mean_clay > 1.1
+        conditions = [iron & clay, iron, clay]
+        alteration_type = np.select(
+            conditions, ["Mixed (Iron Oxide + Clay)", "Iron Oxide Dominant", "Clay Dominant"],
+            "Low Alteration").astype(object)
+        priority = np.select(conditions, ["High", "Medium", "Medium"], "Low").astype(object)
+        
+        # Centroid (mean location - may fall outside a scattered cluster)
+        centroid = np.asarray(stats['centroid'], dtype=np.float64).reshape(-1, 2)
+        n = len(centroid)
+        sub_targets = stats.get('sub_targets') or [np.empty(0, dtype=SUB_TARGET_DTYPE)] * n
+        
+        # Representative location: a sample of the largest connected part
+        lat, lon = centroid[:, 1].copy(), centroid[:, 0].copy()
+        for i, targets in enumerate(sub_targets):
+            if len(targets):
+                lat[i], lon[i] = targets[0]['latitude'], targets[0]['longitude']
+        
+        columns = {
+            'cluster_id': np.asarray(stats['cluster_id'], dtype=np.int64),
+            'latitude': lat,
+            'longitude': lon,
+            'centroid_latitude': centroid[:, 1],
+            'centroid_longitude': centroid[:, 0],
+            'confidence_score': confidence,
+            'alteration_type': alteration_type,
+            'priority': priority,
+            'mean_iron_oxide': mean_iron.round(3),
+            'mean_clay_minerals': mean_clay.round(3),
+            'mean_ferrous_iron': mean_ferrous.round(3),
+            'area_km2': np.asarray(area_km2, dtype=np.float64).round(2),
+            'n_pixels': np.asarray(stats['count'], dtype=np.int64)
+        }
+        
+        # Spread of each index within the cluster
+        for j, band in enumerate(FEATURE_BANDS):
+            if 'std' in stats:
+                columns[f'std_{band}'] = np.asarray(stats['std'])[:, j].round(3)
+            if 'p90' in stats:
+                columns[f'p90_{band}'] = np.asarray(stats['p90'])[:, j].round(3)
+        
+        # Sort by confidence score (stable: ties keep cluster order)
+        order = np.argsort(-confidence, kind='stable')
+        footprints = stats.get('footprints') or [[]] * n
+        return ClusterTable.from_parts(
+            {name: values[order] for name, values in columns.items()},
+            sample_points=[stats['sample_points'][i] for i in order],
+            sub_targets=[sub_targets[i] for i in order],
+            footprints=[footprints[i] for i in order]
+        )
+    
+    def generate_drill_targets(self, cluster_stats, top_n=5, min_spacing_km=MIN_DRILL_SPACING_KM):
         """
         Generate prioritized drill target recommendations.
         
+        Every connected sub-target of a High/Medium cluster is a candidate
+        (the cluster itself when it has none), taken in cluster confidence
+        order, largest sub-target first; candidates closer than
+        ``min_spacing_km`` to a better one are dropped.
+        
         Args:
-            cluster_stats (list): Cluster analysis results
+            cluster_stats (ClusterTable): Cluster analysis results
             top_n (int): Number of top targets to return
+            min_spacing_km (float): Minimum distance between targets
             
         Returns:
             pandas.DataFrame: Drill target table
         """
-        if not cluster_stats or len(cluster_stats) == 0:
+        from spatial_index import dedupe_targets
+        
+        if cluster_stats is None or len(cluster_stats) == 0:
             return pd.DataFrame()
+        table = cluster_stats
         
         # Filter high and medium priority targets
-        priority_targets = [c for c in cluster_stats if c['priority'] in ['High', 'Medium']]
+        clusters = np.flatnonzero(np.isin(table['priority'], ['High', 'Medium']))
+        
+        # One candidate per sub-target (or per cluster without any)
+        n_sub = np.diff(table.sub_target_offsets)[clusters]
+        per_cluster = np.maximum(n_sub, 1)
+        rows = np.repeat(clusters, per_cluster)
+        position = np.arange(len(rows)) - np.repeat(np.cumsum(per_cluster) - per_cluster,
+                                                    per_cluster)
+        has_sub = np.repeat(n_sub > 0, per_cluster)
+        sub = table.sub_targets[table.sub_target_offsets[rows[has_sub]] + position[has_sub]]
         
-        # Get top N
-        top_targets = priority_targets[:top_n]
+        latitude = table['latitude'][rows].astype(np.float64)
+        longitude = table['longitude'][rows].astype(np.float64)
+        share = np.ones(len(rows))
+        latitude[has_sub], longitude[has_sub] = sub['latitude'], sub['longitude']
+        share[has_sub] = sub['n_pixels'] / np.maximum(table['n_pixels'][rows[has_sub]], 1)
+        
+        # Enforce drill spacing, then get top N
+        kept = dedupe_targets(latitude, longitude, min_spacing_km)[:top_n]
+        if len(kept) == 0:
+            return pd.DataFrame()
+        rows = rows[kept]
         
         # Create dataframe
-        df = pd.DataFrame(top_targets)
-        df['rank'] = range(1, len(df) + 1)
+        return pd.DataFrame({
+            'rank': np.arange(1, len(kept) + 1),
+            'latitude': latitude[kept],
+            'longitude': longitude[kept],
+            'confidence_score': table['confidence_score'][rows],
+            'alteration_type': table['alteration_type'][rows],
+            'priority': table['priority'][rows],
+            'area_km2': (table['area_km2'][rows] * share[kept]).round(2),
+            'cluster_id': table['cluster_id'][rows]
+        })
+    
+    def classify_alteration_map(self, image, centers, path, ndvi_threshold=0.3, max_workers=4,
+                                chunk_pixels=CHUNK_PIXELS):
+        """
+        Full-resolution alteration map: every pixel of a local scene window
+        labeled with its nearest fitted cluster center, out of core.
         
-        # Reorder columns
-        columns = ['rank', 'latitude', 'longitude', 'confidence_score', 
-                  'alteration_type', 'priority', 'area_km2']
+        Args:
+            image (LocalScene): Scene window from get_sentinel2_data (raw
+                bands, not yet converted to indices)
+            centers (np.ndarray): Fitted cluster centers, indexed by cluster_id
+            path (str): Output ``.npy`` label raster (memory-mapped)
+            ndvi_threshold (float): NDVI threshold to mask vegetation
+            max_workers (int): Row blocks classified concurrently
+            chunk_pixels (int): Pixels per row block (bounds peak memory)
+            
+        Returns:
+            dict: Label raster and per-cluster counts (see classify_scene)
+        """
+        if getattr(self.backend, 'remote', False):
+            raise ValueError("Full-resolution classification needs a local raster backend")
+        return classify_scene(self.backend, image, centers, path, ndvi_threshold=ndvi_threshold,
+                              chunk_pixels=chunk_pixels, max_workers=max_workers)
+    
+    def render_map_tiles(self, image_with_indices, aoi, radius_km, cluster_stats, pyramid,
+                         centers=None, alteration_map=None, ndvi_threshold=0.3,
+                         zooms=TILE_ZOOMS, max_workers=4):
+        """
+        Render the analysis rasters into a cached XYZ tile pyramid.
         
-        return df[columns]
+        Index layers come from the backend's index_raster, at the finest
+        scale that keeps the AOI under TILE_RASTER_PIXELS. The cluster
+        layer is the full-resolution label raster when one was classified,
+        else the index raster labeled with the fitted centers, colored by
+        cluster priority (omitted without centers).
+        
+        Args:
+            image_with_indices: Image with calculated indices
+            aoi: Area of interest (backend-specific)
+            radius_km (float): AOI radius, sizes the rasters
+            cluster_stats (ClusterTable): Clusters (priority colors)
+            pyramid (TilePyramid): Tile cache of this analysis
+            centers (np.ndarray): Fitted cluster centers
+            alteration_map (dict): classify_alteration_map output
+            
+        Returns:
+            dict: Pyramid metadata (see TilePyramid.build)
+        """
+        meta = pyramid.cached()
+        if meta is not None:
+            record('tile_cache_hits')
+            return meta
+        
+        scale = max(TILE_RASTER_MIN_SCALE, 2000 * radius_km / np.sqrt(TILE_RASTER_PIXELS))
+        rasters, geotransform = self.scheduler.call(self.backend.index_raster,
+                                                    image_with_indices, aoi, scale=scale)
+        layers = {
+            name: {'values': rasters[name], 'geotransform': geotransform,
+                   'range': robust_range(rasters[name])}
+            for name in TILE_INDEX_LAYERS
+        }
+        
+        if centers is not None:
+            if alteration_map is not None:
+                labels, label_transform = alteration_map['labels'], alteration_map['geotransform']
+            else:
+                labels = classify_arrays(rasters, centers, ndvi_threshold)
+                label_transform = geotransform
+            palette = np.zeros((len(centers), 4), dtype=np.uint8)
+            for cluster_id, priority in zip(cluster_stats['cluster_id'],
+                                            cluster_stats['priority']):
+                palette[cluster_id] = PRIORITY_RGBA[priority]
+            layers['clusters'] = {'values': labels, 'geotransform': label_transform,
+                                  'palette': palette}
+        
+        return pyramid.build(layers, zooms=zooms, max_workers=max_workers)
     
-    def analyze_location(self, lat, lon, radius_km=10):
+    def analyze_location(self, lat, lon, radius_km=10, start_date=None, end_date=None,
+                         cloud_cover_max=20, clustering='client', tile_km=None,
+                         max_workers=4, progress_callback=None, profile=False,
+                         trace_memory=False, num_pixels=5000, scale=60, n_clusters=4,
+                         sampling='fixed', label_map_dir=None, tile_dir=None,
+                         partial_callback=None):
         """
         Complete analysis pipeline for a given location.
         
+        Concurrent calls with the same normalized parameters (see
+        analysis_key) share one pipeline run; the extra callers get a copy
+        of its results with a 'coalesced' instrumentation counter.
+        
         Args:
             lat (float): Latitude
             lon (float): Longitude  
             radius_km (int): Analysis radius
+            start_date (str): Start date 'YYYY-MM-DD' (default: 6 months ago)
+            end_date (str): End date 'YYYY-MM-DD' (default: today)
+            cloud_cover_max (int): Maximum cloud cover percentage
+            clustering (str): 'client' (sklearn on sampled pixels),
+                'server' (aggregates only, full-coverage areas) or
+                'streaming' (chunked mini-batch K-Means for large samples)
+            tile_km (float): Split the AOI into tiles of this size (client
+                clustering only). Radii above MAX_SINGLE_RADIUS_KM are tiled
+                automatically with DEFAULT_TILE_KM tiles.
+            max_workers (int): Tiles processed concurrently in tiled mode
+            progress_callback (callable): Called as callback(fraction, message)
+                at every stage boundary
+            partial_callback (callable): Called as callback(name, value) as
+                stage outputs become available, before the run finishes:
+                'cluster_stats', 'alteration_map' (pixel counts and areas),
+                'drill_targets' and 'tile_layers'
+            profile (bool): Include a cProfile summary in the results
+            trace_memory (bool): Record peak traced memory (tracemalloc)
+            num_pixels (int): Pixels sampled for clustering (hundreds of
+                thousands or more call for clustering='streaming')
+            scale (float): Sampling scale in meters
+            n_clusters (int): Number of K-Means clusters, or 'auto' to choose
+                it from a scored sweep over K_RANGE (scores in 'k_selection')
+            sampling (str): 'fixed' or 'adaptive' (client clustering on a
+                single AOI; ``num_pixels`` becomes the cap and the sampling
+                plan is returned under 'adaptive_sampling')
+            label_map_dir (str): Local backends: also classify every pixel of
+                the AOI at native resolution into ``<analysis id>.npy`` in this
+                directory (details under 'alteration_map', full-resolution
+                pixel counts and areas as map_* cluster columns)
+            tile_dir (str): Render iron oxide, clay and cluster map tiles into
+                an XYZ pyramid under ``<tile_dir>/<analysis id>/`` (single
+                AOI; reused when already rendered; metadata with the tile
+                URL templates under 'tile_layers')
             
         Returns:
-            dict: Complete analysis results
+            dict: Complete analysis results, including per-stage timings and
+            counters under 'instrumentation'
         """
+        if tile_km is None and clustering == 'client' and radius_km > MAX_SINGLE_RADIUS_KM:
+            tile_km = DEFAULT_TILE_KM
+        
+        n_stages = 2 if tile_km else \
+            4 + (label_map_dir is not None) + (tile_dir is not None)
+        run = RunProfile(progress_callback, n_stages=n_stages,
+                         profile=profile, trace_memory=trace_memory,
+                         partial_callback=partial_callback)
+        key = analysis_key(lat, lon, radius_km, start_date, end_date,
+                           cloud_cover_max, clustering, tile_km, num_pixels, scale, n_clusters,
+                           sampling)
+        label_map = None
+        if label_map_dir is not None:
+            os.makedirs(label_map_dir, exist_ok=True)
+            label_map = os.path.join(label_map_dir, f"{analysis_id(key)}.npy")
+        pyramid = None if tile_dir is None else TilePyramid(tile_dir, analysis_id(key))
+        # Only calls writing the same outputs can share a computation
+        flight_key = (key, label_map, None if pyramid is None else pyramid.path)
         try:
+            with run:
+                # Identical requests already running share that computation
+                results, shared = self.flights.do(flight_key, lambda: self._run_pipeline(
+                    run, lat, lon, radius_km, start_date, end_date,
+                    cloud_cover_max, clustering, tile_km, max_workers, num_pixels, scale,
+                    n_clusters, sampling, label_map, pyramid))
+                if shared:
+                    results = dict(results)
+                    run.count('coalesced')
+                    if progress_callback is not None:
+                        progress_callback(1.0, "Shared result of an identical analysis")
+        except Exception as e:
+            results = {'error': str(e), 'success': False}
+        
+        results['instrumentation'] = run.summary()
+        return results
+    
+    def _run_pipeline(self, run, lat, lon, radius_km, start_date, end_date,
+                      cloud_cover_max, clustering, tile_km, max_workers,
+                      num_pixels=5000, scale=60, n_clusters=4, sampling='fixed',
+                      label_map=None, pyramid=None):
+        """Stages of analyze_location, timed through ``run``."""
+        if tile_km and clustering != 'client':
+            raise ValueError("Tiled analysis clusters pooled samples; use clustering='client'")
+        if sampling == 'adaptive' and (tile_km or clustering != 'client'):
+            raise ValueError("Adaptive sampling needs clustering='client' on a single AOI "
+                             f"(radius up to {MAX_SINGLE_RADIUS_KM} km)")
+        if label_map and (tile_km or getattr(self.backend, 'remote', False)):
+            raise ValueError("Full-resolution classification needs a local raster backend "
+                             f"and a single AOI (radius up to {MAX_SINGLE_RADIUS_KM} km)")
+        
+        start_date, end_date = _resolve_date_window(start_date, end_date)
+        request = {
+            'lat': lat, 'lon': lon, 'radius_km': radius_km,
+            'start_date': start_date, 'end_date': end_date,
+            'cloud_cover_max': cloud_cover_max
+        }
+        
+        n_tiles = 1
+        if tile_km:
+            # Steps 1-3 per tile, one global cluster model
+            message = f"🧩 Analyzing tiles ({tile_km} km)..."
+            print(message)
+            with run.stage('tiles', message):
+                cluster_stats, n_tiles = self.identify_alteration_zones_tiled(
+                    lat, lon, radius_km, start_date, end_date, cloud_cover_max,
+                    tile_km=tile_km, max_workers=max_workers, n_clusters=n_clusters,
+                    cache_params=request
+                )
+        else:
             # Step 1: Get satellite data
-            print("📡 Fetching Sentinel-2 imagery...")
-            image, aoi = self.get_sentinel2_data(lat, lon, radius_km)
+            message = "📡 Fetching Sentinel-2 imagery..."
+            print(message)
+            with run.stage('fetch', message):
+                image, aoi = self.get_sentinel2_data(lat, lon, radius_km, start_date, end_date,
+                                                     cloud_cover_max)
             
             # Step 2: Calculate band ratios
-            print("🔬 Calculating alteration indices...")
-            indices = self.calculate_band_ratios(image)
+            message = "🔬 Calculating alteration indices..."
+            print(message)
+            with run.stage('indices', message):
+                # The full-resolution classification computes its own indices
+                # block by block, so clustering only needs the sampling grid
+                indices = self.calculate_band_ratios(image.coarsened(scale) if label_map
+                                                     else image)
             
             # Step 3: Identify alteration zones
-            print("🎯 Identifying alteration zones...")
-            cluster_stats = self.identify_alteration_zones(indices, aoi)
-            
-            if not cluster_stats:
-                return {'error': 'No alteration zones identified'}
-            
-            # Step 4: Generate drill targets
-            print("⛏️ Generating drill targets...")
+            message = "🎯 Identifying alteration zones..."
+            print(message)
+            with run.stage('clustering', message):
+                cluster_stats = self.identify_alteration_zones(indices, aoi, cache_params=request,
+                                                               clustering=clustering,
+                                                               num_pixels=num_pixels, scale=scale,
+                                                               n_clusters=n_clusters,
+                                                               sampling=sampling)
+        
+        if cluster_stats is None or len(cluster_stats) == 0:
+            return {'error': 'No alteration zones identified'}
+        run.publish('cluster_stats', cluster_stats)
+        
+        alteration_map = None
+        if label_map:
+            # Every AOI pixel at native resolution, chunk by chunk
+            message = "🗺️ Classifying full-resolution pixels..."
+            print(message)
+            with run.stage('classify', message):
+                alteration_map = self.classify_alteration_map(
+                    image, run.annotations['cluster_centers'], label_map,
+                    max_workers=max_workers)
+            ids = cluster_stats['cluster_id']
+            cluster_stats.columns['map_pixels'] = alteration_map['counts'][ids]
+            cluster_stats.columns['map_area_km2'] = alteration_map['area_km2'][ids].round(2)
+            run.publish('alteration_map', {'counts': alteration_map['counts'],
+                                           'area_km2': alteration_map['area_km2']})
+        
+        # Step 4: Generate drill targets
+        message = "⛏️ Generating drill targets..."
+        print(message)
+        with run.stage('targets', message):
             drill_targets = self.generate_drill_targets(cluster_stats)
+        run.publish('drill_targets', drill_targets)
+        
+        tile_layers = None
+        if pyramid is not None and not tile_km:
+            # Map overlays: rendered once per analysis, then served from disk
+            message = "🧱 Rendering map tiles..."
+            print(message)
+            with run.stage('render', message):
+                try:
+                    tile_layers = self.render_map_tiles(
+                        indices, aoi, radius_km, cluster_stats, pyramid,
+                        centers=run.annotations.get('cluster_centers'),
+                        alteration_map=alteration_map, max_workers=max_workers)
+                    run.publish('tile_layers', tile_layers)
+                except Exception as e:
+                    # The overlays are optional: keep the analysis results
+                    print(f"Tile rendering error: {e}")
+        
+        # Calculate summary metrics
+        high_priority_area = float(
+            cluster_stats['area_km2'][cluster_stats['priority'] == 'High'].sum())
+        total_area = radius_km * radius_km * 3.14159  # Approximate area
+        
+        results = {
+            'success': True,
+            'location': {'lat': lat, 'lon': lon, 'radius_km': radius_km},
+            'drill_targets': drill_targets,
+            'cluster_stats': cluster_stats,
+            'metrics': {
+                'total_area_km2': round(total_area, 2),
+                'high_priority_area_km2': round(high_priority_area, 2),
+                'n_targets': len(drill_targets),
+                'n_clusters': len(cluster_stats),
+                'n_tiles': n_tiles
+            },
+            'roi_estimate': {
+                'traditional_exploration_cost': 500000,
+                'satellite_analysis_cost': 150000,
+                'estimated_savings': 350000,
+                'cost_reduction_pct': 70
+            }
+        }
+        
+        for name in ('k_selection', 'spatial_index', 'adaptive_sampling'):
+            if name in run.annotations:
+                results[name] = run.annotations[name]
+        if alteration_map is not None:
+            results['alteration_map'] = {
+                'path': alteration_map['path'],
+                'shape': alteration_map['shape'],
+                'geotransform': alteration_map['geotransform'],
+                'nodata': NODATA,
+                'classified_pixels': int(alteration_map['counts'].sum()),
+                'classified_area_km2': round(float(alteration_map['area_km2'].sum()), 2)
+            }
+        if tile_layers is not None:
+            results['tile_layers'] = tile_layers
+        if 'valid_area_km2' in run.annotations:
+            # Non-vegetated area actually mapped by the classified samples
+            results['metrics']['mapped_area_km2'] = run.annotations['valid_area_km2']
+        if self.sample_cache is not None:
+            results['sample_cache'] = self.sample_cache.stats()
+        results['scheduler'] = self.scheduler.stats()
+        
+        return results
+    
+    def iter_analyze_locations(self, sites, max_workers=4, **kwargs):
+        """
+        Analyze many sites concurrently, yielding each result as it finishes.
+        
+        Args:
+            sites: DataFrame or list of dicts/tuples - see normalize_sites
+            max_workers (int): Sites analyzed concurrently
+            **kwargs: Passed to analyze_location (dates, cloud cover, ...)
             
-            # Calculate summary metrics
-            high_priority_area = sum(c['area_km2'] for c in cluster_stats if c['priority'] == 'High')
-            total_area = radius_km * radius_km * 3.14159  # Approximate area
-            
-            results = {
-                'success': True,
-                'location': {'lat': lat, 'lon': lon, 'radius_km': radius_km},
-                'drill_targets': drill_targets,
-                'cluster_stats': cluster_stats,
-                'metrics': {
-                    'total_area_km2': round(total_area, 2),
-                    'high_priority_area_km2': round(high_priority_area, 2),
-                    'n_targets': len(drill_targets),
-                    'n_clusters': len(cluster_stats)
-                },
-                'roi_estimate': {
-                    'traditional_exploration_cost': 500000,
-                    'satellite_analysis_cost': 150000,
-                    'estimated_savings': 350000,
-                    'cost_reduction_pct': 70
-                }
+        Yields:
+            tuple: (site dict, analysis results dict) in completion order
+        """
+        sites = normalize_sites(sites)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(self.analyze_location, site['lat'], site['lon'],
+                            site['radius_km'], **kwargs): site
+                for site in sites
             }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    
+    def analyze_locations(self, sites, max_workers=4, top_n=5, on_result=None, **kwargs):
+        """
+        Batch analysis of many candidate sites with one ranked target table.
+        
+        Args:
+            sites: DataFrame or list of dicts/tuples - see normalize_sites
+            max_workers (int): Sites analyzed concurrently
+            top_n (int): Drill targets kept per site
+            on_result (callable): Called with (site, results) as each site finishes
+            **kwargs: Passed to analyze_location (dates, cloud cover, ...)
+            
+        Returns:
+            dict: Per-site results plus a combined drill target table ranked
+            by confidence across all sites and one ClusterTable of every
+            site's clusters (with a ``site`` column)
+        """
+        site_results = {}
+        tables = []
+        clusters = []
+        
+        for site, results in self.iter_analyze_locations(sites, max_workers, **kwargs):
+            site_results[site['site']] = results
+            if on_result is not None:
+                on_result(site, results)
             
-            return results
+            if results.get('success'):
+                clusters.append((site['site'], results['cluster_stats']))
+            if results.get('success') and len(results['drill_targets']):
+                table = results['drill_targets'].head(top_n).copy()
+                table = table.rename(columns={'rank': 'site_rank'})
+                table.insert(0, 'site', site['site'])
+                tables.append(table)
+        
+        if tables:
+            drill_targets = pd.concat(tables, ignore_index=True)
+            drill_targets = drill_targets.sort_values(
+                ['confidence_score', 'area_km2'], ascending=False, kind='stable'
+            ).reset_index(drop=True)
+            drill_targets.insert(0, 'rank', range(1, len(drill_targets) + 1))
+        else:
+            drill_targets = pd.DataFrame()
+        
+        n_failed = sum(1 for r in site_results.values() if not r.get('success'))
+        
+        return {
+            'success': n_failed < len(site_results),
+            'site_results': site_results,
+            'drill_targets': drill_targets,
+            'cluster_stats': ClusterTable.concat([table for _, table in clusters],
+                                                 keys=[name for name, _ in clusters]),
+            'metrics': {
+                'n_sites': len(site_results),
+                'n_failed': n_failed,
+                'n_targets': len(drill_targets)
+            }
+        }
+    
+    def scan_region(self, bounds=REGION_IV_BOUNDS, start_date=None, end_date=None,
+                    cloud_cover_max=20, levels=SCAN_LEVELS, tile_km=SCAN_TILE_KM, split=2,
+                    pixels_per_tile=2000, budget_fraction=SCAN_BUDGET_FRACTION,
+                    min_score=SCAN_MIN_SCORE, n_clusters=4, ndvi_threshold=0.3,
+                    max_workers=4, top_n=5, progress_callback=None):
+        """
+        Coarse-to-fine prospectivity scan of a whole region.
+        
+        The region is covered with ``tile_km`` tiles sampled at the coarsest
+        scale of ``levels``, and every tile is clustered and scored (see
+        regional_scan.anomaly_score). Tiles then leave a priority queue most
+        anomalous first and are split into ``split`` x ``split`` children
+        scanned at the next level, until the compute budget is spent or no
+        queued tile scores at least ``min_score``. The coarse pass always
+        covers every tile, but coarse and refined tiles sample fewer than
+        ``pixels_per_tile`` pixels when needed so that SCAN_REFINE_SHARE of
+        the budget is left for refinement and covers at least one split. A
+        scan that refines nothing equals the coarse screen and is reported
+        with a 'warning'. Drill targets come from the leaf tiles (scanned,
+        not refined), each at the finest level it reached.
+        
+        Args:
+            bounds (tuple): (west, south, east, north) in degrees
+            start_date (str): Start date 'YYYY-MM-DD' (default: 6 months ago)
+            end_date (str): End date 'YYYY-MM-DD' (default: today)
+            cloud_cover_max (int): Maximum cloud cover percentage
+            levels (tuple): Sampling scale in meters per level, coarse to fine
+            tile_km (float): Edge length of the coarse tiles in kilometers
+            split (int): Children per side when a tile is refined
+            pixels_per_tile (int): Pixels sampled per tile at every level
+            budget_fraction (float): Compute budget (pixels sampled) as a
+                fraction of a uniform pass over all finest-level tiles
+            min_score (float): Tiles scoring below this are not refined
+            n_clusters (int): K-Means clusters per tile
+            ndvi_threshold (float): NDVI threshold to mask vegetation
+            max_workers (int): Tiles scanned concurrently
+            top_n (int): Drill targets kept per leaf tile
+            progress_callback (callable): Called as callback(fraction, message)
+                at every stage boundary
             
+        Returns:
+            dict: 'tiles' (one row per scanned tile), ranked 'drill_targets',
+            the leaf tiles' 'cluster_stats' (with a ``tile`` column), compute
+            'metrics', 'warning' (why nothing was refined, else None) and
+            'instrumentation'
+        """
+        from spatial_index import dedupe_targets
+        
+        start_date, end_date = _resolve_date_window(start_date, end_date)
+        coarse = box_grid(bounds, tile_km)
+        uniform_cost = len(coarse) * split ** (2 * (len(levels) - 1)) * pixels_per_tile
+        queue = RefinementQueue(budget_fraction * uniform_cost)
+        tiles = []
+        
+        # Leave part of the budget for refinement, enough for at least one split
+        coarse_pixels = refine_pixels = pixels_per_tile
+        if len(levels) > 1:
+            coarse_pixels = int(min(pixels_per_tile, max(
+                SCAN_MIN_TILE_PIXELS, (1 - SCAN_REFINE_SHARE) * queue.budget / len(coarse))))
+            refine_pixels = int(min(pixels_per_tile, max(
+                SCAN_MIN_TILE_PIXELS, SCAN_REFINE_SHARE * queue.budget / split ** 2)))
+        
+        def scan_tile(box, level, parent, num_pixels):
+            try:
+                aoi = self.backend.make_box(*box)
+            except ValueError:
+                return None  # outside the local scene: nothing to sample
+            image = self.backend.get_composite(aoi, start_date, end_date, cloud_cover_max)
+            indices = self.backend.calculate_band_ratios(image)
+            request = {
+                'lat': (box[1] + box[3]) / 2, 'lon': (box[0] + box[2]) / 2,
+                'bounds': [round(v, 5) for v in box],
+                'start_date': start_date, 'end_date': end_date,
+                'cloud_cover_max': cloud_cover_max
+            }
+            X, coords = self._sample_features(indices, aoi, ndvi_threshold=ndvi_threshold,
+                                              scale=levels[level], num_pixels=num_pixels,
+                                              cache_params=request)
+            clusters = None
+            if len(X) > n_clusters:
+                clusters = self._cluster_samples(X, coords, n_clusters, request=request,
+                                                 scale=levels[level])
+            return {'parent': parent, 'level': level, 'box': box, 'n_samples': len(X),
+                    'score': anomaly_score(clusters), 'clusters': clusters, 'refined': False}
+        
+        def scan(boxes, level, parent=-1, num_pixels=pixels_per_tile):
+            # Tile workers inherit the caller's context (active RunProfile)
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, scan_tile, box, level,
+                                       parent, num_pixels) for box in boxes]
+                scanned = [future.result() for future in futures]
+            for tile in scanned:
+                if tile is None:
+                    continue
+                tile['id'] = len(tiles)
+                tiles.append(tile)
+                queue.charge(tile['n_samples'])
+                record('scan_tiles')
+                if level + 1 < len(levels) and tile['score'] >= min_score:
+                    queue.push(tile['score'], tile)
+        
+        run = RunProfile(progress_callback, n_stages=2)
+        try:
+            with run:
+                message = f"🗺️ Scanning {len(coarse)} tiles at {levels[0]} m..."
+                print(message)
+                with run.stage('coarse_scan', message):
+                    scan(coarse, 0, num_pixels=coarse_pixels)
+                
+                message = "🔎 Refining the most anomalous tiles..."
+                print(message)
+                with run.stage('refine', message):
+                    refine_cost = split * split * refine_pixels
+                    while queue.affords(refine_cost):
+                        tile = queue.pop()
+                        if tile is None:
+                            break
+                        tile['refined'] = True
+                        scan(split_box(tile['box'], split), tile['level'] + 1, tile['id'],
+                             num_pixels=refine_pixels)
         except Exception as e:
-            return {'error': str(e), 'success': False}
+            return {'error': str(e), 'success': False, 'instrumentation': run.summary()}
+        
+        warning = None
+        if tiles and not any(t['refined'] for t in tiles):
+            if len(levels) < 2:
+                warning = "a single scan level leaves nothing to refine"
+            elif not len(queue):
+                warning = f"no tile scored at least {min_score}"
+            else:
+                warning = (f"the {int(queue.remaining):,} pixels left after the coarse pass "
+                           f"do not cover one refinement ({refine_cost:,}); raise the budget")
+            warning = f"No tile was refined: {warning}. Results equal the coarse screen"
+            print(f"⚠️ {warning}")
+        
+        # Drill targets of the leaf tiles, ranked across the region
+        leaves = [t for t in tiles if not t['refined'] and t['clusters'] is not None]
+        tables = []
+        for tile in leaves:
+            targets = self.generate_drill_targets(tile['clusters'], top_n=top_n)
+            if len(targets):
+                targets = targets.rename(columns={'rank': 'tile_rank'})
+                targets.insert(0, 'tile', tile['id'])
+                targets.insert(1, 'scale_m', levels[tile['level']])
+                targets['tile_score'] = round(tile['score'], 4)
+                tables.append(targets)
+        
+        if tables:
+            drill_targets = pd.concat(tables, ignore_index=True)
+            drill_targets = drill_targets.sort_values(
+                ['confidence_score', 'tile_score'], ascending=False, kind='stable'
+            ).reset_index(drop=True)
+            # Neighbouring tiles can see the same anomaly across their border
+            kept = dedupe_targets(drill_targets['latitude'], drill_targets['longitude'],
+                                  MIN_DRILL_SPACING_KM)
+            drill_targets = drill_targets.iloc[kept].reset_index(drop=True)
+            drill_targets.insert(0, 'rank', range(1, len(drill_targets) + 1))
+        else:
+            drill_targets = pd.DataFrame()
+        
+        tile_table = pd.DataFrame([{
+            'tile': t['id'],
+            'parent': t['parent'],
+            'level': t['level'],
+            'scale_m': levels[t['level']],
+            'west': t['box'][0], 'south': t['box'][1],
+            'east': t['box'][2], 'north': t['box'][3],
+            'score': round(t['score'], 4),
+            'n_samples': t['n_samples'],
+            'refined': t['refined']
+        } for t in tiles])
+        
+        return {
+            'success': bool(tiles),
+            'bounds': tuple(bounds),
+            'tiles': tile_table,
+            'drill_targets': drill_targets,
+            'cluster_stats': ClusterTable.concat([t['clusters'] for t in leaves],
+                                                 keys=[t['id'] for t in leaves], key_name='tile'),
+            'metrics': {
+                'region_area_km2': round(sum(box_area_km2(box) for box in coarse), 1),
+                'n_tiles': len(tiles),
+                'tiles_per_level': {int(scale): sum(1 for t in tiles if t['level'] == level)
+                                    for level, scale in enumerate(levels)},
+                'coarse_pixels_per_tile': coarse_pixels,
+                'refine_pixels_per_tile': refine_pixels,
+                'n_refined': sum(1 for t in tiles if t['refined']),
+                'pixels_sampled': int(queue.spent),
+                'budget_pixels': int(queue.budget),
+                'uniform_pixels': int(uniform_cost),
+                'cost_fraction': round(queue.spent / uniform_cost, 4) if uniform_cost else 0.0,
+                'n_targets': len(drill_targets)
+            },
+            'warning': warning,
+            'instrumentation': run.summary()
+        }
+
+
+def normalize_sites(sites):
+    """
+    Normalize batch input to a list of site dicts.
+    
+    Accepts a DataFrame or a list of dicts (lat/lon or latitude/longitude,
+    optional radius_km and site/name) or (lat, lon[, radius_km]) tuples.
+    
+    Returns:
+        list: Dicts with keys site, lat, lon, radius_km
+    """
+    if isinstance(sites, pd.DataFrame):
+        sites = sites.to_dict('records')
+    
+    normalized = []
+    for i, site in enumerate(sites):
+        if not isinstance(site, dict):
+            site = dict(zip(['lat', 'lon', 'radius_km'], site))
+        lat = site.get('lat', site.get('latitude'))
+        lon = site.get('lon', site.get('longitude'))
+        if lat is None or lon is None:
+            raise ValueError(f"Site {i + 1} has no lat/lon")
+        normalized.append({
+            'site': str(site.get('site', site.get('name', f"site_{i + 1}"))),
+            'lat': float(lat),
+            'lon': float(lon),
+            'radius_km': float(site.get('radius_km', 10))
+        })
+    return normalized
 
 
 # Utility functions for KML export
+def _build_kml(drill_targets, cluster_stats):
+    """Build the simplekml document for a drill target table."""
+    import simplekml
+    
+    kml = simplekml.Kml()
+    
+    # Add drill targets as placemarks
+    folder = kml.newfolder(name="Drill Targets")
+    
+    for _, target in drill_targets.iterrows():
+        pnt = folder.newpoint(
+            name=f"Target {target['rank']}",
+            coords=[(target['longitude'], target['latitude'])]
+        )
+        pnt.description = f"""
+        Confidence: {target['confidence_score']}%
+        Alteration: {target['alteration_type']}
+        Priority: {target['priority']}
+        Area: {target['area_km2']} km²
+        """
+        
+        # Color by priority
+        if target['priority'] == 'High':
+            pnt.style.iconstyle.color = 'ff0000ff'  # Red
+        elif target['priority'] == 'Medium':
+            pnt.style.iconstyle.color = 'ff00a5ff'  # Orange
+        else:
+            pnt.style.iconstyle.color = 'ff00ffff'  # Yellow
+    
+    # Add alteration zone footprints as polygons
+    zones = kml.newfolder(name="Alteration Zones")
+    zone_colors = {'High': '660000ff', 'Medium': '6600a5ff'}  # Translucent red / orange
+    
+    if cluster_stats is not None:
+        high_medium = np.flatnonzero(np.isin(cluster_stats['priority'], list(zone_colors)))
+        for row in high_medium:
+            priority = cluster_stats['priority'][row]
+            for i, (ring, area) in enumerate(cluster_stats.footprint_of(row), start=1):
+                pol = zones.newpolygon(
+                    name=f"Cluster {cluster_stats['cluster_id'][row]} zone {i}",
+                    outerboundaryis=[tuple(point)
+                                     for point in ring.astype(np.float64).round(6).tolist()]
+                )
+                pol.description = f"""
+                Alteration: {cluster_stats['alteration_type'][row]}
+                Priority: {priority}
+                Area: {area} km²
+                """
+                pol.style.polystyle.color = zone_colors[priority]
+                pol.style.linestyle.color = zone_colors[priority]
+    
+    return kml
+
+
 def create_kml_export(drill_targets, cluster_stats, output_path='drill_targets.kml'):
     """
     Create KML file for import into QGIS/ArcGIS.
     
     Args:
         drill_targets (pd.DataFrame): Drill target table
-        cluster_stats (list): Cluster statistics
+        cluster_stats (ClusterTable): Cluster statistics
         output_path (str): Output file path
     """
     try:
-        import simplekml
-        
-        kml = simplekml.Kml()
-        
-        # Add drill targets as placemarks
-        folder = kml.newfolder(name="Drill Targets")
+        _build_kml(drill_targets, cluster_stats).save(output_path)
+        return output_path
         
-        for _, target in drill_targets.iterrows():
-            pnt = folder.newpoint(
-                name=f"Target {target['rank']}",
-                coords=[(target['longitude'], target['latitude'])]
-            )
-            pnt.description = f"""
-            Confidence: {target['confidence_score']}%
-            Alteration: {target['alteration_type']}
-            Priority: {target['priority']}
-            Area: {target['area_km2']} km²
-            """
-            
-            # Color by priority
-            if target['priority'] == 'High':
-                pnt.style.iconstyle.color = 'ff0000ff'  # Red
-            elif target['priority'] == 'Medium':
-                pnt.style.iconstyle.color = 'ff00a5ff'  # Orange
-            else:
-                pnt.style.iconstyle.color = 'ff00ffff'  # Yellow
+    except Exception as e:
+        print(f"KML export error: {e}")
+        return None
+
+
+def kml_string(drill_targets, cluster_stats):
+    """
+    KML document as a string, built in memory (no temporary file).
+    
+    Args:
+        drill_targets (pd.DataFrame): Drill target table
+        cluster_stats (ClusterTable): Cluster statistics
         
-        kml.save(output_path)
-        return output_path
+    Returns:
+        str: KML text, or None if the export failed
+    """
+    try:
+        return _build_kml(drill_targets, cluster_stats).kml()
         
     except Exception as e:
         print(f"KML export error: {e}")
@@ -11,6 +11,8 @@ Geographic Focus: Chile's IV Region (Coquimbo/La Serena)
 
 import sys
 import io
+import os
+import time
 
 # Fix UTF-8 encoding for Windows console
 if sys.platform == 'win32':
@@ -21,9 +23,12 @@ import streamlit as st
 import folium
 from streamlit_folium import st_folium
 import pandas as pd
-from analysis_engine import MineralExplorationAnalyzer, create_kml_export
+import numpy as np
+from analysis_engine import MAX_SINGLE_RADIUS_KM, MineralExplorationAnalyzer, kml_string
+from centroid_store import CentroidStore
+from job_queue import AnalysisJobQueue
+from sample_cache import SampleCache
 from datetime import datetime
-import time
 
 
 # Page configuration
@@ -34,6 +39,151 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+# Map tile overlays: rendered by the analysis jobs into Streamlit's static
+# folder (server.enableStaticServing) and served from there
+TILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'tiles')
+TILE_URL_ROOT = '/app/static/tiles'
+TILE_LAYER_NAMES = {
+    'clusters': "Alteration Clusters",
+    'iron_oxide': "Iron Oxide Index",
+    'clay_minerals': "Clay Minerals Index"
+}
+
+
+# Cached resources - reruns triggered by widgets reuse these instead of
+# re-initializing Earth Engine, re-running analyses or rebuilding exports
+@st.cache_resource
+def get_analyzer():
+    """One analyzer (one ee.Initialize) shared by every rerun and session."""
+    return MineralExplorationAnalyzer(sample_cache=SampleCache(),
+                                      centroid_store=CentroidStore())
+
+
+@st.cache_resource
+def get_job_queue():
+    """
+    Background worker pool shared by all sessions, so analyses never block
+    the script thread. Results are memoized by parameters inside the queue.
+    """
+    return AnalysisJobQueue(get_analyzer(),
+                            max_workers=int(os.environ.get('ANALYSIS_WORKERS', 4)))
+
+
+@st.cache_resource(max_entries=16)
+def build_target_map(job_id, _results):
+    """Folium map of the drill targets, built once per finished job."""
+    location = _results['location']
+    lat, lon, radius_km = location['lat'], location['lon'], location['radius_km']
+    
+    # Create Folium map
+    m = folium.Map(
+        location=[lat, lon],
+        zoom_start=11,
+        tiles='Esri WorldImagery',
+        attr='Esri'
+    )
+    
+    # Add analysis center point
+    folium.Marker(
+        [lat, lon],
+        popup="Analysis Center",
+        tooltip="Analysis Center",
+        icon=folium.Icon(color='blue', icon='info-sign')
+    ).add_to(m)
+    
+    # Colors by priority
+    color_map = {
+        'High': 'red',
+        'Medium': 'orange',
+        'Low': 'yellow'
+    }
+    
+    # Alteration zone footprints (High/Medium clusters)
+    zones = folium.FeatureGroup(name="Alteration Zones")
+    clusters = _results['cluster_stats']
+    for row in np.flatnonzero(np.isin(clusters['priority'], ['High', 'Medium'])):
+        for ring, area in clusters.footprint_of(row):
+            folium.Polygon(
+                [(lat_, lon_) for lon_, lat_ in ring.tolist()],
+                color=color_map[clusters['priority'][row]],
+                weight=1,
+                fill=True,
+                fill_opacity=0.25,
+                tooltip=f"Cluster {clusters['cluster_id'][row]} - "
+                        f"{clusters['alteration_type'][row]} ({area:.2f} km²)"
+            ).add_to(zones)
+    zones.add_to(m)
+    
+    # Rendered alteration rasters (cached XYZ tiles, clusters shown first)
+    tile_layers = _results.get('tile_layers')
+    if tile_layers:
+        layers = sorted(tile_layers['layers'].items(), key=lambda item: item[0] != 'clusters')
+        for name, layer in layers:
+            folium.TileLayer(
+                tiles=f"{TILE_URL_ROOT}/{layer['url']}",
+                attr="Sentinel-2 alteration analysis",
+                name=TILE_LAYER_NAMES.get(name, name),
+                overlay=True,
+                show=name == 'clusters',
+                opacity=0.8,
+                min_zoom=tile_layers['zooms'][0] - 2,
+                max_native_zoom=tile_layers['zooms'][1],
+                max_zoom=18
+            ).add_to(m)
+    
+    # Add drill targets
+    for _, target in _results['drill_targets'].iterrows():
+        color = color_map.get(target['priority'], 'gray')
+        
+        popup_html = f"""
+        <div style="font-family: Arial; font-size: 12px;">
+            <b>🎯 Target #{target['rank']}</b><br>
+            <b>Confidence:</b> {target['confidence_score']}%<br>
+            <b>Priority:</b> {target['priority']}<br>
+            <b>Alteration:</b> {target['alteration_type']}<br>
+            <b>Area:</b> {target['area_km2']} km²<br>
+            <b>Coordinates:</b><br>
+            Lat: {target['latitude']:.4f}°<br>
+            Lon: {target['longitude']:.4f}°
+        </div>
+        """
+        
+        folium.Marker(
+            [target['latitude'], target['longitude']],
+            popup=folium.Popup(popup_html, max_width=250),
+            tooltip=f"Target {target['rank']} - {target['confidence_score']}%",
+            icon=folium.Icon(color=color, icon='glyphicon-flag', prefix='glyphicon')
+        ).add_to(m)
+    
+    # Add analysis radius circle
+    folium.Circle(
+        [lat, lon],
+        radius=radius_km * 1000,
+        color='blue',
+        fill=False,
+        weight=2,
+        opacity=0.5,
+        popup=f"Analysis Area ({radius_km} km radius)"
+    ).add_to(m)
+    
+    if tile_layers:
+        folium.LayerControl(collapsed=True).add_to(m)
+    
+    return m
+
+
+@st.cache_data(max_entries=16)
+def export_csv(job_id, _display_df):
+    """CSV export, serialized once per finished job."""
+    return _display_df.to_csv(index=False)
+
+
+@st.cache_data(max_entries=16)
+def export_kml(job_id, _drill_targets, _cluster_stats):
+    """KML export built in memory, once per finished job."""
+    return kml_string(_drill_targets, _cluster_stats)
+
 # Custom CSS for mining industry aesthetics
 st.markdown("""
 <style>
@@ -127,9 +277,10 @@ st.sidebar.subheader("Analysis Settings")
 
 radius_km = st.sidebar.select_slider(
     "Analysis Radius (km)",
-    options=[5, 10, 15, 20, 25],
+    options=[5, 10, 15, 20, 25, 50, 100],
     value=10,
-    help="Larger radius = more area analyzed (slower processing)"
+    help="Larger radius = more area analyzed (slower processing). "
+         "Radii above 25 km are processed as parallel 20 km tiles"
 )
 
 cloud_cover = st.sidebar.slider(
@@ -141,6 +292,42 @@ cloud_cover = st.sidebar.slider(
     help="Lower values = clearer imagery (fewer available images)"
 )
 
+clustering_mode = st.sidebar.radio(
+    "Clustering Mode",
+    options=['client', 'server', 'streaming'],
+    format_func=lambda m: {'client': 'Sampled pixels (local K-Means)',
+                           'server': 'Server-side (aggregates only)',
+                           'streaming': 'Large sample (streamed mini-batch)'}[m],
+    help="Server-side mode classifies every pixel in Earth Engine and returns only "
+         "per-cluster aggregates - less data transferred and true zone areas. "
+         "Streaming pulls a large sample in chunks with bounded memory"
+)
+
+n_clusters = st.sidebar.select_slider(
+    "Alteration Clusters",
+    options=['auto', 2, 3, 4, 5, 6, 7, 8],
+    value=4,
+    help="Number of K-Means zones. 'auto' scores k = 2-8 on a subsample and picks the best"
+)
+
+num_pixels, scale = 5000, 60
+if clustering_mode == 'streaming':
+    num_pixels = st.sidebar.select_slider(
+        "Sampled Pixels",
+        options=[50_000, 100_000, 250_000, 500_000, 1_000_000],
+        value=250_000,
+        format_func=lambda n: f"{n:,}"
+    )
+    scale = st.sidebar.radio("Sampling Scale (m)", options=[20, 30, 60], horizontal=True)
+
+sampling = 'fixed'
+if clustering_mode == 'client' and st.sidebar.checkbox(
+        "Adaptive Sampling",
+        help="Stratified sample sized from the AOI, stopped once cluster means converge - "
+             "fewer pixels transferred, rare high-alteration pixels oversampled "
+             f"(radius up to {MAX_SINGLE_RADIUS_KM} km)"):
+    sampling = 'adaptive'
+
 n_targets = st.sidebar.slider(
     "Number of Drill Targets",
     min_value=3,
@@ -181,42 +368,57 @@ analyze_button = st.button("🎯 GENERATE DRILL TARGETS", use_container_width=Tr
 if 'results' not in st.session_state:
     st.session_state.results = None
 
-# Run analysis
+# Submit analysis to the background queue
 if analyze_button:
-    with st.spinner("🛰️ Analyzing satellite imagery... This may take 30-60 seconds"):
-        
-        # Progress tracking
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Initialize analyzer
-        analyzer = MineralExplorationAnalyzer()
-        
-        # Run analysis with progress updates
-        status_text.text("📡 Fetching Sentinel-2 imagery from Google Earth Engine...")
-        progress_bar.progress(25)
-        time.sleep(0.5)
-        
-        status_text.text("🔬 Calculating band ratios (Iron Oxide, Clay Minerals)...")
-        progress_bar.progress(50)
-        
-        # Execute analysis
-        results = analyzer.analyze_location(latitude, longitude, radius_km)
-        
-        status_text.text("🎯 Identifying alteration zones with K-Means clustering...")
-        progress_bar.progress(75)
-        time.sleep(0.5)
-        
-        status_text.text("⛏️ Generating prioritized drill targets...")
-        progress_bar.progress(100)
-        time.sleep(0.5)
+    st.session_state.job_id = get_job_queue().submit(
+        latitude, longitude, radius_km,
+        cloud_cover_max=cloud_cover,
+        clustering=clustering_mode,
+        num_pixels=num_pixels,
+        scale=scale,
+        n_clusters=n_clusters,
+        sampling=sampling,
+        tile_dir=TILE_DIR
+    )
+
+# Poll the running job (the script never blocks on the analysis itself)
+poll_again = False
+if st.session_state.get('job_id'):
+    queue = get_job_queue()
+    job_id = st.session_state.job_id
+    job = queue.status(job_id)
+    
+    if job['status'] in ('pending', 'running'):
+        if job['status'] == 'pending':
+            st.info("⏳ Analysis queued - waiting for a free worker...")
+        else:
+            st.info(f"🛰️ {job['message'] or 'Analyzing satellite imagery...'}")
+        st.progress(int(job['progress'] * 100))
         
-        # Clear progress indicators
-        progress_bar.empty()
-        status_text.empty()
+        # Stage outputs available before the job finishes
+        partial = job['partial']
+        if 'cluster_stats' in partial:
+            zones = partial['cluster_stats']
+            n_high = int((zones['priority'] == 'High').sum())
+            caption = f"{len(zones)} alteration zones identified ({n_high} high priority)"
+            if 'drill_targets' in partial:
+                caption += f", {len(partial['drill_targets'])} drill targets"
+            st.caption(caption)
         
+        if st.button("✖ Cancel Analysis"):
+            queue.cancel(job_id)
+            st.session_state.job_id = None
+            st.warning("Analysis cancelled")
+        else:
+            poll_again = True
+    else:
         # Store results
+        results = queue.result(job_id) or {'error': 'Analysis cancelled', 'success': False}
         st.session_state.results = results
+        # Renders and exports of these results are cached on the job that
+        # produced them: sidebar values alone miss e.g. the resolved dates
+        st.session_state.results_job_id = job_id
+        st.session_state.job_id = None
         
         if results.get('success'):
             st.success("✅ Analysis complete! Drill targets identified.")
@@ -234,68 +436,10 @@ if st.session_state.results and st.session_state.results.get('success'):
         # Interactive map
         st.subheader("🗺️ Drill Target Locations")
         
-        # Create Folium map
-        m = folium.Map(
-            location=[latitude, longitude],
-            zoom_start=11,
-            tiles='Esri WorldImagery',
-            attr='Esri'
-        )
+        m = build_target_map(st.session_state.results_job_id, results)
         
-        # Add analysis center point
-        folium.Marker(
-            [latitude, longitude],
-            popup="Analysis Center",
-            tooltip="Analysis Center",
-            icon=folium.Icon(color='blue', icon='info-sign')
-        ).add_to(m)
-        
-        # Add drill targets
-        drill_targets = results['drill_targets']
-        
-        for _, target in drill_targets.iterrows():
-            # Colors by priority
-            color_map = {
-                'High': 'red',
-                'Medium': 'orange',
-                'Low': 'yellow'
-            }
-            
-            color = color_map.get(target['priority'], 'gray')
-            
-            popup_html = f"""
-            <div style="font-family: Arial; font-size: 12px;">
-                <b>🎯 Target #{target['rank']}</b><br>
-                <b>Confidence:</b> {target['confidence_score']}%<br>
-                <b>Priority:</b> {target['priority']}<br>
-                <b>Alteration:</b> {target['alteration_type']}<br>
-                <b>Area:</b> {target['area_km2']} km²<br>
-                <b>Coordinates:</b><br>
-                Lat: {target['latitude']:.4f}°<br>
-                Lon: {target['longitude']:.4f}°
-            </div>
-            """
-            
-            folium.Marker(
-                [target['latitude'], target['longitude']],
-                popup=folium.Popup(popup_html, max_width=250),
-                tooltip=f"Target {target['rank']} - {target['confidence_score']}%",
-                icon=folium.Icon(color=color, icon='glyphicon-flag', prefix='glyphicon')
-            ).add_to(m)
-        
-        # Add analysis radius circle
-        folium.Circle(
-            [latitude, longitude],
-            radius=radius_km * 1000,
-            color='blue',
-            fill=False,
-            weight=2,
-            opacity=0.5,
-            popup=f"Analysis Area ({radius_km} km radius)"
-        ).add_to(m)
-        
-        # Display map
-        st_folium(m, width=700, height=500)
+        # Display map (map interactions don't trigger reruns)
+        st_folium(m, width=700, height=500, returned_objects=[])
     
     with col2:
         # Key metrics
@@ -321,6 +465,7 @@ if st.session_state.results and st.session_state.results.get('success'):
     st.subheader("📋 Prioritized Drill Target Table")
     
     # Format table for display
+    drill_targets = results['drill_targets']
     display_df = drill_targets.copy()
     display_df['latitude'] = display_df['latitude'].round(4)
     display_df['longitude'] = display_df['longitude'].round(4)
@@ -345,7 +490,7 @@ if st.session_state.results and st.session_state.results.get('success'):
     
     with col1:
         # CSV export
-        csv = display_df.to_csv(index=False)
+        csv = export_csv(st.session_state.results_job_id, display_df)
         st.download_button(
             label="📄 Download CSV Table",
             data=csv,
@@ -356,29 +501,58 @@ if st.session_state.results and st.session_state.results.get('success'):
     
     with col2:
         # KML export
-        try:
-            kml_path = create_kml_export(drill_targets, results['cluster_stats'])
-            if kml_path:
-                with open(kml_path, 'r') as f:
-                    kml_data = f.read()
-                st.download_button(
-                    label="🗺️ Download KML (for QGIS)",
-                    data=kml_data,
-                    file_name=f"drill_targets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.kml",
-                    mime="application/vnd.google-earth.kml+xml",
-                    use_container_width=True
-                )
-        except Exception as e:
-            st.warning(f"KML export unavailable: {e}")
+        kml_data = export_kml(st.session_state.results_job_id, drill_targets,
+                              results['cluster_stats'])
+        if kml_data:
+            st.download_button(
+                label="🗺️ Download KML (for QGIS)",
+                data=kml_data,
+                file_name=f"drill_targets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.kml",
+                mime="application/vnd.google-earth.kml+xml",
+                use_container_width=True
+            )
+        else:
+            st.warning("KML export unavailable")
     
     # Detailed cluster information (expandable)
     with st.expander("🔬 View Detailed Cluster Analysis"):
-        cluster_df = pd.DataFrame(results['cluster_stats'])
+        cluster_df = results['cluster_stats'].to_pandas()
         st.dataframe(
             cluster_df[['cluster_id', 'priority', 'confidence_score', 
                        'alteration_type', 'area_km2', 'mean_iron_oxide', 'mean_clay_minerals']],
             use_container_width=True
         )
+    
+    # Where the time went (per-stage wall time and GEE transfer)
+    if results.get('k_selection'):
+        with st.expander("🔢 Cluster Count Selection"):
+            selection = results['k_selection']
+            st.write(f"Selected **k = {selection['k']}** by {selection['method']} "
+                     f"on {selection['n_samples']:,} samples ({selection['elapsed_s']:.2f} s)")
+            st.bar_chart(pd.Series(selection['scores'], name='score'))
+            if selection['skipped']:
+                st.caption(f"Skipped (time budget): k = {selection['skipped']}")
+            if selection.get('unconverged'):
+                st.caption(f"Stopped at the time budget before converging: "
+                           f"k = {selection['unconverged']}")
+    
+    if results.get('adaptive_sampling'):
+        with st.expander("🎯 Adaptive Sampling"):
+            plan = results['adaptive_sampling']
+            st.write(f"Sampled **{plan['sampled']:,}** of {plan['planned']:,} planned pixels "
+                     f"(+{plan['pilot']:,} pilot) from {plan['population']:,} - "
+                     f"{'converged' if plan['converged'] else 'stopped at the plan'}")
+            st.dataframe(pd.DataFrame({'pixels': plan['strata_pixels'],
+                                       'samples': plan['strata_samples']}),
+                         use_container_width=True)
+            st.line_chart(pd.DataFrame(plan['rounds']).set_index('n'))
+    
+    with st.expander("⏱️ Performance Details"):
+        instrumentation = results.get('instrumentation', {})
+        st.write(f"Total: {instrumentation.get('total_s', 0):.2f} s")
+        st.json({'stages_s': instrumentation.get('stages_s', {}),
+                 'counters': instrumentation.get('counters', {}),
+                 'gee_scheduler': results.get('scheduler', {})})
 
 elif st.session_state.results and not st.session_state.results.get('success'):
     st.error(f"Analysis failed: {st.session_state.results.get('error')}")
@@ -416,3 +590,8 @@ st.markdown("""
     </p>
 </div>
 """, unsafe_allow_html=True)
+
+# Keep polling while a job is in flight
+if poll_again:
+    time.sleep(1)
+    st.rerun()
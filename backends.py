@@ -0,0 +1,932 @@
+"""
+Raster Backends
+===============
+Pluggable data backends for the MineralExplorationAnalyzer pipeline.
+
+Every backend exposes the same small interface used by the analyzer:
+
+- ``make_aoi(lat, lon, radius_km)``: circular area of interest
+- ``make_tiles(lat, lon, radius_km, tile_km)``: the same AOI as square tiles
+- ``make_box(west, south, east, north)``: rectangular area (regional scans)
+- ``get_composite(aoi, start_date, end_date, cloud_cover_max)``: band image
+- ``calculate_band_ratios(image)``: image with alteration indices added
+- ``sample_features(image, aoi, ...)``: ``(X, coords)`` NumPy arrays
+- ``sample_chunk(image, aoi, ..., chunk, n_chunks)``: one part of a large
+  sample, for streaming clustering in bounded memory
+- ``cluster_aggregates(image, aoi, ...)``: per-cluster aggregates computed
+  next to the data (no per-pixel payload)
+- ``stratum_counts(image, aoi, ..., edges)`` / ``sample_stratified(...)``:
+  pixels per alteration-score stratum and a stratified sample (adaptive
+  sampling)
+- ``index_raster(image, aoi, scale, bands)``: index bands of the AOI as
+  NumPy grids (map overlays)
+
+``EarthEngineBackend`` runs everything server-side on Google Earth Engine.
+``LocalRasterBackend`` runs the same steps on local Sentinel-2 band stacks
+(.npy / memory-mapped arrays with a geotransform), so archived scenes can be
+re-analysed at local-disk speed and the engine can be tested offline.
+"""
+
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from band_indices import compute_indices
+from cluster_stats import grouped_cluster_stats
+from instrumentation import current_profile
+
+# earthengine-api is imported lazily by EarthEngineBackend (slow import,
+# only needed for live analyses)
+ee = None
+
+
+# Sentinel-2 bands used by the pipeline
+REQUIRED_BANDS = ['B2', 'B4', 'B8', 'B11', 'B12']
+
+# Indices used as clustering features (order matters: columns of X)
+FEATURE_BANDS = ['iron_oxide', 'clay_minerals', 'ferrous_iron']
+
+# Weights of FEATURE_BANDS in the alteration (priority) score
+SCORE_WEIGHTS = (0.4, 0.4, 0.2)
+
+# Index bands returned by index_raster (map overlays)
+RASTER_BANDS = FEATURE_BANDS + ['ndvi']
+
+# Fill value of masked pixels in computePixels rasters (NaN is not JSON)
+RASTER_NODATA = -9999.0
+
+# Pixel coordinate bands sampled alongside the features
+COORD_BANDS = ['longitude', 'latitude']
+
+# Approximate length of one degree (km) for local AOI geometry
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+
+def tile_grid(lat, lon, radius_km, tile_km):
+    """
+    Square tiles covering a circular AOI.
+
+    Args:
+        lat (float): AOI center latitude
+        lon (float): AOI center longitude
+        radius_km (float): AOI radius in kilometers
+        tile_km (float): Tile edge length in kilometers
+
+    Returns:
+        list: (west, south, east, north) boxes in degrees that intersect the circle
+    """
+    n_side = max(1, int(math.ceil(2 * radius_km / tile_km)))
+    km_per_deg_lon = KM_PER_DEG_LON * math.cos(math.radians(lat))
+    edges = -radius_km + tile_km * np.arange(n_side + 1)
+
+    boxes = []
+    for i in range(n_side):
+        for j in range(n_side):
+            x_lo, x_hi = edges[j], min(edges[j + 1], radius_km)
+            y_lo, y_hi = edges[i], min(edges[i + 1], radius_km)
+            # Closest point of the tile to the AOI center
+            nearest_x = min(max(0.0, x_lo), x_hi)
+            nearest_y = min(max(0.0, y_lo), y_hi)
+            if nearest_x ** 2 + nearest_y ** 2 > radius_km ** 2:
+                continue
+            boxes.append((lon + x_lo / km_per_deg_lon, lat + y_lo / KM_PER_DEG_LAT,
+                          lon + x_hi / km_per_deg_lon, lat + y_hi / KM_PER_DEG_LAT))
+    return boxes
+
+
+def _load_ee():
+    """Import earthengine-api on first use."""
+    global ee
+    if ee is None:
+        try:
+            import ee as ee_module
+        except ImportError:
+            raise ImportError("earthengine-api is required for EarthEngineBackend")
+        ee = ee_module
+    return ee
+
+
+def _get_info(obj):
+    """
+    Blocking getInfo() round-trip, recorded in the active RunProfile.
+
+    The payload size (re-serialized JSON) is only counted by detailed
+    (profiled or memory-traced) runs, as serializing large pulls costs time.
+    """
+    start = time.perf_counter()
+    result = obj.getInfo()
+
+    profile = current_profile()
+    if profile is not None:
+        profile.count('getinfo_calls')
+        profile.count('getinfo_s', round(time.perf_counter() - start, 4))
+        if profile.detailed:
+            profile.count('getinfo_bytes', len(json.dumps(result)))
+    return result
+
+
+def _service_account_credentials(credentials):
+    """
+    Build ee.ServiceAccountCredentials from a dict (client_email/private_key)
+    or a path to a service-account JSON key file.
+    """
+    if isinstance(credentials, dict):
+        return ee.ServiceAccountCredentials(
+            email=credentials['client_email'],
+            key_data=credentials['private_key']
+        )
+    with open(credentials) as f:
+        key_data = f.read()
+    return ee.ServiceAccountCredentials(
+        email=json.loads(key_data)['client_email'],
+        key_data=key_data
+    )
+
+
+class EarthEngineBackend:
+    """
+    Runs the pipeline on Google Earth Engine using live ``ee`` objects.
+    """
+
+    name = 'earthengine'
+    source = 'COPERNICUS/S2_SR_HARMONIZED'
+    remote = True
+
+    def __init__(self, credentials=None):
+        """
+        Initialize Google Earth Engine.
+
+        Credentials are resolved in order: the ``credentials`` argument
+        (service-account dict with client_email/private_key, or a path to a
+        service-account JSON key), Streamlit secrets when running inside the
+        Streamlit app, then the local ``earthengine authenticate`` token.
+        """
+        _load_ee()
+
+        try:
+            if credentials is None and 'streamlit' in sys.modules:
+                # Running inside Streamlit (Cloud secrets may be available)
+                import streamlit as st
+                try:
+                    if 'gee' in st.secrets:
+                        credentials = dict(st.secrets['gee'])
+                except FileNotFoundError:
+                    pass  # No secrets.toml - local development
+
+            if credentials is not None:
+                # Use service account authentication
+                ee.Initialize(_service_account_credentials(credentials))
+                print("✅ Google Earth Engine initialized (Service Account)")
+            else:
+                # Local development - use standard authentication
+                ee.Initialize()
+                print("✅ Google Earth Engine initialized (Local)")
+
+        except Exception as e:
+            print(f"❌ GEE initialization error: {e}")
+            print("💡 Run: earthengine authenticate")
+            if 'streamlit' in sys.modules:
+                import streamlit as st
+                st.error("Google Earth Engine authentication failed. Check secrets configuration.")
+
+    def make_aoi(self, lat, lon, radius_km):
+        """Circular buffer around the point (ee.Geometry)."""
+        point = ee.Geometry.Point([lon, lat])
+        return point.buffer(radius_km * 1000)  # Convert km to meters
+
+    def make_tiles(self, lat, lon, radius_km, tile_km):
+        """Circular AOI split into square tiles (one ee.Geometry per tile)."""
+        aoi = self.make_aoi(lat, lon, radius_km)
+        return [
+            ee.Geometry.Rectangle(list(box)).intersection(aoi, maxError=1)
+            for box in tile_grid(lat, lon, radius_km, tile_km)
+        ]
+
+    def tile_areas_km2(self, tiles):
+        """Area of every tile (km^2), in one request."""
+        areas = _get_info(ee.List([tile.area(maxError=1) for tile in tiles]))
+        return np.asarray(areas, dtype=np.float64) / 1e6
+
+    def make_box(self, west, south, east, north):
+        """Rectangular area in degrees (ee.Geometry)."""
+        return ee.Geometry.Rectangle([west, south, east, north])
+
+    def get_composite(self, aoi, start_date, end_date, cloud_cover_max=20):
+        """
+        Median cloud-masked Sentinel-2 SR composite clipped to the AOI.
+
+        Returns:
+            ee.Image: Median composite scaled to reflectance
+        """
+        # Fetch Sentinel-2 Surface Reflectance data
+        s2_collection = ee.ImageCollection(self.source) \
+            .filterBounds(aoi) \
+            .filterDate(start_date, end_date) \
+            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', cloud_cover_max))
+
+        # Cloud masking function
+        def mask_clouds(image):
+            qa = image.select('QA60')
+            # Bits 10 and 11 are clouds and cirrus
+            cloud_mask = qa.bitwiseAnd(1 << 10).eq(0).And(
+                        qa.bitwiseAnd(1 << 11).eq(0))
+            return image.updateMask(cloud_mask).divide(10000)  # Scale to reflectance
+
+        # Apply cloud mask and get median composite
+        return s2_collection.map(mask_clouds).median().clip(aoi)
+
+    def calculate_band_ratios(self, image):
+        """
+        Add iron oxide, clay minerals, NDVI and ferrous iron bands.
+
+        Returns:
+            ee.Image: Input image with the index bands appended
+        """
+        # Band selection
+        red = image.select('B4')
+        blue = image.select('B2')
+        nir = image.select('B8')
+        swir1 = image.select('B11')
+        swir2 = image.select('B12')
+
+        # Iron Oxide Index (Ferric Iron)
+        # High values = iron oxide presence (gossans, oxidized zones)
+        iron_oxide = red.subtract(blue).divide(red.add(blue)).rename('iron_oxide')
+
+        # Clay Minerals Index (Hydroxyl-bearing minerals)
+        # High values = clay alteration (kaolinite, alunite)
+        clay_minerals = swir1.divide(swir2).rename('clay_minerals')
+
+        # NDVI for vegetation masking
+        # Exclude vegetated areas (false positives)
+        ndvi = nir.subtract(red).divide(nir.add(red)).rename('ndvi')
+
+        # Ferrous Iron Index (additional indicator)
+        # B12 / B8 ratio
+        ferrous_iron = swir2.divide(nir).rename('ferrous_iron')
+
+        # Combine all indices
+        return image.addBands([iron_oxide, clay_minerals, ndvi, ferrous_iron])
+
+    def sample_features(self, image_with_indices, aoi, ndvi_threshold=0.3,
+                        scale=60, num_pixels=5000):
+        """
+        Sample non-vegetated pixels and pull them to the client.
+
+        Returns:
+            tuple: (X, coords) - (N, 3) float32 features and (N, 2) lon/lat
+        """
+        # Mask out vegetation (NDVI > threshold)
+        non_veg_mask = image_with_indices.select('ndvi').lt(ndvi_threshold)
+        masked_indices = image_with_indices.updateMask(non_veg_mask)
+
+        # Select features for clustering, plus per-pixel lon/lat as bands
+        # so coordinates come back as plain columns instead of geometries
+        features = masked_indices.select(FEATURE_BANDS) \
+            .addBands(ee.Image.pixelLonLat().rename(COORD_BANDS))
+
+        # Sample points for clustering (for performance)
+        sample = features.sample(
+            region=aoi,
+            scale=scale,
+            numPixels=num_pixels,
+            geometries=False
+        )
+
+        # Fetch the sample column-wise: one list per band, no per-feature dicts
+        columns = FEATURE_BANDS + COORD_BANDS
+        table = _get_info(sample.reduceColumns(
+            ee.Reducer.toList().repeat(len(columns)), columns
+        ).get('list'))
+
+        return columns_to_arrays(table)
+
+    def sample_chunk(self, image_with_indices, aoi, ndvi_threshold=0.3, scale=60,
+                     num_pixels=5000, chunk=0, n_chunks=1):
+        """
+        One of ``n_chunks`` disjoint parts of a large pixel sample.
+
+        The sample is drawn with a fixed seed and split on a seeded random
+        column, so every chunk request sees the same sample and the chunks
+        partition it; each chunk is one bounded getInfo payload.
+
+        Returns:
+            tuple: (X, coords) for this chunk
+        """
+        non_veg_mask = image_with_indices.select('ndvi').lt(ndvi_threshold)
+        features = image_with_indices.updateMask(non_veg_mask).select(FEATURE_BANDS) \
+            .addBands(ee.Image.pixelLonLat().rename(COORD_BANDS))
+
+        sample = features.sample(
+            region=aoi,
+            scale=scale,
+            numPixels=num_pixels,
+            seed=0,
+            geometries=False
+        ).randomColumn('chunk_key', 0)
+        part = sample.filter(ee.Filter.And(
+            ee.Filter.gte('chunk_key', chunk / n_chunks),
+            ee.Filter.lt('chunk_key', (chunk + 1) / n_chunks)
+        ))
+
+        columns = FEATURE_BANDS + COORD_BANDS
+        table = _get_info(part.reduceColumns(
+            ee.Reducer.toList().repeat(len(columns)), columns
+        ).get('list'))
+
+        return columns_to_arrays(table)
+
+    def cluster_aggregates(self, image_with_indices, aoi, n_clusters=4, ndvi_threshold=0.3,
+                           scale=60, num_pixels=5000):
+        """
+        Train ``ee.Clusterer.wekaKMeans`` on a server-side sample, classify
+        every AOI pixel next to the data and return only per-cluster
+        aggregates (means, spreads, centroids, pixel counts, true areas).
+
+        Returns:
+            dict: grouped_cluster_stats-style arrays plus ``area_km2``
+        """
+        # Mask out vegetation (NDVI > threshold)
+        non_veg_mask = image_with_indices.select('ndvi').lt(ndvi_threshold)
+        features = image_with_indices.updateMask(non_veg_mask).select(FEATURE_BANDS)
+
+        # Train on a sample that never leaves the server
+        training = features.sample(region=aoi, scale=scale, numPixels=num_pixels)
+        clusterer = ee.Clusterer.wekaKMeans(n_clusters, seed=42).train(training)
+        clustered = features.cluster(clusterer)
+
+        # Band order: features, lon, lat | pixel area | cluster (group field)
+        stack = features \
+            .addBands(ee.Image.pixelLonLat().rename(COORD_BANDS)) \
+            .addBands(ee.Image.pixelArea()) \
+            .addBands(clustered)
+        n_values = len(FEATURE_BANDS) + len(COORD_BANDS)
+        reducer = ee.Reducer.mean().combine(ee.Reducer.stdDev(), sharedInputs=True) \
+            .repeat(n_values) \
+            .combine(ee.Reducer.sum().combine(ee.Reducer.count(), sharedInputs=True),
+                     sharedInputs=False) \
+            .group(groupField=n_values + 1, groupName='cluster')
+
+        groups = _get_info(stack.reduceRegion(
+            reducer=reducer,
+            geometry=aoi,
+            scale=scale,
+            maxPixels=1e10,
+            tileScale=4
+        ).get('groups'))
+
+        groups = sorted((g for g in groups if g.get('count')), key=lambda g: g['cluster'])
+        n_features = len(FEATURE_BANDS)
+        mean = np.array([g['mean'] for g in groups], dtype=np.float64).reshape(-1, n_values)
+        std = np.array([g['stdDev'] for g in groups], dtype=np.float64).reshape(-1, n_values)
+
+        return {
+            'cluster_id': np.array([g['cluster'] for g in groups], dtype=np.int64),
+            'count': np.array([g['count'] for g in groups], dtype=np.int64),
+            'mean': mean[:, :n_features],
+            'std': std[:, :n_features],
+            'centroid': mean[:, n_features:],
+            'sample_points': [[] for _ in groups],
+            'area_km2': np.array([g['sum'] for g in groups], dtype=np.float64) / 1e6
+        }
+
+    def _strata_image(self, image_with_indices, ndvi_threshold, edges):
+        """Vegetation-masked features plus a 'stratum' band (score edges exceeded)."""
+        non_veg_mask = image_with_indices.select('ndvi').lt(ndvi_threshold)
+        masked = image_with_indices.updateMask(non_veg_mask).select(FEATURE_BANDS)
+        score = masked.multiply(ee.Image.constant(list(SCORE_WEIGHTS))).reduce(ee.Reducer.sum())
+        strata = ee.Image.constant(0)
+        for edge in edges:
+            strata = strata.add(score.gt(edge))
+        return masked, strata.updateMask(score.mask()).toInt().rename('stratum')
+
+    def stratum_counts(self, image_with_indices, aoi, ndvi_threshold=0.3, scale=60, edges=()):
+        """
+        Non-vegetated AOI pixels per alteration-score stratum, counted
+        server-side (a histogram, no pixel payload).
+
+        Returns:
+            np.ndarray: Pixel count per stratum (len(edges) + 1)
+        """
+        _, strata = self._strata_image(image_with_indices, ndvi_threshold, edges)
+        histogram = _get_info(strata.reduceRegion(
+            reducer=ee.Reducer.frequencyHistogram(),
+            geometry=aoi,
+            scale=scale,
+            maxPixels=1e10
+        ).get('stratum')) or {}
+        return np.array([round(histogram.get(str(h), 0)) for h in range(len(edges) + 1)],
+                        dtype=np.int64)
+
+    def sample_stratified(self, image_with_indices, aoi, ndvi_threshold=0.3, scale=60,
+                          edges=(), class_points=(), ranges=None, seed=0):
+        """
+        Stratified sample with ``class_points[h]`` pixels from stratum ``h``.
+
+        With ``ranges``, stratum ``h`` is restricted to the pixels whose
+        seeded uniform random value lies in ``ranges[h]`` (start, stop), so
+        batches drawn with disjoint ranges never share a pixel.
+
+        Returns:
+            tuple: (X, coords, strata)
+        """
+        masked, strata = self._strata_image(image_with_indices, ndvi_threshold, edges)
+        if ranges is not None:
+            classes = list(range(len(class_points)))
+            random = ee.Image.random(seed)
+            start = strata.remap(classes, [float(r[0]) for r in ranges])
+            stop = strata.remap(classes, [float(r[1]) for r in ranges])
+            strata = strata.updateMask(random.gte(start).And(random.lt(stop)))
+        features = masked.addBands(ee.Image.pixelLonLat().rename(COORD_BANDS)).addBands(strata)
+
+        sample = features.stratifiedSample(
+            numPoints=0,
+            classBand='stratum',
+            region=aoi,
+            scale=scale,
+            seed=seed,
+            classValues=list(range(len(class_points))),
+            classPoints=[int(n) for n in class_points],
+            geometries=False
+        )
+
+        columns = FEATURE_BANDS + COORD_BANDS + ['stratum']
+        table = _get_info(sample.reduceColumns(
+            ee.Reducer.toList().repeat(len(columns)), columns
+        ).get('list'))
+
+        # A stratum value implies every feature is present, so the feature
+        # columns keep the same rows after dropping null strata
+        keep = [i for i, value in enumerate(table[-1]) if value is not None]
+        X, coords = columns_to_arrays([[column[i] for i in keep] for column in table[:-1]])
+        return X, coords, np.asarray([table[-1][i] for i in keep], dtype=np.int64)
+
+    def index_raster(self, image_with_indices, aoi, scale=60, bands=None):
+        """
+        Index bands of the AOI on a ``scale``-metre lon/lat grid, fetched
+        with one computePixels request (keep it under ~48 MB).
+
+        Returns:
+            tuple: (band name -> 2D float32 array with NaN where masked,
+            GDAL-style geotransform)
+        """
+        bands = list(bands or RASTER_BANDS)
+        ring = _get_info(aoi.bounds(maxError=1))['coordinates'][0]
+        west, east = min(p[0] for p in ring), max(p[0] for p in ring)
+        south, north = min(p[1] for p in ring), max(p[1] for p in ring)
+        dlat = scale / 1000 / KM_PER_DEG_LAT
+        dlon = scale / 1000 / (KM_PER_DEG_LON * math.cos(math.radians((south + north) / 2)))
+
+        start = time.perf_counter()
+        pixels = ee.data.computePixels({
+            'expression': image_with_indices.select(bands).toFloat().unmask(RASTER_NODATA),
+            'fileFormat': 'NUMPY_NDARRAY',
+            'grid': {
+                'dimensions': {'width': int(math.ceil((east - west) / dlon)),
+                               'height': int(math.ceil((north - south) / dlat))},
+                'affineTransform': {'scaleX': dlon, 'shearX': 0, 'translateX': west,
+                                    'shearY': 0, 'scaleY': -dlat, 'translateY': north},
+                'crsCode': 'EPSG:4326'
+            }
+        })
+        profile = current_profile()
+        if profile is not None:
+            profile.count('compute_pixels_calls')
+            profile.count('compute_pixels_s', round(time.perf_counter() - start, 4))
+            profile.count('compute_pixels_bytes', int(pixels.nbytes))
+
+        arrays = {}
+        for b in bands:
+            values = np.array(pixels[b], dtype=np.float32)
+            values[values == RASTER_NODATA] = np.nan
+            arrays[b] = values
+        return arrays, (west, dlon, 0.0, north, 0.0, -dlat)
+
+
+def columns_to_arrays(columns):
+    """
+    Convert sampled band columns to preallocated arrays, dropping nulls.
+
+    Args:
+        columns (list): One sequence per band in FEATURE_BANDS + COORD_BANDS
+            order (None marks a null value)
+
+    Returns:
+        tuple: (X, coords) - (N, 3) float32 features and (N, 2) lon/lat
+    """
+    n_rows = len(columns[0]) if columns else 0
+    n_features = len(FEATURE_BANDS)
+
+    X = np.empty((n_rows, n_features), dtype=np.float32)
+    coords = np.empty((n_rows, 2), dtype=np.float64)
+    for j in range(n_features):
+        X[:, j] = np.asarray(columns[j], dtype=np.float32)  # None -> NaN
+    for j in range(2):
+        coords[:, j] = np.asarray(columns[n_features + j], dtype=np.float64)
+
+    # Vectorized null mask: keep rows where every value is present
+    valid = np.isfinite(X).all(axis=1) & np.isfinite(coords).all(axis=1)
+    if not valid.all():
+        X, coords = X[valid], coords[valid]
+    return X, coords
+
+
+# Window of a local scene covered by an AOI, plus the circular mask inside it
+LocalAOI = namedtuple('LocalAOI', ['rows', 'cols', 'mask', 'lat', 'lon', 'radius_km'])
+
+
+class LocalScene:
+    """
+    Named band arrays for one window of a local scene (the local ee.Image).
+
+    Args:
+        bands (dict): Band name -> 2D array (may be a memory-map view)
+        geotransform (tuple): GDAL-style (x0, dx, 0, y0, 0, dy) in degrees
+        mask (np.ndarray): Boolean validity mask (AOI footprint)
+        scale_factor (float): Divisor converting stored DN to reflectance
+    """
+
+    def __init__(self, bands, geotransform, mask=None, scale_factor=10000.0):
+        self.bands = dict(bands)
+        self.geotransform = tuple(geotransform)
+        self.scale_factor = scale_factor
+        self.shape = next(iter(self.bands.values())).shape
+        self.mask = np.ones(self.shape, dtype=bool) if mask is None else mask
+
+    def select(self, name):
+        """Return a band as-is (raw values for input bands)."""
+        return self.bands[name]
+
+    def reflectance(self, name):
+        """Return an input band scaled to float32 reflectance."""
+        band = np.asarray(self.bands[name], dtype=np.float32)
+        return band / np.float32(self.scale_factor)
+
+    def add_bands(self, new_bands):
+        """Return a new scene with extra bands (like ee.Image.addBands)."""
+        bands = dict(self.bands)
+        bands.update(new_bands)
+        return LocalScene(bands, self.geotransform, self.mask, self.scale_factor)
+
+    def pixel_centers(self, rows, cols):
+        """Lon/lat of pixel centers for integer row/col index arrays."""
+        x0, dx, _, y0, _, dy = self.geotransform
+        lon = x0 + (np.asarray(cols) + 0.5) * dx
+        lat = y0 + (np.asarray(rows) + 0.5) * dy
+        return lon, lat
+
+    def coarsened(self, scale):
+        """
+        View of every ``scale``-metre grid pixel (the pixels the samplers
+        read), with the same pixel centers; bands stay memory-map views.
+        """
+        step = max(1, int(round(scale / self.pixel_size_m())))
+        if step == 1:
+            return self
+        window = (slice(None, None, step), slice(None, None, step))
+        x0, dx, _, y0, _, dy = self.geotransform
+        shift = (step - 1) / 2
+        return LocalScene({b: values[window] for b, values in self.bands.items()},
+                          (x0 - shift * dx, dx * step, 0.0, y0 - shift * dy, 0.0, dy * step),
+                          self.mask[window], self.scale_factor)
+
+    def pixel_size_m(self):
+        """Approximate ground pixel size (m) at the scene center."""
+        x0, dx, _, y0, _, dy = self.geotransform
+        center_lat = y0 + dy * self.shape[0] / 2
+        size_x = abs(dx) * KM_PER_DEG_LON * math.cos(math.radians(center_lat))
+        size_y = abs(dy) * KM_PER_DEG_LAT
+        return 1000 * (size_x + size_y) / 2
+
+
+class LocalRasterBackend:
+    """
+    Runs the pipeline on a local Sentinel-2 band stack with NumPy.
+
+    The scene is treated as an already cloud-free composite, so the date
+    window and cloud cover arguments of ``get_composite`` are ignored.
+
+    Args:
+        bands (dict): Band name -> 2D array for B2, B4, B8, B11 and B12
+        geotransform (tuple): GDAL-style (x0, dx, 0, y0, 0, dy) in EPSG:4326
+        scale_factor (float): Divisor converting stored DN to reflectance
+        seed (int): Random seed for pixel sampling
+    """
+
+    name = 'local'
+    remote = False
+
+    def __init__(self, bands, geotransform, scale_factor=10000.0, seed=0):
+        missing = [b for b in REQUIRED_BANDS if b not in bands]
+        if missing:
+            raise ValueError(f"Missing Sentinel-2 bands: {missing}")
+
+        self.bands = {b: bands[b] for b in REQUIRED_BANDS}
+        self.geotransform = tuple(geotransform)
+        self.scale_factor = scale_factor
+        self.seed = seed
+        self.shape = self.bands['B4'].shape
+        self.source = None
+        self._chunk_selection = None  # pixel sample being read chunk by chunk
+        self._chunk_lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, path, mmap=True, **kwargs):
+        """
+        Load a scene directory with one ``<band>.npy`` file per band and a
+        ``scene.json`` holding ``geotransform`` (and optional ``scale_factor``).
+        """
+        with open(os.path.join(path, 'scene.json')) as f:
+            meta = json.load(f)
+
+        mmap_mode = 'r' if mmap else None
+        bands = {
+            b: np.load(os.path.join(path, f"{b}.npy"), mmap_mode=mmap_mode)
+            for b in REQUIRED_BANDS
+        }
+        kwargs.setdefault('scale_factor', meta.get('scale_factor', 10000.0))
+
+        backend = cls(bands, meta['geotransform'], **kwargs)
+        backend.source = os.path.abspath(path)
+        return backend
+
+    def make_aoi(self, lat, lon, radius_km):
+        """Pixel window bounding the circle plus the circular mask inside it."""
+        x0, dx, _, y0, _, dy = self.geotransform
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = radius_km / (KM_PER_DEG_LON * math.cos(math.radians(lat)))
+
+        col_a, col_b = sorted([(lon - dlon - x0) / dx, (lon + dlon - x0) / dx])
+        row_a, row_b = sorted([(lat + dlat - y0) / dy, (lat - dlat - y0) / dy])
+        rows = slice(max(int(math.floor(row_a)), 0), min(int(math.ceil(row_b)), self.shape[0]))
+        cols = slice(max(int(math.floor(col_a)), 0), min(int(math.ceil(col_b)), self.shape[1]))
+
+        if rows.start >= rows.stop or cols.start >= cols.stop:
+            raise ValueError("Area of interest does not intersect the local scene")
+
+        # Equirectangular distance of every pixel center to the AOI center
+        lon_c = x0 + (np.arange(cols.start, cols.stop) + 0.5) * dx
+        lat_c = y0 + (np.arange(rows.start, rows.stop) + 0.5) * dy
+        dx_km = (lon_c - lon) * KM_PER_DEG_LON * math.cos(math.radians(lat))
+        dy_km = (lat_c - lat) * KM_PER_DEG_LAT
+        mask = dy_km[:, None] ** 2 + dx_km[None, :] ** 2 <= radius_km ** 2
+
+        return LocalAOI(rows, cols, mask, lat, lon, radius_km)
+
+    def make_tiles(self, lat, lon, radius_km, tile_km):
+        """Circular AOI split into square tiles (sub-windows of its mask)."""
+        aoi = self.make_aoi(lat, lon, radius_km)
+        x0, dx, _, y0, _, dy = self.geotransform
+
+        tiles = []
+        for west, south, east, north in tile_grid(lat, lon, radius_km, tile_km):
+            col_a, col_b = sorted([(west - x0) / dx, (east - x0) / dx])
+            row_a, row_b = sorted([(north - y0) / dy, (south - y0) / dy])
+            rows = slice(max(int(round(row_a)), aoi.rows.start), min(int(round(row_b)), aoi.rows.stop))
+            cols = slice(max(int(round(col_a)), aoi.cols.start), min(int(round(col_b)), aoi.cols.stop))
+            if rows.start >= rows.stop or cols.start >= cols.stop:
+                continue
+
+            mask = aoi.mask[rows.start - aoi.rows.start:rows.stop - aoi.rows.start,
+                            cols.start - aoi.cols.start:cols.stop - aoi.cols.start]
+            if mask.any():
+                tiles.append(LocalAOI(rows, cols, mask, lat, lon, radius_km))
+        return tiles
+
+    def tile_areas_km2(self, tiles):
+        """Ground area of the valid (masked-in) pixels of every tile (km^2)."""
+        x0, dx, _, y0, _, dy = self.geotransform
+        pixel_km2 = abs(dx * dy) * KM_PER_DEG_LON * KM_PER_DEG_LAT
+        areas = []
+        for tile in tiles:
+            lat = y0 + (np.arange(tile.rows.start, tile.rows.stop) + 0.5) * dy
+            areas.append(float(tile.mask.sum(axis=1) @ np.cos(np.radians(lat))) * pixel_km2)
+        return np.asarray(areas, dtype=np.float64)
+
+    def make_box(self, west, south, east, north):
+        """Pixel window of a lon/lat box (clipped to the scene), fully valid."""
+        x0, dx, _, y0, _, dy = self.geotransform
+        col_a, col_b = sorted([(west - x0) / dx, (east - x0) / dx])
+        row_a, row_b = sorted([(north - y0) / dy, (south - y0) / dy])
+        rows = slice(max(int(round(row_a)), 0), min(int(round(row_b)), self.shape[0]))
+        cols = slice(max(int(round(col_a)), 0), min(int(round(col_b)), self.shape[1]))
+
+        if rows.start >= rows.stop or cols.start >= cols.stop:
+            raise ValueError("Area of interest does not intersect the local scene")
+
+        mask = np.ones((rows.stop - rows.start, cols.stop - cols.start), dtype=bool)
+        return LocalAOI(rows, cols, mask, (south + north) / 2, (west + east) / 2, None)
+
+    def get_composite(self, aoi, start_date=None, end_date=None, cloud_cover_max=20):
+        """
+        Window of the local scene covering the AOI (memory-map views, no copy).
+
+        Returns:
+            LocalScene: Bands clipped to the AOI window
+        """
+        x0, dx, _, y0, _, dy = self.geotransform
+        geotransform = (x0 + aoi.cols.start * dx, dx, 0.0,
+                        y0 + aoi.rows.start * dy, 0.0, dy)
+        bands = {b: arr[aoi.rows, aoi.cols] for b, arr in self.bands.items()}
+        return LocalScene(bands, geotransform, aoi.mask, self.scale_factor)
+
+    def calculate_band_ratios(self, image, max_workers=None):
+        """
+        Alteration indices from the fused float32 kernel (see band_indices);
+        division by zero yields NaN (masked).
+
+        Args:
+            image (LocalScene): Scene with the input bands
+            max_workers (int): Threads over row blocks (default INDEX_WORKERS)
+
+        Returns:
+            LocalScene: Input scene with the index bands added
+        """
+        indices = compute_indices({b: image.select(b) for b in REQUIRED_BANDS},
+                                  max_workers=max_workers)
+        return image.add_bands(indices)
+
+    def index_raster(self, image_with_indices, aoi, scale=60, bands=None):
+        """
+        Index bands of the AOI window on a ``scale``-metre grid, NaN
+        outside the AOI.
+
+        Returns:
+            tuple: (band name -> 2D float32 array, GDAL-style geotransform)
+        """
+        bands = list(bands or RASTER_BANDS)
+        step = max(1, int(round(scale / image_with_indices.pixel_size_m())))
+        window = (slice(None, None, step), slice(None, None, step))
+        outside = ~image_with_indices.mask[window]
+
+        arrays = {}
+        for b in bands:
+            values = np.array(image_with_indices.select(b)[window], dtype=np.float32)
+            values[outside] = np.nan
+            arrays[b] = values
+
+        # Coarse cells centered on the pixels they were sampled from
+        x0, dx, _, y0, _, dy = image_with_indices.geotransform
+        shift = (step - 1) / 2
+        return arrays, (x0 - shift * dx, dx * step, 0.0, y0 - shift * dy, 0.0, dy * step)
+
+    def sample_features(self, image_with_indices, aoi, ndvi_threshold=0.3,
+                        scale=60, num_pixels=5000):
+        """
+        Sample non-vegetated AOI pixels on a ``scale``-metre grid.
+
+        Returns:
+            tuple: (X, coords) - (N, 3) float32 features and (N, 2) lon/lat
+        """
+        features, valid, step = self._scale_grid(image_with_indices, ndvi_threshold, scale)
+
+        rows, cols = np.nonzero(valid)
+        if len(rows) > num_pixels:
+            rng = np.random.default_rng(self.seed)
+            keep = np.sort(rng.choice(len(rows), size=num_pixels, replace=False))
+            rows, cols = rows[keep], cols[keep]
+
+        X = np.column_stack([values[rows, cols] for values in features])
+        lon, lat = image_with_indices.pixel_centers(rows * step, cols * step)
+        return X, np.column_stack([lon, lat])
+
+    def sample_chunk(self, image_with_indices, aoi, ndvi_threshold=0.3, scale=60,
+                     num_pixels=5000, chunk=0, n_chunks=1):
+        """
+        One of ``n_chunks`` consecutive parts of the ``sample_features``
+        pixel sample; only the chunk's rows are gathered.
+
+        Returns:
+            tuple: (X, coords) for this chunk
+        """
+        key = (image_with_indices, ndvi_threshold, scale, num_pixels)
+        with self._chunk_lock:
+            selection = self._chunk_selection
+            if selection is None or selection[0][0] is not image_with_indices \
+                    or selection[0][1:] != key[1:]:
+                # Same pixel selection as sample_features, as flat grid indices
+                features, valid, step = self._scale_grid(image_with_indices, ndvi_threshold,
+                                                         scale)
+                index = np.flatnonzero(valid)
+                if len(index) > num_pixels:
+                    rng = np.random.default_rng(self.seed)
+                    index = index[np.sort(rng.choice(len(index), size=num_pixels,
+                                                     replace=False))]
+                selection = self._chunk_selection = (key, features, index, valid.shape[1], step)
+            _, features, index, width, step = selection
+
+        bounds = np.linspace(0, len(index), n_chunks + 1).astype(np.int64)
+        rows, cols = np.divmod(index[bounds[chunk]:bounds[chunk + 1]], width)
+
+        X = np.column_stack([values[rows, cols] for values in features])
+        lon, lat = image_with_indices.pixel_centers(rows * step, cols * step)
+        return X, np.column_stack([lon, lat])
+
+    def cluster_aggregates(self, image_with_indices, aoi, n_clusters=4, ndvi_threshold=0.3,
+                           scale=60, num_pixels=5000):
+        """
+        Train K-Means on a sample, classify every valid pixel on the
+        ``scale`` grid and aggregate per cluster (full-coverage counts/areas).
+
+        Returns:
+            dict: grouped_cluster_stats output plus ``area_km2`` per cluster
+            and the fitted ``cluster_centers``
+        """
+        from sklearn.cluster import KMeans
+
+        X_train, _ = self.sample_features(image_with_indices, aoi, ndvi_threshold,
+                                          scale, num_pixels)
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit(X_train)
+
+        features, valid, step = self._scale_grid(image_with_indices, ndvi_threshold, scale)
+        rows, cols = np.nonzero(valid)
+        X = np.column_stack([values[rows, cols] for values in features])
+        labels = kmeans.predict(X)
+
+        lon, lat = image_with_indices.pixel_centers(rows * step, cols * step)
+        stats = grouped_cluster_stats(X, labels, np.column_stack([lon, lat]), n_clusters)
+
+        # Ground area of every classified grid cell (shrinks with cos(lat))
+        x0, dx, _, y0, _, dy = image_with_indices.geotransform
+        cell_km2 = abs(dx * dy) * step * step * KM_PER_DEG_LON * KM_PER_DEG_LAT
+        area = np.bincount(labels, weights=cell_km2 * np.cos(np.radians(lat)),
+                           minlength=n_clusters)
+        stats['area_km2'] = area[stats['cluster_id']]
+        stats['cluster_centers'] = kmeans.cluster_centers_
+        return stats
+
+    def stratum_counts(self, image_with_indices, aoi, ndvi_threshold=0.3, scale=60, edges=()):
+        """
+        Non-vegetated AOI pixels per alteration-score stratum on the
+        ``scale`` grid.
+
+        Returns:
+            np.ndarray: Pixel count per stratum (len(edges) + 1)
+        """
+        _, valid, _, strata = self._strata_grid(image_with_indices, ndvi_threshold, scale, edges)
+        return np.bincount(strata[valid], minlength=len(edges) + 1)
+
+    def sample_stratified(self, image_with_indices, aoi, ndvi_threshold=0.3, scale=60,
+                          edges=(), class_points=(), ranges=None, seed=0):
+        """
+        Stratified sample with ``class_points[h]`` pixels from stratum ``h``.
+
+        Each stratum's pixels are put in one random order (fixed by
+        ``seed``); with ``ranges`` the sample of stratum ``h`` starts at
+        share ``ranges[h][0]`` of that order, so batches drawn with disjoint
+        ranges never share a pixel.
+
+        Returns:
+            tuple: (X, coords, strata)
+        """
+        features, valid, step, strata = self._strata_grid(image_with_indices, ndvi_threshold,
+                                                          scale, edges)
+        flat = np.flatnonzero(valid)
+        flat_strata = strata.ravel()[flat]
+
+        picks = []
+        for h, n in enumerate(class_points):
+            members = flat[flat_strata == h]
+            order = np.random.default_rng([self.seed, seed, h]).permutation(members)
+            start = int(round(ranges[h][0] * len(order))) if ranges is not None else 0
+            picks.append(order[start:start + int(n)])
+        index = np.sort(np.concatenate(picks)) if picks else np.empty(0, dtype=np.int64)
+
+        rows, cols = np.divmod(index, valid.shape[1])
+        X = np.column_stack([values[rows, cols] for values in features])
+        lon, lat = image_with_indices.pixel_centers(rows * step, cols * step)
+        return X, np.column_stack([lon, lat]), strata[rows, cols]
+
+    def _strata_grid(self, image_with_indices, ndvi_threshold, scale, edges):
+        """_scale_grid plus the alteration-score stratum of every grid cell."""
+        features, valid, step = self._scale_grid(image_with_indices, ndvi_threshold, scale)
+        score = sum(weight * np.where(valid, values, 0)
+                    for weight, values in zip(SCORE_WEIGHTS, features))
+        strata = np.searchsorted(np.asarray(edges, dtype=np.float64), score, side='left')
+        return features, valid, step, strata
+
+    def _scale_grid(self, image_with_indices, ndvi_threshold, scale):
+        """
+        Feature views and validity mask on a ``scale``-metre pixel grid.
+
+        Returns:
+            tuple: (features, valid, step) - strided feature arrays, boolean
+            mask of non-vegetated finite AOI pixels and the grid stride
+        """
+        step = max(1, int(round(scale / image_with_indices.pixel_size_m())))
+        window = (slice(None, None, step), slice(None, None, step))
+
+        features = [image_with_indices.select(b)[window] for b in FEATURE_BANDS]
+        valid = image_with_indices.mask[window] & \
+            (image_with_indices.select('ndvi')[window] < ndvi_threshold)
+        for values in features:
+            valid &= np.isfinite(values)
+
+        return features, valid, step
@@ -0,0 +1,101 @@
+"""
+Band Indices Kernel
+===================
+Fused float32 computation of the alteration indices of a local scene:
+
+- Iron Oxide Index: (B4 - B2) / (B4 + B2)
+- Clay Minerals: B11 / B12
+- NDVI: (B8 - B4) / (B8 + B4)
+- Ferrous Iron: B12 / B8
+
+All four are ratios, so they are computed on the stored DN directly (the
+reflectance scale factor cancels). The scene is processed in blocks of
+rows small enough to stay in cache: each block's bands are converted once
+into a per-thread float32 workspace, and every operation writes into that
+workspace or straight into the preallocated output arrays, so no
+full-size temporaries are created. Non-finite results (division by zero,
+no-data) become NaN, like masked pixels on Earth Engine. Blocks run on a
+thread pool (NumPy releases the GIL).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+INDEX_BANDS = ['iron_oxide', 'clay_minerals', 'ndvi', 'ferrous_iron']
+
+# Pixels per block: the 7 float32 workspace buffers of a block stay in cache
+BLOCK_PIXELS = 64 * 1024
+
+# Default thread count of compute_indices
+INDEX_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def _index_block(bands, out, start, stop, workspace, invalid):
+    """Compute the indices of rows ``start:stop`` into ``out`` (no allocation)."""
+    n = stop - start
+    b2, b4, b8, b11, b12, num, den = (buffer[:n] for buffer in workspace)
+    invalid = invalid[:n]
+
+    for buffer, name in zip((b2, b4, b8, b11, b12), ('B2', 'B4', 'B8', 'B11', 'B12')):
+        np.copyto(buffer, bands[name][start:stop], casting='unsafe')
+
+    iron, clay, ndvi, ferrous = (out[name][start:stop] for name in INDEX_BANDS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(b4, b2, out=num)
+        np.add(b4, b2, out=den)
+        np.divide(num, den, out=iron)
+        np.divide(b11, b12, out=clay)
+        np.subtract(b8, b4, out=num)
+        np.add(b8, b4, out=den)
+        np.divide(num, den, out=ndvi)
+        np.divide(b12, b8, out=ferrous)
+
+    # Mirror GEE masking: non-finite results are treated as no-data
+    for values in (iron, clay, ndvi, ferrous):
+        np.isfinite(values, out=invalid)
+        np.logical_not(invalid, out=invalid)
+        np.copyto(values, np.float32(np.nan), where=invalid)
+
+
+def compute_indices(bands, out=None, block_pixels=BLOCK_PIXELS, max_workers=None):
+    """
+    Alteration indices of a band stack in one fused pass.
+
+    Args:
+        bands (dict): B2, B4, B8, B11 and B12 2D arrays (any numeric dtype,
+            memory-maps included)
+        out (dict): Optional preallocated float32 arrays per INDEX_BANDS name
+        block_pixels (int): Pixels per block of rows
+        max_workers (int): Threads (default INDEX_WORKERS; 1 runs inline)
+
+    Returns:
+        dict: Index name -> float32 array (``out`` when given)
+    """
+    n_rows, n_cols = bands['B4'].shape
+    if out is None:
+        out = {name: np.empty((n_rows, n_cols), dtype=np.float32) for name in INDEX_BANDS}
+    if n_rows == 0 or n_cols == 0:
+        return out
+
+    rows = max(1, min(n_rows, block_pixels // max(n_cols, 1)))
+    blocks = [(start, min(start + rows, n_rows)) for start in range(0, n_rows, rows)]
+    local = threading.local()
+
+    def run(block):
+        if not hasattr(local, 'workspace'):
+            local.workspace = np.empty((7, rows, n_cols), dtype=np.float32)
+            local.invalid = np.empty((rows, n_cols), dtype=bool)
+        _index_block(bands, out, *block, local.workspace, local.invalid)
+
+    max_workers = INDEX_WORKERS if max_workers is None else max_workers
+    if max_workers <= 1 or len(blocks) == 1:
+        for block in blocks:
+            run(block)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(run, blocks))
+    return out
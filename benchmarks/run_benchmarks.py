@@ -0,0 +1,209 @@
+"""
+Engine Benchmarks
+=================
+Times the analysis engine on synthetic Sentinel-2 data, fully offline:
+index computation (fused kernel and the naive per-expression version),
+sample parsing, K-Means, _analyze_clusters,
+generate_drill_targets and create_kml_export, across pixel counts and
+cluster counts. Results are written as JSON so runs can be compared.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks -o bench_results.json
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 --ks 4 --compare bench_results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import sklearn
+from sklearn.cluster import KMeans
+
+from analysis_engine import MineralExplorationAnalyzer, create_kml_export
+from backends import LocalRasterBackend, LocalScene, columns_to_arrays
+from benchmarks.synthetic import make_columns, make_samples, make_scene, scene_shape_for
+
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_KS = [3, 6, 12]
+BENCHMARKS = ['indices', 'indices_naive', 'parsing', 'kmeans', 'analyze_clusters', 'drill_targets', 'kml_export']
+
+
+def time_call(fn, repeats):
+    """Best and mean wall time (s) of ``fn()`` over ``repeats`` runs."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
+
+
+def naive_band_ratios(scene):
+    """Reference indices: one full-size temporary per sub-expression."""
+    red = scene.reflectance('B4')
+    blue = scene.reflectance('B2')
+    nir = scene.reflectance('B8')
+    swir1 = scene.reflectance('B11')
+    swir2 = scene.reflectance('B12')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        indices = {
+            'iron_oxide': (red - blue) / (red + blue),
+            'clay_minerals': swir1 / swir2,
+            'ndvi': (nir - red) / (nir + red),
+            'ferrous_iron': swir2 / nir,
+        }
+    for values in indices.values():
+        values[~np.isfinite(values)] = np.nan
+    return indices
+
+
+def _record(results, name, n_pixels, k, timing, repeats):
+    best, mean = timing
+    results.append({
+        'benchmark': name,
+        'n_pixels': n_pixels,
+        'k': k,
+        'best_s': round(best, 6),
+        'mean_s': round(mean, 6),
+        'repeats': repeats
+    })
+    k_label = f" k={k}" if k is not None else ""
+    print(f"{name:>17} n={n_pixels:>9,}{k_label:<6} best {best * 1000:10.2f} ms", file=sys.stderr)
+
+
+def run(sizes, ks, repeats, selected):
+    """Run the selected benchmarks and return a list of result records."""
+    results = []
+
+    # Tiny scene: the analyzer only needs a backend to construct
+    bands, geotransform = make_scene(16, 16)
+    analyzer = MineralExplorationAnalyzer(backend=LocalRasterBackend(bands, geotransform))
+    kml_dir = tempfile.mkdtemp(prefix='bench_kml_')
+
+    for n_pixels in sizes:
+        if selected & {'indices', 'indices_naive'}:
+            bands, geotransform = make_scene(*scene_shape_for(n_pixels))
+            backend = LocalRasterBackend(bands, geotransform)
+            scene = LocalScene(bands, geotransform)
+        if 'indices' in selected:
+            _record(results, 'indices', n_pixels, None,
+                    time_call(lambda: backend.calculate_band_ratios(scene), repeats), repeats)
+        if 'indices_naive' in selected:
+            _record(results, 'indices_naive', n_pixels, None,
+                    time_call(lambda: naive_band_ratios(scene), repeats), repeats)
+
+        if 'parsing' in selected:
+            X, coords = make_samples(n_pixels)
+            columns = make_columns(X, coords)
+            _record(results, 'parsing', n_pixels, None,
+                    time_call(lambda: columns_to_arrays(columns), repeats), repeats)
+
+        for k in ks:
+            X, coords = make_samples(n_pixels, k=k)
+            kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+
+            if 'kmeans' in selected:
+                _record(results, 'kmeans', n_pixels, k,
+                        time_call(lambda: kmeans.fit(X), repeats), repeats)
+
+            if not selected & {'analyze_clusters', 'drill_targets', 'kml_export'}:
+                continue
+
+            labels = kmeans.fit_predict(X)
+            if 'analyze_clusters' in selected:
+                _record(results, 'analyze_clusters', n_pixels, k,
+                        time_call(lambda: analyzer._analyze_clusters(X, labels, kmeans, coords),
+                                  repeats), repeats)
+
+            cluster_stats = analyzer._analyze_clusters(X, labels, kmeans, coords)
+            if 'drill_targets' in selected:
+                _record(results, 'drill_targets', n_pixels, k,
+                        time_call(lambda: analyzer.generate_drill_targets(cluster_stats, top_n=k),
+                                  repeats), repeats)
+
+            drill_targets = analyzer.generate_drill_targets(cluster_stats, top_n=k)
+            if 'kml_export' in selected and len(drill_targets):
+                path = os.path.join(kml_dir, 'drill_targets.kml')
+                _record(results, 'kml_export', n_pixels, k,
+                        time_call(lambda: create_kml_export(drill_targets, cluster_stats, path),
+                                  repeats), repeats)
+
+    return results
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Print per-benchmark ratios against a previous results file.
+
+    Returns:
+        list: Records slower than the baseline by more than ``tolerance``
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['benchmark'], r['n_pixels'], r['k']): r['best_s'] for r in baseline['results']}
+
+    regressions = []
+    for r in results:
+        key = (r['benchmark'], r['n_pixels'], r['k'])
+        if key not in previous or not previous[key]:
+            continue
+        ratio = r['best_s'] / previous[key]
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{r['benchmark']:>17} n={r['n_pixels']:>9,} k={r['k']}: {ratio:5.2f}x{flag}",
+              file=sys.stderr)
+        if flag:
+            regressions.append(dict(r, baseline_best_s=previous[key], ratio=round(ratio, 3)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis engine offline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Pixel counts to benchmark")
+    parser.add_argument('--ks', type=int, nargs='+', default=DEFAULT_KS,
+                        help="Cluster counts to benchmark")
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per measurement")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help="Benchmarks to run")
+    parser.add_argument('-o', '--output', default='bench_results.json',
+                        help="JSON results file")
+    parser.add_argument('--compare', help="Previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown vs the baseline before flagging (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    # Compare before writing: --compare may point at the output file
+    regressions = []
+    results = run(args.sizes, args.ks, args.repeats, set(args.only))
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'results': results,
+        'regressions': regressions
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 {len(results)} measurements -> {args.output}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Centroid Store
+==============
+In-memory store of fitted K-Means centroids, so re-runs near a previous
+analysis can warm-start clustering instead of fitting from scratch.
+
+Entries are keyed by feature set, cluster count and date window, and
+located by their AOI center; a lookup returns the nearest entry within
+``max_distance_km``. The store is bounded with least-recently-used
+eviction and is safe to share between threads.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from backends import KM_PER_DEG_LAT, KM_PER_DEG_LON
+
+
+class CentroidStore:
+    """
+    Nearby-location lookup of previously fitted centroids.
+
+    Args:
+        max_distance_km (float): Farthest AOI center whose centroids are reused
+        max_entries (int): Entries kept before the least recently used are dropped
+    """
+
+    def __init__(self, max_distance_km=2.0, max_entries=512):
+        self.max_distance_km = max_distance_km
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (group, lat, lon) -> (centroids, inertia per sample)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group(features, n_clusters, start_date, end_date):
+        """Entries are only reused within the same group."""
+        return (tuple(features), int(n_clusters), str(start_date), str(end_date))
+
+    @staticmethod
+    def distance_km(lat1, lon1, lat2, lon2):
+        """Equirectangular distance, accurate at the few-km scale used here."""
+        dy = (lat2 - lat1) * KM_PER_DEG_LAT
+        dx = (lon2 - lon1) * KM_PER_DEG_LON * math.cos(math.radians((lat1 + lat2) / 2))
+        return math.hypot(dx, dy)
+
+    def get(self, group, lat, lon):
+        """
+        Centroids of the nearest entry in ``group``.
+
+        Returns:
+            tuple: (centroids (k, n_features), inertia per sample), or None
+        """
+        with self._lock:
+            best, best_distance = None, self.max_distance_km
+            for key in self._entries:
+                if key[0] != group:
+                    continue
+                distance = self.distance_km(lat, lon, key[1], key[2])
+                if distance <= best_distance:
+                    best, best_distance = key, distance
+
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            centroids, inertia = self._entries[best]
+            return centroids.copy(), inertia
+
+    def put(self, group, lat, lon, centroids, inertia):
+        """Store the centroids fitted for an AOI center."""
+        key = (group, round(float(lat), 5), round(float(lon), 5))
+        with self._lock:
+            self._entries[key] = (np.array(centroids, dtype=np.float64), float(inertia))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Entry count and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
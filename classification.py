@@ -0,0 +1,139 @@
+"""
+Full-Resolution Classification
+==============================
+Out-of-core per-pixel alteration map of a local scene window.
+
+The fitted cluster centers are applied to the scene's band arrays (usually
+memory-maps) in fixed-size blocks of rows. For every block the bands are
+read, the indices computed with the backend's ``calculate_band_ratios``
+(single-threaded within the block), vegetated / no-data / outside-AOI
+pixels masked, and each remaining pixel assigned to its nearest center.
+Blocks run on a thread pool (NumPy releases the GIL) and write straight
+into a memory-mapped ``.npy`` label raster, so peak memory is bounded by
+the block size times the number of workers, whatever the size of the
+scene.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backends import (FEATURE_BANDS, KM_PER_DEG_LAT, KM_PER_DEG_LON, REQUIRED_BANDS,
+                      LocalScene)
+from instrumentation import record
+
+
+# Label of masked pixels (vegetation, no data, outside the AOI)
+NODATA = -1
+
+# Pixels per block (~60 bytes each in flight: bands, indices, features)
+CHUNK_PIXELS = 1_000_000
+
+
+def row_blocks(n_rows, n_cols, chunk_pixels=CHUNK_PIXELS):
+    """(start, stop) row ranges of about ``chunk_pixels`` pixels each."""
+    step = max(1, chunk_pixels // max(n_cols, 1))
+    return [(start, min(start + step, n_rows)) for start in range(0, n_rows, step)]
+
+
+def nearest_center(X, centers):
+    """Index of the nearest center (squared Euclidean distance) of every row of X."""
+    centers = np.asarray(centers, dtype=np.float32)
+    distance = X @ (-2 * centers.T)
+    distance += (centers * centers).sum(axis=1)
+    return np.argmin(distance, axis=1)
+
+
+def classify_arrays(indices, centers, ndvi_threshold=0.3):
+    """
+    Labels of in-memory index rasters (e.g. a coarse map raster).
+
+    Args:
+        indices (dict): Index name -> 2D array, FEATURE_BANDS and ndvi
+        centers (np.ndarray): Fitted cluster centers
+
+    Returns:
+        np.ndarray: int8 labels, NODATA where vegetated or not finite
+    """
+    features = [np.asarray(indices[b], dtype=np.float32) for b in FEATURE_BANDS]
+    with np.errstate(invalid='ignore'):
+        valid = np.asarray(indices['ndvi']) < ndvi_threshold
+    for values in features:
+        valid &= np.isfinite(values)
+
+    labels = np.full(valid.shape, NODATA, dtype=np.int8)
+    labels[valid] = nearest_center(np.column_stack([values[valid] for values in features]),
+                                   centers)
+    return labels
+
+
+def classify_scene(backend, scene, centers, path, ndvi_threshold=0.3,
+                   chunk_pixels=CHUNK_PIXELS, max_workers=4):
+    """
+    Label every pixel of a local scene window with its nearest cluster center.
+
+    Args:
+        backend (LocalRasterBackend): Computes the indices of each block
+        scene (LocalScene): Window to classify (raw input bands and AOI mask)
+        centers (np.ndarray): (k, len(FEATURE_BANDS)) fitted cluster centers
+        path (str): Output ``.npy`` label raster (int8, NODATA where masked)
+        ndvi_threshold (float): NDVI threshold to mask vegetation
+        chunk_pixels (int): Pixels per block
+        max_workers (int): Blocks classified concurrently
+
+    Returns:
+        dict: labels (read-only memory-map), counts and area_km2 (per
+        cluster id), path, shape and geotransform of the raster
+    """
+    centers = np.asarray(centers, dtype=np.float32)
+    n_clusters = len(centers)
+    n_rows, n_cols = scene.shape
+    labels = np.lib.format.open_memmap(path, mode='w+', dtype=np.int8, shape=scene.shape)
+
+    # Ground area of a pixel in each row (shrinks with cos(lat))
+    x0, dx, _, y0, _, dy = scene.geotransform
+    row_lat = y0 + (np.arange(n_rows) + 0.5) * dy
+    row_km2 = abs(dx * dy) * KM_PER_DEG_LON * KM_PER_DEG_LAT * np.cos(np.radians(row_lat))
+
+    def classify_block(block):
+        start, stop = block
+        window = LocalScene({b: scene.select(b)[start:stop] for b in REQUIRED_BANDS},
+                            (x0, dx, 0.0, y0 + start * dy, 0.0, dy),
+                            scene.mask[start:stop], scene.scale_factor)
+        indices = backend.calculate_band_ratios(window, max_workers=1)
+
+        features = [indices.select(b) for b in FEATURE_BANDS]
+        valid = window.mask & (indices.select('ndvi') < ndvi_threshold)
+        for values in features:
+            valid &= np.isfinite(values)
+
+        block_labels = nearest_center(np.column_stack([values[valid] for values in features]),
+                                      centers).astype(np.int8)
+        out = np.full(valid.shape, NODATA, dtype=np.int8)
+        out[valid] = block_labels
+        labels[start:stop] = out
+
+        rows = np.nonzero(valid)[0]
+        return (np.bincount(block_labels, minlength=n_clusters),
+                np.bincount(block_labels, weights=row_km2[start + rows], minlength=n_clusters))
+
+    counts = np.zeros(n_clusters, dtype=np.int64)
+    area_km2 = np.zeros(n_clusters)
+    blocks = row_blocks(n_rows, n_cols, chunk_pixels)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for block_counts, block_area in executor.map(classify_block, blocks):
+            counts += block_counts
+            area_km2 += block_area
+    labels.flush()
+    del labels
+
+    record('classified_blocks', len(blocks))
+    record('classified_pixels', int(counts.sum()))
+    return {
+        'labels': np.load(path, mmap_mode='r'),
+        'counts': counts,
+        'area_km2': area_km2,
+        'path': path,
+        'shape': (n_rows, n_cols),
+        'geotransform': scene.geotransform
+    }
@@ -0,0 +1,233 @@
+"""
+Mineral Exploration Command-Line Interface
+==========================================
+Headless batch entry point around MineralExplorationAnalyzer: reads a CSV
+of candidate sites, analyzes them concurrently and writes the ranked drill
+target table as CSV, Parquet or KML. Never imports Streamlit; heavy
+dependencies (ee, sklearn, simplekml) load only when a stage needs them.
+
+Usage:
+    python cli.py sites.csv -o drill_targets.csv
+    python cli.py sites.csv -o targets.kml --credentials service_account.json
+    python cli.py sites.csv -o targets.parquet --scene archive/2024_andacollo
+    python cli.py sites.csv -o targets.csv --clusters-output clusters.parquet
+    python cli.py --scan-region -o region_targets.csv --scan-budget 0.2
+
+Sites CSV columns: lat/latitude, lon/longitude, optional radius_km and site.
+
+GEE credentials come from --credentials, GEE_SERVICE_ACCOUNT_KEY (path to a
+service-account JSON key), GEE_CLIENT_EMAIL + GEE_PRIVATE_KEY, or the local
+``earthengine authenticate`` token.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+
+
+OUTPUT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.kml': 'kml'}
+
+
+def cluster_count(value):
+    """argparse type: a cluster count >= 2, or 'auto'."""
+    if value == 'auto':
+        return value
+    k = int(value)
+    if k < 2:
+        raise argparse.ArgumentTypeError("cluster count must be at least 2")
+    return k
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate prioritized drill targets for a CSV of sites."
+    )
+    parser.add_argument('sites', nargs='?',
+                        help="CSV of sites (lat, lon, optional radius_km, site)")
+    parser.add_argument('--scan-region', action='store_true',
+                        help="Scan a whole region coarse-to-fine instead of a sites CSV")
+    parser.add_argument('--bounds', type=float, nargs=4, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'),
+                        help="Region for --scan-region (default: IV Region)")
+    parser.add_argument('--scan-budget', type=float, default=0.25,
+                        help="Region scan compute budget, as a fraction of a uniform "
+                             "finest-scale pass")
+    parser.add_argument('-o', '--output', default='drill_targets.csv',
+                        help="Output file (.csv, .parquet or .kml)")
+    parser.add_argument('--format', choices=sorted(set(OUTPUT_FORMATS.values())),
+                        help="Output format (default: from the output extension)")
+    parser.add_argument('--credentials',
+                        help="GEE service-account JSON key (default: environment)")
+    parser.add_argument('--scene',
+                        help="Analyze a local scene directory instead of Earth Engine")
+    parser.add_argument('--label-maps', metavar='DIR',
+                        help="With --scene: also write a full-resolution cluster label "
+                             "raster (.npy) per site to DIR")
+    parser.add_argument('--radius-km', type=float, default=10,
+                        help="Radius for sites without a radius_km column")
+    parser.add_argument('--start-date', help="Start date YYYY-MM-DD (default: 6 months ago)")
+    parser.add_argument('--end-date', help="End date YYYY-MM-DD (default: today)")
+    parser.add_argument('--cloud-cover', type=int, default=20,
+                        help="Maximum cloud cover percentage")
+    parser.add_argument('--clustering', choices=['client', 'server', 'streaming'],
+                        default='client',
+                        help="Cluster sampled pixels locally, aggregate server-side or "
+                             "stream a large sample through mini-batch K-Means")
+    parser.add_argument('--num-pixels', type=int, default=5000,
+                        help="Pixels sampled per site for clustering")
+    parser.add_argument('--scale', type=float, default=60, help="Sampling scale in meters")
+    parser.add_argument('--sampling', choices=['fixed', 'adaptive'], default='fixed',
+                        help="Fixed-size uniform sample, or an adaptive stratified sample "
+                             "capped at --num-pixels (client clustering)")
+    parser.add_argument('--clusters', type=cluster_count, default=4,
+                        help="K-Means cluster count, or 'auto' to choose it per site")
+    parser.add_argument('--top-n', type=int, default=5, help="Drill targets kept per site")
+    parser.add_argument('--workers', type=int, default=4, help="Sites analyzed concurrently")
+    parser.add_argument('--clusters-output',
+                        help="Also write every site's cluster table (.parquet or .csv)")
+    parser.add_argument('--cache-dir',
+                        help="Cache GEE sample pulls in this directory")
+    return parser.parse_args(argv)
+
+
+def credentials_from_env():
+    """GEE service-account credentials from environment variables, if set."""
+    key_path = os.environ.get('GEE_SERVICE_ACCOUNT_KEY')
+    if key_path:
+        return key_path
+    if os.environ.get('GEE_CLIENT_EMAIL') and os.environ.get('GEE_PRIVATE_KEY'):
+        return {
+            'client_email': os.environ['GEE_CLIENT_EMAIL'],
+            'private_key': os.environ['GEE_PRIVATE_KEY'].replace('\\n', '\n')
+        }
+    return None
+
+
+def write_output(drill_targets, path, fmt, cluster_stats=None):
+    """Write the drill target table as CSV, Parquet or KML (with zone footprints)."""
+    if fmt == 'csv':
+        drill_targets.to_csv(path, index=False)
+    elif fmt == 'parquet':
+        drill_targets.to_parquet(path, index=False)
+    else:
+        from analysis_engine import create_kml_export
+        if create_kml_export(drill_targets, cluster_stats, output_path=path) is None:
+            raise RuntimeError(f"KML export to {path} failed")
+
+
+def write_clusters(cluster_stats, path):
+    """Write the per-site cluster table as Parquet (nested geometry) or CSV."""
+    if path.lower().endswith('.parquet'):
+        cluster_stats.to_parquet(path)
+    else:
+        cluster_stats.to_pandas().to_csv(path, index=False)
+
+
+def scan_region(analyzer, args, fmt):
+    """Coarse-to-fine scan of a region, written like a batch run."""
+    from regional_scan import REGION_IV_BOUNDS
+
+    scan = analyzer.scan_region(
+        bounds=tuple(args.bounds) if args.bounds else REGION_IV_BOUNDS,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        cloud_cover_max=args.cloud_cover,
+        budget_fraction=args.scan_budget,
+        n_clusters=args.clusters,
+        max_workers=args.workers,
+        top_n=args.top_n
+    )
+    if scan.get('warning'):
+        print(f"⚠️ {scan['warning']}", file=sys.stderr)
+    if not scan.get('success') or scan['drill_targets'].empty:
+        print(f"❌ {scan.get('error') or 'No drill targets identified'}", file=sys.stderr)
+        return 1
+
+    write_output(scan['drill_targets'], args.output, fmt, scan['cluster_stats'])
+    if args.clusters_output:
+        write_clusters(scan['cluster_stats'], args.clusters_output)
+    metrics = scan['metrics']
+    print(f"⛏️ {metrics['n_targets']} drill targets from {metrics['n_tiles']} tiles "
+          f"({metrics['cost_fraction']:.0%} of a uniform fine pass) -> {args.output}",
+          file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    fmt = args.format or OUTPUT_FORMATS.get(os.path.splitext(args.output)[1].lower())
+    if fmt is None:
+        print(f"❌ Unknown output format for {args.output}", file=sys.stderr)
+        return 2
+    if args.sites is None and not args.scan_region:
+        print("❌ Give a sites CSV or --scan-region", file=sys.stderr)
+        return 2
+    if args.label_maps and not args.scene:
+        print("❌ --label-maps needs a local --scene", file=sys.stderr)
+        return 2
+    parquet = fmt == 'parquet' or (args.clusters_output or '').lower().endswith('.parquet')
+    if parquet and importlib.util.find_spec('pyarrow') is None:
+        print("❌ Parquet output needs pyarrow (pip install pyarrow)", file=sys.stderr)
+        return 2
+
+    import pandas as pd
+    from analysis_engine import MineralExplorationAnalyzer
+
+    if args.scene:
+        from backends import LocalRasterBackend
+        backend = LocalRasterBackend.from_directory(args.scene)
+    else:
+        from backends import EarthEngineBackend
+        backend = EarthEngineBackend(credentials=args.credentials or credentials_from_env())
+
+    sample_cache = None
+    if args.cache_dir:
+        from sample_cache import SampleCache
+        sample_cache = SampleCache(args.cache_dir)
+
+    analyzer = MineralExplorationAnalyzer(backend=backend, sample_cache=sample_cache)
+    if args.scan_region:
+        return scan_region(analyzer, args, fmt)
+
+    sites = pd.read_csv(args.sites)
+    if 'radius_km' not in sites.columns:
+        sites['radius_km'] = args.radius_km
+
+    def report(site, results):
+        status = "✅" if results.get('success') else f"❌ {results.get('error')}"
+        print(f"{site['site']}: {status}", file=sys.stderr)
+        if 'alteration_map' in results:
+            print(f"   🗺️ {results['alteration_map']['path']}", file=sys.stderr)
+
+    batch = analyzer.analyze_locations(
+        sites,
+        max_workers=args.workers,
+        top_n=args.top_n,
+        on_result=report,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        cloud_cover_max=args.cloud_cover,
+        clustering=args.clustering,
+        num_pixels=args.num_pixels,
+        scale=args.scale,
+        n_clusters=args.clusters,
+        sampling=args.sampling,
+        label_map_dir=args.label_maps
+    )
+
+    if batch['drill_targets'].empty:
+        print("❌ No drill targets identified", file=sys.stderr)
+        return 1
+
+    write_output(batch['drill_targets'], args.output, fmt, batch['cluster_stats'])
+    if args.clusters_output:
+        write_clusters(batch['cluster_stats'], args.clusters_output)
+    metrics = batch['metrics']
+    print(f"⛏️ {metrics['n_targets']} drill targets from {metrics['n_sites']} sites "
+          f"({metrics['n_failed']} failed) -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Cluster Statistics
+==================
+Vectorized per-cluster statistics shared by the analyzer and the backends,
+in one grouped pass or accumulated chunk by chunk.
+"""
+
+import numpy as np
+
+
+def _segment_quantile(values, labels, starts, counts, q):
+    """Per-label quantile of ``values`` via one sort into label segments."""
+    order = np.lexsort((values, labels))
+    sorted_values = values[order]
+    
+    # Linear interpolation between the two nearest ranks in every segment
+    last = np.minimum(starts + np.maximum(counts - 1, 0), len(values) - 1)
+    position = np.minimum(starts + q * np.maximum(counts - 1, 0), last)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, last)
+    frac = position - lower
+    return sorted_values[lower] * (1 - frac) + sorted_values[upper] * frac
+
+
+def _segment_weighted_quantile(values, weights, labels, starts, counts, q):
+    """Per-label weighted quantile (lowest value reaching ``q`` of the weight)."""
+    order = np.lexsort((values, labels))
+    cumulative = np.cumsum(weights[order])
+    totals = np.bincount(labels, weights=weights, minlength=len(counts))
+    before = np.concatenate([[0], np.cumsum(totals)[:-1]])
+    
+    last = np.minimum(starts + np.maximum(counts - 1, 0), len(values) - 1)
+    position = np.minimum(np.searchsorted(cumulative, before + q * totals), last)
+    return values[order][position]
+
+
+def grouped_cluster_stats(features, labels, coords, n_clusters, n_sample_points=10,
+                          weights=None):
+    """
+    Per-cluster statistics for all clusters in a single grouped pass.
+    
+    Args:
+        features (np.ndarray): (N, 3) feature matrix
+        labels (np.ndarray): (N,) cluster labels in [0, n_clusters)
+        coords (np.ndarray): (N, 2) lon/lat coordinates
+        n_clusters (int): Number of clusters
+        n_sample_points (int): Sample coordinates kept per cluster
+        weights (np.ndarray): Optional (N,) design weights (pixels each
+            sample stands for); statistics are then weighted
+        
+    Returns:
+        dict: Arrays over non-empty clusters - cluster_id, count, mean, std,
+        p90 (per feature) and centroid (lon/lat), plus per-cluster (m, 2)
+        sample_points arrays (and the weight total per cluster under
+        'weight' when weights are given)
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    counts = np.bincount(labels, minlength=n_clusters)
+    present = np.flatnonzero(counts)
+    w = None if weights is None else np.asarray(weights, dtype=np.float64)
+    totals = counts if w is None else np.bincount(labels, weights=w, minlength=n_clusters)
+    safe_totals = np.maximum(totals, 1) if w is None else np.maximum(totals, 1e-12)
+    
+    def weighted(values):
+        return values if w is None else w * values
+    
+    # Sums and sums of squares per cluster, one bincount per column
+    mean = np.empty((n_clusters, features.shape[1]))
+    std = np.empty((n_clusters, features.shape[1]))
+    for j in range(features.shape[1]):
+        column = features[:, j].astype(np.float64)
+        mean[:, j] = np.bincount(labels, weights=weighted(column),
+                                 minlength=n_clusters) / safe_totals
+        sq_mean = np.bincount(labels, weights=weighted(column * column),
+                              minlength=n_clusters) / safe_totals
+        std[:, j] = np.sqrt(np.maximum(sq_mean - mean[:, j] ** 2, 0))
+    
+    centroid = np.column_stack([
+        np.bincount(labels, weights=weighted(coords[:, j]), minlength=n_clusters) / safe_totals
+        for j in range(2)
+    ])
+    
+    # Contiguous label segments (stable sort keeps original point order)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    if not len(labels):
+        p90 = np.zeros_like(mean)
+    elif w is None:
+        p90 = np.column_stack([
+            _segment_quantile(features[:, j], labels, starts, counts, 0.9)
+            for j in range(features.shape[1])
+        ])
+    else:
+        p90 = np.column_stack([
+            _segment_weighted_quantile(features[:, j], w, labels, starts, counts, 0.9)
+            for j in range(features.shape[1])
+        ])
+    
+    order = np.argsort(labels, kind='stable')
+    sample_points = [
+        coords[order[starts[c]:starts[c] + min(counts[c], n_sample_points)]]
+        for c in present
+    ]
+    
+    stats = {
+        'cluster_id': present,
+        'count': counts[present],
+        'mean': mean[present],
+        'std': std[present],
+        'p90': p90[present],
+        'centroid': centroid[present],
+        'sample_points': sample_points
+    }
+    if w is not None:
+        stats['weight'] = totals[present]
+    return stats
+
+
+class StreamingClusterStats:
+    """
+    Per-cluster statistics accumulated chunk by chunk in bounded memory.
+    
+    Means, standard deviations and centroids are exact (running sums);
+    p90 is computed from a uniform bottom-k subsample of at most
+    ``quantile_sample`` rows per cluster, which is also available through
+    ``subsample()`` for spatial analysis. ``result()`` returns the same
+    structure as grouped_cluster_stats.
+    
+    Args:
+        n_clusters (int): Number of clusters
+        n_features (int): Feature columns
+        n_sample_points (int): Sample coordinates kept per cluster
+        quantile_sample (int): Rows kept per cluster for quantiles
+        seed (int): Random seed of the quantile subsample
+    """
+    
+    def __init__(self, n_clusters, n_features, n_sample_points=10, quantile_sample=20000,
+                 seed=0):
+        self.n_clusters = n_clusters
+        self.n_sample_points = n_sample_points
+        self.quantile_sample = quantile_sample
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+        self.sums = np.zeros((n_clusters, n_features))
+        self.sq_sums = np.zeros((n_clusters, n_features))
+        self.coord_sums = np.zeros((n_clusters, 2))
+        self.sample_points = [[] for _ in range(n_clusters)]
+        self._keys = [np.empty(0) for _ in range(n_clusters)]
+        self._values = [np.empty((0, n_features)) for _ in range(n_clusters)]
+        self._coords = [np.empty((0, 2)) for _ in range(n_clusters)]
+        self._rng = np.random.default_rng(seed)
+    
+    def update(self, features, labels, coords):
+        """Add one labeled chunk."""
+        labels = np.asarray(labels, dtype=np.int64)
+        k = self.n_clusters
+        self.counts += np.bincount(labels, minlength=k)
+        for j in range(features.shape[1]):
+            column = features[:, j].astype(np.float64)
+            self.sums[:, j] += np.bincount(labels, weights=column, minlength=k)
+            self.sq_sums[:, j] += np.bincount(labels, weights=column * column, minlength=k)
+        for j in range(2):
+            self.coord_sums[:, j] += np.bincount(labels, weights=coords[:, j], minlength=k)
+        
+        # Keep the rows with the smallest random keys: a uniform subsample
+        keys = self._rng.random(len(labels))
+        for c in np.unique(labels):
+            rows = labels == c
+            missing = self.n_sample_points - len(self.sample_points[c])
+            if missing > 0:
+                self.sample_points[c].extend(coords[rows][:missing].tolist())
+            
+            all_keys = np.concatenate([self._keys[c], keys[rows]])
+            all_values = np.concatenate([self._values[c], features[rows]])
+            all_coords = np.concatenate([self._coords[c], coords[rows]])
+            if len(all_keys) > self.quantile_sample:
+                keep = np.argpartition(all_keys, self.quantile_sample)[:self.quantile_sample]
+                all_keys, all_values, all_coords = all_keys[keep], all_values[keep], all_coords[keep]
+            self._keys[c], self._values[c], self._coords[c] = all_keys, all_values, all_coords
+    
+    def subsample(self):
+        """
+        The retained uniform subsample.
+        
+        Returns:
+            tuple: (coords (M, 2), labels (M,))
+        """
+        coords = np.concatenate(self._coords)
+        labels = np.repeat(np.arange(self.n_clusters), [len(c) for c in self._coords])
+        return coords, labels
+    
+    def result(self):
+        """Statistics over non-empty clusters (see grouped_cluster_stats)."""
+        present = np.flatnonzero(self.counts)
+        counts = self.counts[present, None]
+        mean = self.sums[present] / counts
+        std = np.sqrt(np.maximum(self.sq_sums[present] / counts - mean ** 2, 0))
+        p90 = np.array([np.quantile(self._values[c], 0.9, axis=0) for c in present]) \
+            if len(present) else np.zeros_like(mean)
+        
+        return {
+            'cluster_id': present,
+            'count': self.counts[present],
+            'mean': mean,
+            'std': std,
+            'p90': p90,
+            'centroid': self.coord_sums[present] / counts,
+            'sample_points': [self.sample_points[c] for c in present]
+        }
@@ -0,0 +1,283 @@
+"""
+Cluster Table
+=============
+Columnar, array-backed cluster analysis results.
+
+One NumPy array per scalar column (cluster_id, position, scores, means,
+spreads, area, ...), and the per-cluster variable-length parts stored as
+flat arrays plus offsets (cluster ``i`` owns rows ``offsets[i]:offsets[i+1]``):
+
+- sample_points: float32 (M, 2) lon/lat
+- sub_targets: structured (latitude, longitude, n_pixels) records
+- footprints: float32 (V, 2) ring vertices with per-ring offsets and
+  areas, grouped into clusters by a second offsets array
+
+Scalar columns convert to pandas without copying, and to Arrow / Parquet
+with list columns built directly on the offset arrays (pyarrow is only
+needed for those two). Iterating a table, or indexing it with an integer,
+still yields the per-cluster dicts of earlier versions for code that walks
+the clusters one by one.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+SUB_TARGET_DTYPE = np.dtype([('latitude', np.float64), ('longitude', np.float64),
+                             ('n_pixels', np.int64)])
+
+
+def pack_ragged(parts, dtype=np.float32, width=2):
+    """
+    Pack a list of (n_i, width) arrays (or nested lists) into flat values
+    and offsets.
+
+    Returns:
+        tuple: (values, offsets) - offsets has len(parts) + 1 entries
+    """
+    parts = [np.asarray(part, dtype=dtype).reshape((-1, width) if width else -1)
+             for part in parts]
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(part) for part in parts])
+    if parts:
+        values = np.concatenate(parts)
+    else:
+        values = np.empty((0, width) if width else 0, dtype=dtype)
+    return values, offsets
+
+
+def _concat_ragged(pairs):
+    """Concatenate (values, offsets) pairs, shifting the offsets."""
+    values = np.concatenate([values for values, _ in pairs])
+    shifts = np.cumsum([0] + [offsets[-1] for _, offsets in pairs[:-1]])
+    offsets = np.concatenate([[0]] + [offsets[1:] + shift
+                                      for (_, offsets), shift in zip(pairs, shifts)])
+    return values, offsets.astype(np.int64)
+
+
+class ClusterTable:
+    """
+    Cluster results for one analysis (or a batch of them), column by column.
+
+    Args:
+        columns (dict): Column name -> (n,) array, one row per cluster
+        sample_points (tuple): (values float32 (M, 2), offsets (n + 1,))
+        sub_targets (tuple): (SUB_TARGET_DTYPE records, offsets (n + 1,))
+        footprints (tuple): (vertices float32 (V, 2), ring offsets (R + 1,),
+            ring areas (R,), cluster offsets (n + 1,))
+    """
+
+    def __init__(self, columns, sample_points=None, sub_targets=None, footprints=None):
+        self.columns = {name: np.asarray(values) for name, values in columns.items()}
+        n = len(next(iter(self.columns.values()))) if self.columns else 0
+        empty = np.zeros(n + 1, dtype=np.int64)
+
+        self.sample_points, self.sample_offsets = sample_points or \
+            (np.empty((0, 2), dtype=np.float32), empty)
+        self.sub_targets, self.sub_target_offsets = sub_targets or \
+            (np.empty(0, dtype=SUB_TARGET_DTYPE), empty)
+        (self.footprint_points, self.footprint_ring_offsets, self.footprint_area_km2,
+         self.footprint_offsets) = footprints or \
+            (np.empty((0, 2), dtype=np.float32), np.zeros(1, dtype=np.int64),
+             np.empty(0), empty)
+
+    @classmethod
+    def from_parts(cls, columns, sample_points, sub_targets=None, footprints=None):
+        """
+        Build a table from per-cluster lists (in row order).
+
+        Args:
+            columns (dict): Column name -> (n,) array
+            sample_points (list): Per cluster, (m, 2) lon/lat array or list
+            sub_targets (list): Per cluster, SUB_TARGET_DTYPE records
+            footprints (list): Per cluster, list of dicts with a closed
+                'coordinates' ring and its 'area_km2'
+        """
+        n = len(sample_points)
+        sub_targets = sub_targets if sub_targets is not None else [[]] * n
+        footprints = footprints if footprints is not None else [[]] * n
+
+        rings = [polygon for polygons in footprints for polygon in polygons]
+        vertices, ring_offsets = pack_ragged([ring['coordinates'] for ring in rings])
+        cluster_offsets = np.zeros(n + 1, dtype=np.int64)
+        cluster_offsets[1:] = np.cumsum([len(polygons) for polygons in footprints])
+
+        return cls(
+            columns,
+            sample_points=pack_ragged(sample_points),
+            sub_targets=pack_ragged(sub_targets, dtype=SUB_TARGET_DTYPE, width=None),
+            footprints=(vertices, ring_offsets,
+                        np.array([ring['area_km2'] for ring in rings], dtype=np.float64),
+                        cluster_offsets)
+        )
+
+    @classmethod
+    def concat(cls, tables, keys=None, key_name='site'):
+        """
+        Stack tables (e.g. one per site of a batch run).
+
+        Args:
+            tables (list): ClusterTables with the same columns
+            keys (list): Optional label per table, added as column ``key_name``
+        """
+        tables = list(tables)
+        if not tables:
+            return cls({})
+
+        columns = {}
+        if keys is not None:
+            columns[key_name] = np.repeat(np.asarray(keys, dtype=object),
+                                          [len(table) for table in tables])
+        for name in tables[0].columns:
+            columns[name] = np.concatenate([table.columns[name] for table in tables])
+
+        vertices, ring_offsets = _concat_ragged(
+            [(t.footprint_points, t.footprint_ring_offsets) for t in tables])
+        ring_counts = [np.arange(len(t.footprint_area_km2)) for t in tables]
+        _, cluster_offsets = _concat_ragged(
+            [(rings, t.footprint_offsets) for rings, t in zip(ring_counts, tables)])
+
+        return cls(
+            columns,
+            sample_points=_concat_ragged([(t.sample_points, t.sample_offsets) for t in tables]),
+            sub_targets=_concat_ragged([(t.sub_targets, t.sub_target_offsets) for t in tables]),
+            footprints=(vertices, ring_offsets,
+                        np.concatenate([t.footprint_area_km2 for t in tables]),
+                        cluster_offsets)
+        )
+
+    def __len__(self):
+        return len(self.sample_offsets) - 1
+
+    def __getitem__(self, key):
+        """Column array by name, or the record dict of one cluster by position."""
+        if isinstance(key, str):
+            return self.columns[key]
+        return self.row(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def __repr__(self):
+        return (f"ClusterTable({len(self)} clusters, {len(self.columns)} columns, "
+                f"{len(self.sample_points)} sample points, {self.nbytes:,} bytes)")
+
+    @property
+    def nbytes(self):
+        """Memory held by the table's arrays (object columns count pointers only)."""
+        arrays = list(self.columns.values()) + [
+            self.sample_points, self.sample_offsets, self.sub_targets,
+            self.sub_target_offsets, self.footprint_points, self.footprint_ring_offsets,
+            self.footprint_area_km2, self.footprint_offsets
+        ]
+        return int(sum(array.nbytes for array in arrays))
+
+    def sample_points_of(self, i):
+        """(m, 2) float32 lon/lat samples of cluster ``i`` (a view)."""
+        return self.sample_points[self.sample_offsets[i]:self.sample_offsets[i + 1]]
+
+    def sub_targets_of(self, i):
+        """Sub-target records of cluster ``i``, largest first (a view)."""
+        return self.sub_targets[self.sub_target_offsets[i]:self.sub_target_offsets[i + 1]]
+
+    def footprint_of(self, i):
+        """
+        Footprint polygons of cluster ``i``.
+
+        Returns:
+            list: (ring (m, 2) float32 lon/lat view, area_km2) tuples
+        """
+        rings = range(self.footprint_offsets[i], self.footprint_offsets[i + 1])
+        offsets = self.footprint_ring_offsets
+        return [(self.footprint_points[offsets[r]:offsets[r + 1]],
+                 float(self.footprint_area_km2[r])) for r in rings]
+
+    def row(self, i):
+        """
+        One cluster as a plain dict (Python scalars and lists).
+
+        Returns:
+            dict: Every column plus sample_points, sub_targets and footprint
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Cluster row {i} out of range")
+
+        record = {name: values[i].item() if isinstance(values[i], np.generic) else values[i]
+                  for name, values in self.columns.items()}
+        record['sample_points'] = self.sample_points_of(i).astype(np.float64).round(6).tolist()
+        record['sub_targets'] = [
+            {'latitude': float(t['latitude']), 'longitude': float(t['longitude']),
+             'n_pixels': int(t['n_pixels'])}
+            for t in self.sub_targets_of(i)
+        ]
+        record['footprint'] = [
+            {'coordinates': ring.astype(np.float64).round(6).tolist(), 'area_km2': area}
+            for ring, area in self.footprint_of(i)
+        ]
+        return record
+
+    def to_records(self):
+        """All clusters as a list of dicts (see row)."""
+        return list(self)
+
+    def to_pandas(self, nested=False):
+        """
+        Scalar columns as a DataFrame, sharing memory with the table.
+
+        Args:
+            nested (bool): Also add sample_points / sub_targets / footprint
+                object columns holding per-cluster array views
+        """
+        df = pd.DataFrame(self.columns, copy=False)
+        if nested:
+            df['sample_points'] = [self.sample_points_of(i) for i in range(len(self))]
+            df['sub_targets'] = [self.sub_targets_of(i) for i in range(len(self))]
+            df['footprint'] = [self.footprint_of(i) for i in range(len(self))]
+        return df
+
+    def to_arrow(self):
+        """
+        The table as a pyarrow.Table.
+
+        Numeric columns and the flat coordinate buffers are wrapped without
+        copying; sample_points becomes list<fixed_size_list<float32, 2>>,
+        sub_targets a list of structs and footprint a list of rings with a
+        parallel footprint_area_km2 list column.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is required for Arrow/Parquet output")
+
+        def points(values):
+            return pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), 2)
+
+        def offsets(values):
+            return pa.array(values.astype(np.int32))
+
+        arrays = {name: pa.array(values) for name, values in self.columns.items()}
+        arrays['sample_points'] = pa.ListArray.from_arrays(
+            offsets(self.sample_offsets), points(self.sample_points))
+        arrays['sub_targets'] = pa.ListArray.from_arrays(
+            offsets(self.sub_target_offsets),
+            pa.StructArray.from_arrays([pa.array(np.ascontiguousarray(self.sub_targets[name]))
+                                        for name in SUB_TARGET_DTYPE.names],
+                                       names=list(SUB_TARGET_DTYPE.names)))
+        rings = pa.ListArray.from_arrays(offsets(self.footprint_ring_offsets),
+                                         points(self.footprint_points))
+        arrays['footprint'] = pa.ListArray.from_arrays(offsets(self.footprint_offsets), rings)
+        arrays['footprint_area_km2'] = pa.ListArray.from_arrays(
+            offsets(self.footprint_offsets), pa.array(self.footprint_area_km2))
+
+        return pa.table(arrays)
+
+    def to_parquet(self, path, **kwargs):
+        """Write the table (see to_arrow) to a Parquet file."""
+        table = self.to_arrow()
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, path, **kwargs)
+        return path
@@ -0,0 +1,150 @@
+"""
+Cluster Footprints
+==================
+Zone geometry and geodesic areas from classified sample points.
+
+The labeled samples are rasterized onto a regular lon/lat grid (each cell
+takes the label of its nearest sample when one lies within the linking
+distance, and cells outside the circular AOI are dropped). From that grid:
+
+- the valid (non-vegetated, sampled) area is the sum of exact spherical
+  cell areas, and each cluster's area is its sample share of it
+- footprint polygons are the convex hulls of the connected components of
+  each cluster's cell mask, largest first, with the component's own
+  (mask) area
+
+Areas use the authalic Earth radius (sphere with the WGS84 surface area),
+within a fraction of a percent of ellipsoidal areas at AOI scale.
+"""
+
+import math
+
+import numpy as np
+from scipy import ndimage
+from scipy.spatial import ConvexHull
+
+from backends import KM_PER_DEG_LAT, KM_PER_DEG_LON
+from spatial_index import project_km
+
+
+EARTH_AUTHALIC_RADIUS_KM = 6371.0072
+
+
+def cell_area_km2(lat_south, lat_north, dlon_deg):
+    """Exact area of lat/lon cells on the authalic sphere (vectorized)."""
+    return EARTH_AUTHALIC_RADIUS_KM ** 2 * np.radians(dlon_deg) * \
+        (np.sin(np.radians(lat_north)) - np.sin(np.radians(lat_south)))
+
+
+def footprint_grid(index, cell_km, max_distance_km, aoi=None, max_cells=250_000):
+    """
+    Rasterize the labeled samples of a SpatialIndex.
+
+    Args:
+        index (SpatialIndex): Samples with labels
+        cell_km (float): Cell edge length (enlarged to stay under max_cells)
+        max_distance_km (float): Cells farther than this from every sample
+            stay unlabeled (vegetation, no data, outside the sampled area)
+        aoi (tuple): Optional (lat, lon, radius_km) circle to clip to
+
+    Returns:
+        tuple: (grid, transform) - (rows, cols) int labels with -1 for
+        unlabeled cells, and (west, north, dlon, dlat) in degrees
+    """
+    lon, lat = index.coords[:, 0], index.coords[:, 1]
+    cos_lat = math.cos(math.radians(index.lat0))
+    width_km = (lon.max() - lon.min()) * KM_PER_DEG_LON * cos_lat + cell_km
+    height_km = (lat.max() - lat.min()) * KM_PER_DEG_LAT + cell_km
+    cell_km = max(cell_km, math.sqrt(width_km * height_km / max_cells))
+
+    dlat = cell_km / KM_PER_DEG_LAT
+    dlon = cell_km / (KM_PER_DEG_LON * cos_lat)
+    west, north = lon.min() - dlon / 2, lat.max() + dlat / 2
+    n_rows = int(math.ceil((north - (lat.min() - dlat / 2)) / dlat))
+    n_cols = int(math.ceil(((lon.max() + dlon / 2) - west) / dlon))
+
+    center_lon = west + (np.arange(n_cols) + 0.5) * dlon
+    center_lat = north - (np.arange(n_rows) + 0.5) * dlat
+    grid_lon, grid_lat = np.meshgrid(center_lon, center_lat)
+
+    points = np.column_stack([grid_lon.ravel(), grid_lat.ravel()])
+    xy = project_km(points[:, 0], points[:, 1], index.lat0)
+    distance, nearest = index.tree.query(xy, distance_upper_bound=max_distance_km)
+
+    found = np.isfinite(distance)
+    if aoi is not None:
+        center = project_km([aoi[1]], [aoi[0]], index.lat0)[0]
+        found &= np.hypot(*(xy - center).T) <= aoi[2]
+
+    grid = np.full(len(points), -1, dtype=np.int64)
+    grid[found] = index.labels[nearest[found]]
+    return grid.reshape(n_rows, n_cols), (west, north, dlon, dlat)
+
+
+def _component_hulls(mask, transform, row_area, max_polygons, min_cells):
+    """Convex hull rings and areas of the largest connected components of a mask."""
+    west, north, dlon, dlat = transform
+    components, n = ndimage.label(mask)
+    if n == 0:
+        return []
+
+    sizes = np.bincount(components.ravel())[1:]
+    selected = np.argsort(-sizes, kind='stable')[:max_polygons]
+    selected = selected[sizes[selected] >= min_cells]
+
+    # Cells of every component, grouped by component id
+    rows, cols = np.nonzero(components)
+    ids = components[rows, cols] - 1
+    order = np.argsort(ids, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    corners = np.array([[0, 0], [0, 1], [1, 0], [1, 1]])
+    rings = []
+    for c in selected:
+        members = order[starts[c]:starts[c] + sizes[c]]
+        r = (rows[members, None] + corners[None, :, 0]).ravel()
+        k = (cols[members, None] + corners[None, :, 1]).ravel()
+        points = np.unique(np.column_stack([west + k * dlon, north - r * dlat]), axis=0)
+        hull = points[ConvexHull(points).vertices]
+        rings.append({
+            'coordinates': np.vstack([hull, hull[:1]]),
+            'area_km2': round(float(row_area[rows[members]].sum()), 4)
+        })
+    return rings
+
+
+def cluster_footprints(index, cluster_ids, counts, cell_km, max_distance_km, aoi=None,
+                       max_polygons=20, min_cells=2):
+    """
+    Footprint polygons and geodesic areas for every cluster.
+
+    Args:
+        index (SpatialIndex): Labeled samples
+        cluster_ids (np.ndarray): Clusters to report (stats order)
+        counts (np.ndarray): Pixels per cluster, used to split the valid area
+        cell_km, max_distance_km, aoi: Rasterization (see footprint_grid)
+        max_polygons (int): Polygons kept per cluster, largest first
+        min_cells (int): Smallest component turned into a polygon
+
+    Returns:
+        dict: area_km2 (per cluster), valid_area_km2 and polygons (per
+        cluster, a list of dicts with a closed (m, 2) lon/lat ring array
+        under 'coordinates' and the component area under 'area_km2')
+    """
+    grid, transform = footprint_grid(index, cell_km, max_distance_km, aoi=aoi)
+    west, north, dlon, dlat = transform
+
+    # Exact cell area per grid row (depends only on latitude)
+    row_north = north - np.arange(grid.shape[0]) * dlat
+    row_area = cell_area_km2(row_north - dlat, row_north, dlon)
+    valid_area = float(np.sum((grid >= 0).sum(axis=1) * row_area))
+
+    counts = np.asarray(counts, dtype=np.float64)
+    share = counts / counts.sum() if counts.sum() else np.zeros_like(counts)
+
+    return {
+        'area_km2': share * valid_area,
+        'valid_area_km2': valid_area,
+        'polygons': [_component_hulls(grid == c, transform, row_area, max_polygons, min_cells)
+                     for c in cluster_ids]
+    }
@@ -0,0 +1,155 @@
+"""
+Run Instrumentation
+===================
+Per-stage timing, counters and optional profiling for one analysis run.
+
+A RunProfile is activated for the duration of ``analyze_location``; code
+deeper in the pipeline (e.g. the backends' ``getInfo`` calls) records into
+it through ``current_profile()`` without extra parameters, and can attach
+details for the results (e.g. cluster count scores) with ``annotate``. Stage boundaries
+are forwarded to an optional progress callback so a UI can show true
+progress, and stage outputs to an optional partial-results callback as
+soon as they are ready.
+"""
+
+import contextvars
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+_current = contextvars.ContextVar('run_profile', default=None)
+
+
+def current_profile():
+    """The RunProfile active in this context, or None."""
+    return _current.get()
+
+
+def record(counter, value=1):
+    """Add to a counter of the active RunProfile (no-op when none is active)."""
+    profile = _current.get()
+    if profile is not None:
+        profile.count(counter, value)
+
+
+def annotate(name, value):
+    """Attach a detail to the active RunProfile (no-op when none is active)."""
+    profile = _current.get()
+    if profile is not None:
+        profile.annotations[name] = value
+
+
+class RunProfile:
+    """
+    Collects stage wall times, counters and optional cProfile / tracemalloc
+    data for one analysis run.
+
+    Args:
+        progress_callback (callable): Called as ``callback(fraction, message)``
+            when a stage starts and when it finishes
+        n_stages (int): Number of stages, used to compute the progress fraction
+        profile (bool): Capture a cProfile of the calling thread
+        trace_memory (bool): Record peak traced memory with tracemalloc
+        partial_callback (callable): Called as ``callback(name, value)``
+            with each stage output published during the run
+    """
+
+    def __init__(self, progress_callback=None, n_stages=1, profile=False,
+                 trace_memory=False, partial_callback=None):
+        self.progress_callback = progress_callback
+        self.partial_callback = partial_callback
+        self.n_stages = n_stages
+        self.stages = {}
+        self.counters = {}
+        self.annotations = {}
+        self._profiler = cProfile.Profile() if profile else None
+        self._trace_memory = trace_memory
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self._token = None
+        self._start = None
+        self._total = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        if self._profiler is not None:
+            try:
+                self._profiler.enable()
+            except ValueError:  # another profiler is already active
+                self._profiler = None
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._total = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            self.counters['peak_traced_mb'] = round(peak / 1024 ** 2, 2)
+            if self._started_tracing:
+                tracemalloc.stop()
+        _current.reset(self._token)
+        return False
+
+    @contextmanager
+    def stage(self, name, message=None):
+        """Time a pipeline stage and report progress around it."""
+        done = len(self.stages)
+        self._report(done / self.n_stages, message)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - start, 4)
+            self._report(min(done + 1, self.n_stages) / self.n_stages, message)
+
+    def _report(self, fraction, message):
+        if self.progress_callback is not None:
+            self.progress_callback(fraction, message)
+
+    def publish(self, name, value):
+        """Hand a finished stage output to the partial-results callback."""
+        if self.partial_callback is not None:
+            self.partial_callback(name, value)
+
+    @property
+    def detailed(self):
+        """True when the run was asked for a cProfile or memory trace."""
+        return self._profiler is not None or self._trace_memory
+
+    def count(self, counter, value=1):
+        """Add ``value`` to a named counter (thread-safe)."""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def profile_stats(self, limit=20):
+        """Top cumulative-time functions of the cProfile capture (text)."""
+        if self._profiler is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def summary(self):
+        """Stage timings, counters and optional profile as a plain dict."""
+        total = self._total if self._total is not None else \
+            time.perf_counter() - self._start if self._start is not None else 0.0
+        summary = {
+            'stages_s': dict(self.stages),
+            'total_s': round(total, 4),
+            'counters': dict(self.counters)
+        }
+        if self._profiler is not None:
+            summary['profile'] = self.profile_stats()
+        return summary
@@ -0,0 +1,275 @@
+"""
+Analysis Job Queue
+==================
+Background execution of ``analyze_location`` so callers (the Streamlit
+script thread, an API handler) never block on the GEE round-trip.
+
+``submit`` returns a job id immediately; a bounded worker pool runs the
+analyses; callers poll ``status`` for progress and partial results,
+fetch ``result`` when done, and can ``cancel`` pending or running jobs.
+Submitting a request identical to a pending or running job (same
+normalized parameters, see ``analysis_key``, and same output options)
+joins that job instead of queueing another, and successful results are
+memoized for ``result_ttl`` seconds.
+"""
+
+import inspect
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from analysis_engine import analysis_key
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Parameters that identify an analysis (the rest only affect how it runs)
+KEY_PARAMS = set(inspect.signature(analysis_key).parameters)
+
+# Parameters adding outputs (files) to the results: part of the job identity
+OUTPUT_PARAMS = ('label_map_dir', 'tile_dir')
+
+
+class JobCancelled(CancelledError):
+    """Raised inside a running analysis when its job is cancelled."""
+
+
+class Job:
+    """State of one submitted analysis."""
+
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = PENDING
+        self.progress = 0.0
+        self.message = None
+        self.stages = []
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.cancel_event = threading.Event()
+        self.subscribers = 1
+
+    def on_progress(self, fraction, message):
+        """Progress callback handed to analyze_location."""
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.id)
+        self.progress = fraction
+        if message and message != self.message:
+            self.stages.append(message)
+        self.message = message
+
+    def on_partial(self, name, value):
+        """Partial-results callback handed to analyze_location."""
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.id)
+        self.partial[name] = value
+
+    def snapshot(self):
+        """Status and partial results as a plain dict."""
+        end = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'message': self.message,
+            'stages': list(self.stages),
+            'partial': dict(self.partial),
+            'error': self.error,
+            'params': dict(self.params),
+            'subscribers': self.subscribers,
+            'elapsed_s': round(end - (self.started_at or end), 2),
+            'queued_s': round((self.started_at or end) - self.submitted_at, 2)
+        }
+
+
+class AnalysisJobQueue:
+    """
+    Bounded thread pool running ``analyzer.analyze_location`` jobs.
+
+    Threads fit the workload: analyses mostly wait on Earth Engine, and the
+    NumPy/scikit-learn parts release the GIL.
+
+    Args:
+        analyzer (MineralExplorationAnalyzer): Shared, initialized analyzer
+        max_workers (int): Analyses run concurrently
+        result_ttl (float): Seconds a successful result is reused for
+            identical parameters (0 disables)
+        max_jobs (int): Finished jobs kept for polling before the oldest
+            are forgotten
+    """
+
+    def __init__(self, analyzer, max_workers=4, result_ttl=6 * 3600, max_jobs=256):
+        self.analyzer = analyzer
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='analysis')
+        self._jobs = OrderedDict()
+        self._active = {}  # params key -> pending/running job
+        self._results = OrderedDict()  # params key -> (finished_at, results)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(params):
+        outputs = tuple(None if params.get(k) is None else os.path.abspath(params[k])
+                        for k in OUTPUT_PARAMS)
+        return analysis_key(**{k: v for k, v in params.items() if k in KEY_PARAMS}) + outputs
+
+    def submit(self, lat, lon, radius_km=10, **kwargs):
+        """
+        Queue an analysis.
+
+        Args:
+            lat, lon, radius_km: Location, as for analyze_location
+            **kwargs: Other analyze_location parameters (dates, cloud cover, ...)
+
+        Returns:
+            str: Job id (shared with an identical job already in flight)
+        """
+        params = dict(kwargs, lat=lat, lon=lon, radius_km=radius_km)
+        key = self._key(params)
+
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None and not active.cancel_event.is_set():
+                active.subscribers += 1
+                return active.id
+
+            job = Job(params)
+            self._jobs[job.id] = job
+            self._forget_finished()
+
+            memo = self._results.get(key)
+            if memo is not None and time.time() - memo[0] < self.result_ttl:
+                # Identical request finished recently: reuse its result
+                job.started_at = job.finished_at = time.time()
+                job.status, job.progress, job.result = DONE, 1.0, memo[1]
+                return job.id
+
+            self._active[key] = job
+            job.future = self._executor.submit(self._run, job)
+        return job.id
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+
+        try:
+            results = self.analyzer.analyze_location(progress_callback=job.on_progress,
+                                                     partial_callback=job.on_partial,
+                                                     **job.params)
+        except Exception as e:
+            results = {'error': str(e), 'success': False}
+        job.finished_at = time.time()
+
+        key = self._key(job.params)
+        with self._lock:
+            if self._active.get(key) is job:
+                del self._active[key]
+
+        if job.cancel_event.is_set():
+            job.status = CANCELLED
+            return
+
+        job.result = results
+        job.progress = 1.0
+        if results.get('success'):
+            job.status = DONE
+            if self.result_ttl:
+                with self._lock:
+                    self._results[key] = (job.finished_at, results)
+                    while len(self._results) > self.max_jobs:
+                        self._results.popitem(last=False)
+        else:
+            job.status = FAILED
+            job.error = results.get('error', 'Unknown error')
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs beyond ``max_jobs``."""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in itertools.islice(finished, excess):
+            del self._jobs[job_id]
+
+    def _job(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        return job
+
+    def status(self, job_id):
+        """Status, progress, completed stages and their outputs so far."""
+        return self._job(job_id).snapshot()
+
+    def result(self, job_id, timeout=None):
+        """
+        Results dict of a finished job (waits up to ``timeout`` seconds).
+
+        Returns:
+            dict: analyze_location results, or None if not finished in time
+        """
+        job = self._job(job_id)
+        if job.future is not None and job.status not in FINISHED:
+            try:
+                job.future.result(timeout=timeout)
+            except Exception:
+                pass
+        return job.result if job.status in (DONE, FAILED) else None
+
+    def cancel(self, job_id):
+        """
+        Cancel a pending job, or stop a running one at its next stage.
+
+        A job joined by several submitters keeps running until each of them
+        has cancelled it.
+
+        Returns:
+            bool: True if the job will not produce a result for this caller
+        """
+        job = self._job(job_id)
+        if job.status in (DONE, FAILED):
+            return False
+        with self._lock:
+            job.subscribers -= 1
+            if job.subscribers > 0:
+                return True
+            job.cancel_event.set()
+            if self._active.get(self._key(job.params)) is job:
+                del self._active[self._key(job.params)]
+        if job.future is not None and job.future.cancel():
+            job.finished_at = time.time()
+        if job.status == PENDING:
+            job.status = CANCELLED
+        return True
+
+    def stats(self):
+        """Counts of jobs per status."""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {'max_workers': self.max_workers, 'jobs': counts}
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and release the worker threads."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,167 @@
+"""
+Cluster Count Selection
+=======================
+Chooses the K-Means cluster count for a feature matrix by fitting every k
+in a range in parallel on a bounded subsample and scoring the fits.
+
+Scoring methods:
+
+- ``silhouette``: mean silhouette coefficient (higher is better)
+- ``calinski_harabasz``: variance ratio criterion (higher is better)
+- ``elbow``: knee of the inertia curve (point farthest from the chord)
+
+The subsample size and a wall-clock budget keep the cost predictable. A k
+value is only started while the remaining budget covers a typical fit so
+far; the rest are skipped and reported. Each fit runs Lloyd iterations in
+short warm-started steps and checks the deadline between them, so a fit
+still running at the deadline stops within one step and is scored on its
+current (unconverged) centers: nothing keeps running past the budget.
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from statistics import median
+
+import numpy as np
+
+
+METHODS = ('silhouette', 'calinski_harabasz', 'elbow')
+
+# Silhouette is quadratic in the sample size: score it on at most this many rows
+SILHOUETTE_SAMPLES = 2000
+
+# K-Means initializations per k, Lloyd iterations between deadline checks
+# and in total per initialization
+N_INIT = 3
+ITER_STEP = 10
+MAX_ITER = 300
+
+
+def _fit_kmeans(X, k, random_state, deadline):
+    """
+    Best of N_INIT K-Means fits, iterated in ITER_STEP steps until they
+    converge or ``deadline`` (perf_counter) passes.
+
+    Returns:
+        tuple: (fitted KMeans, converged)
+    """
+    from sklearn.cluster import KMeans
+
+    best = None
+    for init in range(N_INIT):
+        kmeans = KMeans(n_clusters=k, n_init=1, max_iter=ITER_STEP,
+                        random_state=random_state + init).fit(X)
+        iterations = kmeans.n_iter_
+        converged = kmeans.n_iter_ < ITER_STEP
+        while not converged and iterations < MAX_ITER and time.perf_counter() < deadline:
+            kmeans = KMeans(n_clusters=k, init=kmeans.cluster_centers_, n_init=1,
+                            max_iter=ITER_STEP).fit(X)
+            iterations += kmeans.n_iter_
+            converged = kmeans.n_iter_ < ITER_STEP
+        if best is None or kmeans.inertia_ < best[0].inertia_:
+            best = (kmeans, converged or iterations >= MAX_ITER)
+        if time.perf_counter() >= deadline:
+            break
+    return best
+
+
+def _fit_and_score(X, k, method, random_state, deadline):
+    from sklearn.metrics import calinski_harabasz_score, silhouette_score
+
+    start = time.perf_counter()
+    kmeans, converged = _fit_kmeans(X, k, random_state, deadline)
+    if method == 'silhouette':
+        score = silhouette_score(X, kmeans.labels_, random_state=random_state,
+                                 sample_size=min(len(X), SILHOUETTE_SAMPLES))
+    elif method == 'calinski_harabasz':
+        score = calinski_harabasz_score(X, kmeans.labels_)
+    else:
+        score = kmeans.inertia_
+    return float(score), converged, time.perf_counter() - start
+
+
+def _elbow(ks, inertias):
+    """k at the knee: largest distance below the first-to-last chord."""
+    if len(ks) < 3:
+        return ks[0]
+    x = (np.asarray(ks, float) - ks[0]) / (ks[-1] - ks[0])
+    y = np.asarray(inertias, float)
+    span = y[0] - y[-1]
+    y = (y - y[-1]) / span if span > 0 else np.zeros_like(y)
+    # Chord runs from (0, 1) to (1, 0); the knee lies farthest below it
+    return ks[int(np.argmax(1 - x - y))]
+
+
+def select_k(X, k_min=2, k_max=8, method='calinski_harabasz', max_samples=5000,
+             time_budget_s=15.0, max_workers=None, random_state=42):
+    """
+    Pick the number of clusters for ``X``.
+
+    Args:
+        X (np.ndarray): (N, n_features) feature matrix
+        k_min, k_max (int): Inclusive range of cluster counts to try
+        method (str): One of METHODS
+        max_samples (int): Rows fitted and scored per k (random subsample)
+        time_budget_s (float): Wall-clock budget for the sweep; k values
+            not started when it runs short are skipped, fits running at the
+            deadline stop within one ITER_STEP and are scored unconverged
+            (at least one k is always fitted)
+        max_workers (int): k values fitted concurrently (default: CPU count)
+        random_state (int): Seed for the subsample and the fits
+
+    Returns:
+        dict: k (chosen), method, scores ({k: score}), skipped and
+        unconverged k values, n_samples used and elapsed_s
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown k selection method: {method}")
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(random_state)
+    if len(X) > max_samples:
+        X = X[np.sort(rng.choice(len(X), size=max_samples, replace=False))]
+    ks = [k for k in range(k_min, k_max + 1) if k < len(X)]
+    if not ks:
+        raise ValueError(f"Too few samples ({len(X)}) to choose between "
+                         f"{k_min} and {k_max} clusters")
+
+    deadline = start + time_budget_s
+    workers = max_workers or min(len(ks), os.cpu_count() or 1)
+    queued = list(ks)
+    running = {}
+    scores, durations, unconverged = {}, [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while queued or running:
+            # Start another k only while the budget left covers a typical fit
+            while queued and len(running) < workers:
+                remaining = deadline - time.perf_counter()
+                if (scores or running) and remaining <= (median(durations) if durations else 0):
+                    break
+                k = queued.pop(0)
+                running[pool.submit(_fit_and_score, X, k, method, random_state, deadline)] = k
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                k = running.pop(future)
+                scores[k], converged, duration = future.result()
+                durations.append(duration)
+                if not converged:
+                    unconverged.append(k)
+    scored = sorted(scores)
+
+    if method == 'elbow':
+        k = _elbow(scored, [scores[k] for k in scored])
+    else:
+        k = max(scored, key=lambda k: scores[k])
+
+    return {
+        'k': int(k),
+        'method': method,
+        'scores': {int(k): round(scores[k], 4) for k in scored},
+        'skipped': sorted(k for k in ks if k not in scores),
+        'unconverged': sorted(unconverged),
+        'n_samples': len(X),
+        'elapsed_s': round(time.perf_counter() - start, 3)
+    }
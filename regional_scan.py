@@ -0,0 +1,141 @@
+"""
+Regional Scan
+=============
+Building blocks of the coarse-to-fine regional prospectivity scan
+(MineralExplorationAnalyzer.scan_region):
+
+- a grid of square tiles over a lon/lat bounding box, and their
+  subdivision into finer children
+- an anomaly score per scanned tile from its prioritized clusters
+- a max-priority refinement queue that charges every scanned tile against
+  one global compute budget
+
+The scan covers the region with coarse tiles at low resolution, then
+repeatedly refines the most anomalous tile (its children are scanned at the
+next, finer level) until the budget runs out. Compute is measured in pixels
+sampled, which drives both the transfer from the backend and the clustering
+cost; a uniform pass samples every finest-level tile.
+"""
+
+import heapq
+import itertools
+import math
+
+import numpy as np
+
+from backends import KM_PER_DEG_LAT, KM_PER_DEG_LON
+
+
+# IV Region (Coquimbo), (west, south, east, north) in degrees
+REGION_IV_BOUNDS = (-71.75, -32.30, -69.80, -29.00)
+
+# Sampling scale (m) of each scan level, coarse to fine
+SCAN_LEVELS = (240, 60, 20)
+
+# Weight of each cluster priority in the tile anomaly score
+PRIORITY_WEIGHTS = {'High': 1.0, 'Medium': 0.5, 'Low': 0.0}
+
+
+def box_grid(bounds, tile_km):
+    """
+    Square tiles covering a bounding box (edge tiles are clipped to it).
+
+    Args:
+        bounds (tuple): (west, south, east, north) in degrees
+        tile_km (float): Tile edge length in kilometers
+
+    Returns:
+        list: (west, south, east, north) boxes, north to south, west to east
+    """
+    west, south, east, north = bounds
+    mid_lat = (south + north) / 2
+    dlat = tile_km / KM_PER_DEG_LAT
+    dlon = tile_km / (KM_PER_DEG_LON * math.cos(math.radians(mid_lat)))
+
+    n_rows = max(1, int(math.ceil((north - south) / dlat - 1e-9)))
+    n_cols = max(1, int(math.ceil((east - west) / dlon - 1e-9)))
+    return [
+        (west + j * dlon, max(north - (i + 1) * dlat, south),
+         min(west + (j + 1) * dlon, east), north - i * dlat)
+        for i in range(n_rows) for j in range(n_cols)
+    ]
+
+
+def split_box(box, n=2):
+    """Split a box into n x n equal children."""
+    west, south, east, north = box
+    lons = np.linspace(west, east, n + 1)
+    lats = np.linspace(north, south, n + 1)
+    return [(float(lons[j]), float(lats[i + 1]), float(lons[j + 1]), float(lats[i]))
+            for i in range(n) for j in range(n)]
+
+
+def box_area_km2(box):
+    """Approximate ground area of a box (equirectangular at its center)."""
+    west, south, east, north = box
+    cos_lat = math.cos(math.radians((south + north) / 2))
+    return (east - west) * KM_PER_DEG_LON * cos_lat * (north - south) * KM_PER_DEG_LAT
+
+
+def anomaly_score(cluster_stats):
+    """
+    How anomalous a tile is, from 0 (no High/Medium alteration) to 1 (every
+    sampled pixel in a High-priority cluster at full confidence).
+
+    Each cluster contributes its priority weight times its confidence,
+    weighted by its share of the tile's sampled pixels.
+
+    Args:
+        cluster_stats (ClusterTable): Prioritized clusters of the tile
+
+    Returns:
+        float: Anomaly score
+    """
+    if cluster_stats is None or len(cluster_stats) == 0:
+        return 0.0
+    weights = np.array([PRIORITY_WEIGHTS.get(p, 0.0) for p in cluster_stats['priority']])
+    n_pixels = cluster_stats['n_pixels'].astype(np.float64)
+    if n_pixels.sum() == 0:
+        return 0.0
+    return float(np.sum(weights * cluster_stats['confidence_score'] / 100 * n_pixels)
+                 / n_pixels.sum())
+
+
+class RefinementQueue:
+    """
+    Max-priority queue of scanned tiles under a global compute budget.
+
+    Args:
+        budget (float): Compute units (pixels sampled) available to the scan
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.spent = 0
+        self._heap = []
+        self._order = itertools.count()  # FIFO among equal scores
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def remaining(self):
+        return self.budget - self.spent
+
+    def charge(self, cost):
+        """Record compute spent."""
+        self.spent += cost
+
+    def affords(self, cost):
+        """Whether ``cost`` more units fit in the budget."""
+        return self.spent + cost <= self.budget
+
+    def push(self, score, tile):
+        """Queue a tile for refinement."""
+        heapq.heappush(self._heap, (-score, next(self._order), tile))
+
+    def pop(self):
+        """The most anomalous queued tile, or None when the queue is empty."""
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[2]
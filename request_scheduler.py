@@ -0,0 +1,241 @@
+"""
+Remote Request Scheduler
+========================
+Every blocking call to the imagery backend (Earth Engine ``getInfo``
+round-trips) goes through a RequestScheduler, which provides:
+
+- a global concurrency limit shared by all threads (job workers, tiles)
+- token-bucket rate limiting
+- retries of transient failures ("Too many concurrent aggregations",
+  timeouts, HTTP 429/5xx) with exponential backoff and full jitter
+- counters for latency, retries and throttling
+
+Clock, sleep and random source are injectable, so the scheduler can be
+exercised deterministically against a local fake backend.
+"""
+
+import contextlib
+import random
+import threading
+import time
+
+from instrumentation import record
+
+
+# Substrings of error messages worth retrying
+TRANSIENT_MARKERS = (
+    'too many concurrent',
+    'too many requests',
+    'rate limit',
+    'timed out',
+    'timeout',
+    'deadline exceeded',
+    'service unavailable',
+    'internal error',
+    'backend error',
+    'connection reset',
+    '429',
+    '502',
+    '503',
+    '504',
+)
+
+
+class RemoteCallFailed(Exception):
+    """A transient remote failure that persisted through every retry."""
+
+
+def is_transient(exc):
+    """True if ``exc`` looks like a throttling / availability error."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``rate`` tokens/s, holding at most ``burst``.
+
+    ``reserve`` always takes a token and returns how long the caller must
+    wait for it, so waiting callers are served in arrival order.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token; returns the wait (s) before it is available."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RequestScheduler:
+    """
+    Runs remote calls under a concurrency cap and rate limit, retrying
+    transient failures.
+
+    Args:
+        max_concurrent (int): Calls in flight at once (None: unlimited)
+        rate_per_s (float): Sustained calls per second (None: unlimited)
+        burst (int): Calls allowed back-to-back before rate limiting applies
+        max_retries (int): Retries of a transient failure
+        base_delay (float): Backoff before the first retry (s); doubles per
+            retry, with full jitter
+        max_delay (float): Backoff ceiling (s)
+        retryable (callable): Predicate deciding whether an exception is
+            transient (default: is_transient)
+        clock, sleep: Time source and sleep function
+        rng (random.Random): Jitter source
+    """
+
+    def __init__(self, max_concurrent=8, rate_per_s=None, burst=None, max_retries=4,
+                 base_delay=0.5, max_delay=30.0, retryable=is_transient,
+                 clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self._bucket = TokenBucket(rate_per_s, burst, clock) if rate_per_s else None
+        self._lock = threading.Lock()
+        self._counters = {
+            'calls': 0,
+            'attempts': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'retries': 0,
+            'throttled': 0,
+            'throttle_wait_s': 0.0,
+            'queue_wait_s': 0.0,
+            'backoff_s': 0.0,
+            'latency_s': 0.0,
+            'max_latency_s': 0.0,
+        }
+
+    def _count(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def backoff(self, attempt):
+        """Full-jitter delay (s) before retry number ``attempt`` (0-based)."""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _slot(self):
+        if self._slots is None:
+            return contextlib.nullcontext()
+        start = self.clock()
+        self._slots.acquire()
+        self._count('queue_wait_s', self.clock() - start)
+        return _Release(self._slots)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Call ``fn(*args, **kwargs)`` through the scheduler.
+
+        Returns:
+            The call's result
+
+        Raises:
+            RemoteCallFailed: A transient failure persisted after max_retries
+            Exception: Non-transient errors are raised unchanged
+        """
+        self._count('calls')
+        record('remote_calls')
+
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                wait = self._bucket.reserve()
+                if wait > 0:
+                    self._count('throttled')
+                    self._count('throttle_wait_s', wait)
+                    record('remote_throttle_s', round(wait, 4))
+                    self.sleep(wait)
+
+            with self._slot():
+                self._count('attempts')
+                start = self.clock()
+                try:
+                    result = fn(*args, **kwargs)
+                    error = None
+                except Exception as e:
+                    error = e
+                latency = self.clock() - start
+                with self._lock:
+                    self._counters['latency_s'] += latency
+                    self._counters['max_latency_s'] = max(self._counters['max_latency_s'],
+                                                          latency)
+
+            if error is None:
+                self._count('succeeded')
+                return result
+            if not self.retryable(error):
+                self._count('failed')
+                raise error
+            if attempt == self.max_retries:
+                break
+
+            delay = self.backoff(attempt)
+            self._count('retries')
+            self._count('backoff_s', delay)
+            record('remote_retries')
+            print(f"⚠️ Transient remote error ({error}); retry {attempt + 1}/"
+                  f"{self.max_retries} in {delay:.1f}s")
+            self.sleep(delay)
+
+        self._count('failed')
+        raise RemoteCallFailed(
+            f"Remote request failed after {self.max_retries + 1} attempts: {error}"
+        ) from error
+
+    def stats(self):
+        """Counters plus mean latency, rounded for display."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['mean_latency_s'] = stats['latency_s'] / stats['attempts'] if stats['attempts'] else 0.0
+        return {k: round(v, 4) if isinstance(v, float) else v for k, v in stats.items()}
+
+
+class _Release:
+    """Context manager releasing an already-acquired semaphore slot."""
+
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+        return False
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler():
+    """
+    Process-wide scheduler for Earth Engine calls.
+
+    Earth Engine limits concurrent requests per project, so every analyzer
+    in the process shares one concurrency cap and rate limit.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RequestScheduler(max_concurrent=10, rate_per_s=20, burst=20)
+        return _shared
@@ -0,0 +1,139 @@
+"""
+Sample Cache
+============
+Persistent, content-addressed on-disk cache for sampled feature matrices.
+
+Each entry is a compressed .npz holding the (N, 3) feature matrix, the
+(N, 2) lon/lat coordinates and an expiry timestamp. Keys are SHA-256
+digests of the request parameters (AOI, date window, cloud threshold,
+scale, numPixels, ...), so identical requests map to the same file.
+The directory is bounded in size with least-recently-used eviction.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+class SampleCache:
+    """
+    Size-bounded LRU cache of sample pulls stored as .npz files.
+
+    Args:
+        cache_dir (str): Directory holding the cache entries
+        max_bytes (int): Total size budget; least recently used entries
+            are evicted beyond it
+        open_window_ttl (float): Lifetime (s) of entries whose date window
+            is still open (end date today or later) - new scenes may arrive
+    """
+
+    def __init__(self, cache_dir='.sample_cache', max_bytes=256 * 1024 ** 2,
+                 open_window_ttl=6 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.open_window_ttl = open_window_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(**params):
+        """Content address for a set of request parameters."""
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def ttl_for_window(self, end_date):
+        """
+        Entry lifetime for a date window.
+
+        Closed windows (end date in the past) cannot gain new scenes, so their
+        entries never expire; open windows expire after ``open_window_ttl``.
+        """
+        if end_date is None:
+            return self.open_window_ttl
+        end = datetime.strptime(str(end_date), '%Y-%m-%d').date()
+        if end < datetime.now().date():
+            return None
+        return self.open_window_ttl
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Look up an entry.
+
+        Returns:
+            tuple: (X, coords) on a hit, None on a miss or expired entry
+        """
+        path = self._path(key)
+        with self._lock:
+            try:
+                with np.load(path) as data:
+                    expires_at = float(data['expires_at'])
+                    if expires_at and expires_at < time.time():
+                        raise FileNotFoundError(path)
+                    X, coords = data['X'], data['coords']
+            except (FileNotFoundError, OSError, KeyError, ValueError):
+                if os.path.exists(path):
+                    os.remove(path)
+                self.misses += 1
+                return None
+
+            # Touch the entry so it becomes most recently used
+            os.utime(path)
+            self.hits += 1
+            return X, coords
+
+    def put(self, key, X, coords, ttl=None):
+        """Store an entry (``ttl`` in seconds, None = never expires)."""
+        expires_at = time.time() + ttl if ttl is not None else 0.0
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        # Write-then-rename so readers never see a partial file
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, X=X, coords=coords, expires_at=expires_at)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until under ``max_bytes``."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        """Hit/miss/eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,93 @@
+"""
+Single-Flight Request Coalescing
+================================
+Concurrent calls with the same key share one computation: the first caller
+(the leader) runs it, callers arriving while it is in flight wait and
+receive the same result or exception. Nothing is cached once the flight
+lands - the next call with that key starts a new computation.
+
+A leader that was cancelled (raises ``concurrent.futures.CancelledError``)
+does not hand its cancellation to the waiters; one of them takes over and
+runs the computation itself.
+"""
+
+import threading
+from concurrent.futures import CancelledError
+
+
+class _Flight:
+    """One in-flight computation and the callers waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one.
+
+    Keys must be hashable; build them from normalized request parameters so
+    equivalent requests collide.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        Run ``fn()`` unless an identical call is already in flight.
+
+        Args:
+            key: Hashable identity of the call
+            fn (callable): Computation, called without arguments
+
+        Returns:
+            tuple: (result, shared) - shared is True when the result came
+            from another caller's computation
+        """
+        while True:
+            with self._lock:
+                self.calls += 1
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+
+            if leader:
+                try:
+                    flight.result = fn()
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+                return flight.result, False
+
+            flight.done.wait()
+            if isinstance(flight.error, CancelledError):
+                with self._lock:
+                    self.calls -= 1
+                continue
+            with self._lock:
+                self.shared += 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+    def in_flight(self):
+        """Number of computations currently running."""
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        """Call, shared-result and in-flight counts."""
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared,
+                    'in_flight': len(self._flights)}
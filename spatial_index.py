@@ -0,0 +1,173 @@
+"""
+Spatial Index
+=============
+KD-tree over sampled pixel coordinates (and their cluster labels) for
+drill-target geometry without O(N^2) scans:
+
+- radius and nearest-neighbour queries around a point
+- spatially connected sub-targets within a cluster (samples linked when
+  closer than a link distance), each represented by an actual sample point
+- de-duplication of targets closer than a minimum drill spacing
+
+Coordinates are projected to local kilometres (equirectangular around the
+mean latitude), which is accurate at the tens-of-km scale of an AOI.
+"""
+
+import math
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from backends import KM_PER_DEG_LAT, KM_PER_DEG_LON
+from cluster_table import SUB_TARGET_DTYPE
+
+
+def project_km(lon, lat, lat0):
+    """Lon/lat degrees -> local x/y kilometres."""
+    return np.column_stack([
+        np.asarray(lon, dtype=np.float64) * KM_PER_DEG_LON * math.cos(math.radians(lat0)),
+        np.asarray(lat, dtype=np.float64) * KM_PER_DEG_LAT
+    ])
+
+
+class SpatialIndex:
+    """
+    KD-tree over (N, 2) lon/lat sample coordinates with optional labels.
+
+    Args:
+        coords (np.ndarray): (N, 2) lon/lat coordinates
+        labels (np.ndarray): (N,) cluster labels (optional)
+    """
+
+    def __init__(self, coords, labels=None):
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.labels = None if labels is None else np.asarray(labels)
+        self.lat0 = float(self.coords[:, 1].mean()) if len(self.coords) else 0.0
+        self.xy = project_km(self.coords[:, 0], self.coords[:, 1], self.lat0)
+        self.tree = cKDTree(self.xy)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _point(self, lat, lon):
+        return project_km([lon], [lat], self.lat0)[0]
+
+    def query_radius(self, lat, lon, radius_km, cluster_id=None):
+        """
+        Indices of samples within ``radius_km`` of a point.
+
+        Args:
+            cluster_id (int): Only return samples with this label
+
+        Returns:
+            np.ndarray: Sorted sample indices
+        """
+        idx = np.asarray(self.tree.query_ball_point(self._point(lat, lon), radius_km),
+                         dtype=np.int64)
+        if cluster_id is not None and self.labels is not None:
+            idx = idx[self.labels[idx] == cluster_id]
+        return np.sort(idx)
+
+    def nearest(self, lat, lon, k=1):
+        """
+        The ``k`` samples nearest to a point.
+
+        Returns:
+            tuple: (distances_km, indices) arrays, nearest first
+        """
+        distances, idx = self.tree.query(self._point(lat, lon), k=k)
+        return np.atleast_1d(distances), np.atleast_1d(idx)
+
+    def spacing_km(self, max_queries=5000):
+        """Median nearest-neighbour distance between samples (estimated from
+        at most ``max_queries`` query points)."""
+        if len(self) < 2:
+            return 0.0
+        points = self.xy
+        if len(points) > max_queries:
+            rng = np.random.default_rng(0)
+            points = points[rng.choice(len(points), size=max_queries, replace=False)]
+        distances, _ = self.tree.query(points, k=2)
+        return float(np.median(distances[:, 1]))
+
+    def components(self, link_km, cluster_id=None):
+        """
+        Connected groups of samples: two samples are linked when closer than
+        ``link_km`` (optionally only samples of one cluster).
+
+        Returns:
+            tuple: (sample indices, component label per index)
+        """
+        if cluster_id is None or self.labels is None:
+            idx = np.arange(len(self))
+        else:
+            idx = np.flatnonzero(self.labels == cluster_id)
+        if len(idx) == 0:
+            return idx, np.empty(0, dtype=np.int64)
+
+        pairs = cKDTree(self.xy[idx]).query_pairs(link_km, output_type='ndarray')
+        graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+                           shape=(len(idx), len(idx)))
+        _, component = connected_components(graph, directed=False)
+        return idx, component
+
+    def sub_targets(self, cluster_id, link_km, min_points=5, max_targets=20):
+        """
+        Spatially connected parts of a cluster, largest first.
+
+        Each part is represented by its medoid-like sample (the member
+        closest to the part's mean position), so the point always lies on
+        the cluster.
+
+        Returns:
+            np.ndarray: SUB_TARGET_DTYPE records (latitude, longitude, n_pixels)
+        """
+        idx, component = self.components(link_km, cluster_id)
+        if len(idx) == 0:
+            return np.empty(0, dtype=SUB_TARGET_DTYPE)
+
+        sizes = np.bincount(component)
+        keep = np.flatnonzero(sizes >= min(min_points, sizes.max()))
+        keep = keep[np.argsort(-sizes[keep], kind='stable')][:max_targets]
+
+        # Mean position per component, then the member closest to it
+        xy = self.xy[idx]
+        mean_xy = np.column_stack([
+            np.bincount(component, weights=xy[:, j]) / sizes for j in range(2)
+        ])
+        offset = np.sum((xy - mean_xy[component]) ** 2, axis=1)
+        order = np.lexsort((offset, component))
+        first = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        representative = idx[order[first]]
+
+        targets = np.empty(len(keep), dtype=SUB_TARGET_DTYPE)
+        targets['latitude'] = self.coords[representative[keep], 1]
+        targets['longitude'] = self.coords[representative[keep], 0]
+        targets['n_pixels'] = sizes[keep]
+        return targets
+
+
+def dedupe_targets(lats, lons, min_spacing_km):
+    """
+    Greedy spacing filter: walk the targets in priority order and drop any
+    within ``min_spacing_km`` of one already kept.
+
+    Returns:
+        np.ndarray: Indices of the kept targets, in input order
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    if len(lats) == 0:
+        return np.empty(0, dtype=np.int64)
+    xy = project_km(lons, lats, float(lats.mean()))
+    tree = cKDTree(xy)
+
+    suppressed = np.zeros(len(lats), dtype=bool)
+    kept = []
+    for i in range(len(lats)):
+        if suppressed[i]:
+            continue
+        kept.append(i)
+        suppressed[tree.query_ball_point(xy[i], min_spacing_km)] = True
+    return np.asarray(kept, dtype=np.int64)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Top-level modules (flat layout) and the benchmarks package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+"""Stable cluster ids: Hungarian matching to previous centroids and their store."""
+
+from itertools import permutations
+from types import SimpleNamespace
+
+import numpy as np
+
+from analysis_engine import _match_cluster_ids
+from centroid_store import CentroidStore
+
+
+def test_permuted_fit_recovers_previous_ids():
+    rng = np.random.default_rng(0)
+    previous = rng.normal(size=(5, 3))
+    order = np.array([3, 0, 4, 1, 2])
+    labels = rng.integers(0, 5, 200)
+    # A refit finding the same clusters under shuffled ids, slightly moved
+    fit = SimpleNamespace(cluster_centers_=previous[order] + 0.01, labels_=labels.copy())
+
+    _match_cluster_ids(fit, previous)
+
+    np.testing.assert_allclose(fit.cluster_centers_, previous + 0.01)
+    # Every sample keeps its center, now under the previous id
+    np.testing.assert_array_equal(fit.labels_, order[labels])
+
+
+def test_assignment_is_one_to_one_and_minimal():
+    # Greedy nearest matching would give both new centers the id of previous 0
+    previous = np.array([[0.0, 0.0], [10.0, 0.0], [20.0, 0.0]])
+    centers = np.array([[1.0, 0.0], [-1.0, 0.0], [19.0, 0.0]])
+    fit = SimpleNamespace(cluster_centers_=centers.copy(), labels_=np.arange(3))
+
+    _match_cluster_ids(fit, previous)
+
+    cost = np.linalg.norm(fit.cluster_centers_ - previous, axis=1).sum()
+    best = min(np.linalg.norm(centers[list(p)] - previous, axis=1).sum()
+               for p in permutations(range(3)))
+    assert cost == best
+    assert sorted(map(tuple, fit.cluster_centers_)) == sorted(map(tuple, centers))
+    np.testing.assert_array_equal(fit.cluster_centers_[fit.labels_], centers)
+
+
+def test_store_returns_nearest_entry_of_the_same_group():
+    store = CentroidStore(max_distance_km=2.0)
+    group = CentroidStore.group(['iron_oxide', 'clay_minerals'], 4, '2026-01-01', '2026-06-30')
+    other = CentroidStore.group(['iron_oxide', 'clay_minerals'], 5, '2026-01-01', '2026-06-30')
+    store.put(group, -30.0, -71.0, np.zeros((4, 2)), 1.0)
+    store.put(group, -30.01, -71.0, np.ones((4, 2)), 2.0)  # ~1.1 km south
+
+    centroids, inertia = store.get(group, -30.009, -71.0)
+    assert inertia == 2.0 and centroids.sum() == 8
+    assert store.get(other, -30.0, -71.0) is None
+    assert store.get(group, -30.1, -71.0) is None  # ~11 km away
@@ -0,0 +1,85 @@
+"""Grouped cluster statistics against the per-cluster mask loop they replaced."""
+
+import numpy as np
+import pytest
+
+from cluster_stats import StreamingClusterStats, grouped_cluster_stats
+
+
+def make_clusters(n=5000, k=5, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, k, n)
+    labels[labels == 3] = 1  # an empty cluster id
+    features = (rng.normal(size=(n, 3)) + labels[:, None]).astype(np.float32)
+    coords = np.column_stack([rng.uniform(-71.2, -71.0, n), rng.uniform(-30.2, -30.0, n)])
+    return features, labels, coords, k
+
+
+def loop_stats(features, labels, coords, k, n_sample_points=10):
+    """The original per-cluster loop: one boolean mask per cluster."""
+    rows = []
+    for cluster_id in range(k):
+        mask = labels == cluster_id
+        if not mask.any():
+            continue
+        rows.append({
+            'cluster_id': cluster_id,
+            'count': int(mask.sum()),
+            'mean': features[mask].astype(np.float64).mean(axis=0),
+            'std': features[mask].astype(np.float64).std(axis=0),
+            'p90': np.percentile(features[mask], 90, axis=0),
+            'centroid': coords[mask].mean(axis=0),
+            'sample_points': coords[mask][:n_sample_points]
+        })
+    return rows
+
+
+def test_grouped_stats_match_per_cluster_loop():
+    features, labels, coords, k = make_clusters()
+    stats = grouped_cluster_stats(features, labels, coords, k)
+    expected = loop_stats(features, labels, coords, k)
+
+    assert stats['cluster_id'].tolist() == [row['cluster_id'] for row in expected]
+    for i, row in enumerate(expected):
+        assert stats['count'][i] == row['count']
+        for name in ('mean', 'std', 'p90', 'centroid'):
+            np.testing.assert_allclose(stats[name][i], row[name], rtol=1e-5, atol=1e-6)
+        np.testing.assert_array_equal(stats['sample_points'][i], row['sample_points'])
+
+
+def test_unit_weights_match_unweighted_stats():
+    features, labels, coords, k = make_clusters(seed=1)
+    plain = grouped_cluster_stats(features, labels, coords, k)
+    weighted = grouped_cluster_stats(features, labels, coords, k, weights=np.ones(len(labels)))
+
+    for name in ('mean', 'std', 'centroid'):
+        np.testing.assert_allclose(weighted[name], plain[name], rtol=1e-9)
+    np.testing.assert_allclose(weighted['weight'], plain['count'])
+
+
+def test_integer_weights_match_repeated_rows():
+    features, labels, coords, k = make_clusters(n=800, seed=2)
+    repeats = np.random.default_rng(3).integers(1, 4, len(labels))
+    weighted = grouped_cluster_stats(features, labels, coords, k, weights=repeats)
+    repeated = grouped_cluster_stats(np.repeat(features, repeats, axis=0),
+                                     np.repeat(labels, repeats),
+                                     np.repeat(coords, repeats, axis=0), k)
+
+    for name in ('mean', 'std', 'centroid'):
+        np.testing.assert_allclose(weighted[name], repeated[name], rtol=1e-6)
+
+
+def test_streaming_stats_match_single_pass():
+    features, labels, coords, k = make_clusters(seed=4)
+    stream = StreamingClusterStats(k, features.shape[1], quantile_sample=len(labels))
+    for start in range(0, len(labels), 700):
+        stop = start + 700
+        stream.update(features[start:stop], labels[start:stop], coords[start:stop])
+    streamed = stream.result()
+    single = grouped_cluster_stats(features, labels, coords, k)
+
+    np.testing.assert_array_equal(streamed['count'], single['count'])
+    for name in ('mean', 'std', 'centroid', 'p90'):
+        np.testing.assert_allclose(streamed[name], single[name], rtol=1e-5, atol=1e-6)
+    for points, expected in zip(streamed['sample_points'], single['sample_points']):
+        assert np.asarray(points) == pytest.approx(np.asarray(expected))
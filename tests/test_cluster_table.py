@@ -0,0 +1,89 @@
+"""ClusterTable: per-cluster parts in, the same records (and Arrow columns) out."""
+
+import numpy as np
+import pytest
+
+from cluster_table import SUB_TARGET_DTYPE, ClusterTable
+
+
+def make_parts(offset=0.0):
+    columns = {
+        'cluster_id': np.array([2, 0, 1]),
+        'priority': np.array(['High', 'Low', 'Medium'], dtype=object),
+        'area_km2': np.array([1.5, 0.25, 3.0]) + offset
+    }
+    sample_points = [np.array([[-71.1, -30.1], [-71.2, -30.2]]) + offset,
+                     np.empty((0, 2)),
+                     [[-71.3 + offset, -30.3 + offset]]]
+    sub_targets = [np.array([(-30.1, -71.1, 40), (-30.2, -71.2, 7)], dtype=SUB_TARGET_DTYPE),
+                   np.empty(0, dtype=SUB_TARGET_DTYPE),
+                   np.array([(-30.3, -71.3, 12)], dtype=SUB_TARGET_DTYPE)]
+    square = [[-71.0, -30.0], [-71.0, -30.1], [-71.1, -30.1], [-71.0, -30.0]]
+    footprints = [[{'coordinates': square, 'area_km2': 0.9},
+                   {'coordinates': square[:3] + [square[0]], 'area_km2': 0.1}],
+                  [],
+                  [{'coordinates': square, 'area_km2': 2.0}]]
+    return columns, sample_points, sub_targets, footprints
+
+
+def assert_rows(table, parts):
+    columns, sample_points, sub_targets, footprints = parts
+    assert len(table) == len(sample_points)
+    for i, row in enumerate(table):
+        for name, values in columns.items():
+            assert row[name] == values[i]
+        np.testing.assert_allclose(np.reshape(row['sample_points'], (-1, 2)),
+                                   np.reshape(sample_points[i], (-1, 2)), atol=1e-5)
+        assert [(t['latitude'], t['longitude'], t['n_pixels']) for t in row['sub_targets']] \
+            == sub_targets[i].tolist()
+        assert [ring['area_km2'] for ring in row['footprint']] == \
+            [ring['area_km2'] for ring in footprints[i]]
+        for ring, expected in zip(row['footprint'], footprints[i]):
+            np.testing.assert_allclose(ring['coordinates'], expected['coordinates'], atol=1e-5)
+
+
+def test_from_parts_round_trips_every_cluster():
+    parts = make_parts()
+    table = ClusterTable.from_parts(*parts)
+
+    assert_rows(table, parts)
+    assert table[-1] == table.row(2)
+    with pytest.raises(IndexError):
+        table.row(3)
+
+
+def test_concat_keeps_rows_and_adds_the_key_column():
+    first, second = make_parts(), make_parts(offset=0.5)
+    table = ClusterTable.concat([ClusterTable.from_parts(*first),
+                                 ClusterTable.from_parts(*second)], keys=['a', 'b'])
+
+    assert table['site'].tolist() == ['a'] * 3 + ['b'] * 3
+    columns = {name: np.concatenate([first[0][name], second[0][name]]) for name in first[0]}
+    assert_rows(table, (columns, first[1] + second[1], first[2] + second[2],
+                        first[3] + second[3]))
+
+
+def test_to_pandas_shares_scalar_columns():
+    table = ClusterTable.from_parts(*make_parts())
+    df = table.to_pandas(nested=True)
+
+    assert list(df.columns[:3]) == ['cluster_id', 'priority', 'area_km2']
+    assert np.shares_memory(df['area_km2'].to_numpy(), table['area_km2'])
+    assert len(df['sample_points'][0]) == 2 and len(df['footprint'][1]) == 0
+
+
+def test_arrow_and_parquet_round_trip(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = ClusterTable.from_parts(*make_parts())
+    arrow = table.to_arrow().to_pylist()
+    assert pq.read_table(table.to_parquet(str(tmp_path / 'clusters.parquet'))).to_pylist() \
+        == arrow
+
+    for row, expected in zip(arrow, table):
+        assert row['cluster_id'] == expected['cluster_id']
+        assert row['priority'] == expected['priority']
+        np.testing.assert_allclose(np.reshape(row['sample_points'], (-1, 2)),
+                                   np.reshape(expected['sample_points'], (-1, 2)), atol=1e-5)
+        assert row['sub_targets'] == expected['sub_targets']
+        assert row['footprint_area_km2'] == [ring['area_km2'] for ring in expected['footprint']]
+        assert len(row['footprint']) == len(expected['footprint'])
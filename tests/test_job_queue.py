@@ -0,0 +1,105 @@
+"""
+Output options (label map, tile pyramid) are part of a request's identity:
+a request asking for them must neither join an in-flight plain run nor be
+served from the memo of one.
+"""
+
+import os
+import threading
+
+import pytest
+
+from analysis_engine import MineralExplorationAnalyzer
+from backends import LocalRasterBackend
+from benchmarks.synthetic import make_scene
+from job_queue import AnalysisJobQueue
+
+
+@pytest.fixture
+def site():
+    bands, geotransform = make_scene(300, 300)
+    x0, dx, _, y0, _, dy = geotransform
+    analyzer = MineralExplorationAnalyzer(backend=LocalRasterBackend(bands, geotransform))
+    params = dict(lat=y0 + 150 * dy, lon=x0 + 150 * dx, radius_km=1.2, scale=20,
+                  num_pixels=2000)
+    return analyzer, params
+
+
+def assert_outputs(results, label_map_dir, tile_dir):
+    assert results['success']
+    assert os.path.exists(results['alteration_map']['path'])
+    assert os.path.dirname(results['alteration_map']['path']) == label_map_dir
+    meta = results['tile_layers']
+    assert os.path.exists(os.path.join(tile_dir, meta['analysis_id'], 'meta.json'))
+
+
+def test_memoized_plain_result_does_not_serve_output_request(site, tmp_path):
+    analyzer, params = site
+    outputs = dict(label_map_dir=str(tmp_path / 'maps'), tile_dir=str(tmp_path / 'tiles'))
+    queue = AnalysisJobQueue(analyzer, max_workers=1)
+    try:
+        plain = queue.result(queue.submit(**params), timeout=120)
+        assert plain['success'] and 'alteration_map' not in plain
+
+        with_outputs = queue.result(queue.submit(**params, **outputs), timeout=120)
+        assert_outputs(with_outputs, **outputs)
+
+        # The same output request is memoized in turn
+        again = queue.submit(**params, **outputs)
+        assert queue.status(again)['status'] == 'done'
+        assert queue.result(again) is with_outputs
+    finally:
+        queue.shutdown()
+
+
+def test_inflight_plain_run_is_not_joined_by_output_request(site, tmp_path):
+    analyzer, params = site
+    outputs = dict(label_map_dir=str(tmp_path / 'maps'), tile_dir=str(tmp_path / 'tiles'))
+    second_started = threading.Event()
+    results = {}
+
+    def hold(fraction, message):
+        # Keep the plain run in flight until the output run starts its own
+        second_started.wait(timeout=10)
+
+    def plain():
+        results['plain'] = analyzer.analyze_location(progress_callback=hold, **params)
+
+    thread = threading.Thread(target=plain)
+    thread.start()
+    results['outputs'] = analyzer.analyze_location(
+        progress_callback=lambda fraction, message: second_started.set(), **params, **outputs)
+    thread.join()
+
+    assert second_started.is_set()
+    assert results['plain']['success'] and 'alteration_map' not in results['plain']
+    assert_outputs(results['outputs'], **outputs)
+    assert results['outputs']['instrumentation']['counters'].get('coalesced') is None
+
+
+def test_stage_outputs_are_published_before_the_run_finishes(site):
+    analyzer, params = site
+    events = []
+    results = analyzer.analyze_location(
+        progress_callback=lambda fraction, message: events.append(('progress', fraction)),
+        partial_callback=lambda name, value: events.append(('partial', name)), **params)
+
+    assert results['success']
+    partial = [name for kind, name in events if kind == 'partial']
+    assert partial == ['cluster_stats', 'drill_targets']
+    # Cluster stats arrive while the targets stage is still to run
+    assert events.index(('partial', 'cluster_stats')) < events.index(('progress', 1.0))
+
+
+def test_job_snapshot_exposes_stage_outputs(site):
+    analyzer, params = site
+    queue = AnalysisJobQueue(analyzer, max_workers=1)
+    try:
+        job_id = queue.submit(**params)
+        results = queue.result(job_id, timeout=120)
+        partial = queue.status(job_id)['partial']
+    finally:
+        queue.shutdown()
+
+    assert set(partial) == {'cluster_stats', 'drill_targets'}
+    assert partial['drill_targets'] is results['drill_targets']
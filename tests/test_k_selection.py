@@ -0,0 +1,36 @@
+"""Cluster count selection: picks the planted k and holds its time budget."""
+
+import threading
+import time
+
+import numpy as np
+
+from k_selection import select_k
+
+
+def blobs(k=4, n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-10, 10, size=(k, 3))
+    return (centers[rng.integers(0, k, n)] + rng.normal(scale=0.3, size=(n, 3))).astype(np.float32)
+
+
+def test_planted_cluster_count_is_selected():
+    for method in ('calinski_harabasz', 'silhouette'):
+        selection = select_k(blobs(), k_min=2, k_max=7, method=method, time_budget_s=60)
+        assert selection['k'] == 4
+        assert selection['skipped'] == [] and selection['unconverged'] == []
+
+
+def test_budget_bounds_wall_time_and_leaves_no_fit_running():
+    X = np.random.default_rng(1).normal(size=(100_000, 3)).astype(np.float32)
+    select_k(X[:500], time_budget_s=5)  # warm up imports
+    threads = threading.active_count()
+
+    start = time.perf_counter()
+    selection = select_k(X, k_min=2, k_max=8, max_samples=len(X), time_budget_s=0.2,
+                         max_workers=2)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.5
+    assert selection['scores'] and selection['skipped']
+    assert threading.active_count() == threads
@@ -0,0 +1,39 @@
+"""
+A regional scan keeps part of its budget for refinement, so even a single
+coarse tile is refined; a scan that refines nothing says why.
+"""
+
+import pytest
+
+from analysis_engine import MineralExplorationAnalyzer
+from backends import LocalRasterBackend
+from benchmarks.synthetic import make_scene
+
+
+@pytest.fixture
+def region():
+    bands, geotransform = make_scene(600, 600)
+    x0, dx, _, y0, _, dy = geotransform
+    analyzer = MineralExplorationAnalyzer(backend=LocalRasterBackend(bands, geotransform))
+    bounds = (x0 + 50 * dx, y0 + 550 * dy, x0 + 550 * dx, y0 + 50 * dy)
+    return analyzer, dict(bounds=bounds, levels=(60, 20), tile_km=10, max_workers=1)
+
+
+def test_single_coarse_tile_is_refined(region):
+    analyzer, params = region
+    scan = analyzer.scan_region(min_score=0, **params)
+
+    assert scan['success']
+    assert scan['warning'] is None
+    metrics = scan['metrics']
+    assert metrics['n_tiles'] == 5 and metrics['n_refined'] == 1
+    assert metrics['pixels_sampled'] <= metrics['budget_pixels']
+
+
+def test_scan_without_refinement_warns(region):
+    analyzer, params = region
+    scan = analyzer.scan_region(min_score=2, **params)
+
+    assert scan['success']
+    assert scan['metrics']['n_refined'] == 0
+    assert 'no tile scored' in scan['warning']
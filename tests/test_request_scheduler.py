@@ -0,0 +1,104 @@
+"""
+RequestScheduler against a stub backend, on a fake clock: token-bucket
+rate limiting, retries of transient failures and pass-through of
+permanent ones.
+"""
+
+import random
+
+import pytest
+
+from request_scheduler import RemoteCallFailed, RequestScheduler
+
+
+class FakeClock:
+    """Monotonic clock advanced only by sleep()."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubBackend:
+    """Records call times; fails with queued errors before succeeding."""
+
+    def __init__(self, clock, errors=()):
+        self.clock = clock
+        self.errors = list(errors)
+        self.calls = []
+
+    def get_info(self, value):
+        self.calls.append(self.clock())
+        if self.errors:
+            raise self.errors.pop(0)
+        return value
+
+
+def make_scheduler(clock, **kwargs):
+    return RequestScheduler(clock=clock, sleep=clock.sleep, rng=random.Random(0), **kwargs)
+
+
+def test_rate_limit_spaces_calls_after_burst():
+    clock = FakeClock()
+    backend = StubBackend(clock)
+    scheduler = make_scheduler(clock, rate_per_s=2, burst=3)
+
+    results = [scheduler.call(backend.get_info, i) for i in range(7)]
+
+    assert results == list(range(7))
+    # The burst goes out at once, then one call every 1 / rate seconds
+    assert backend.calls == pytest.approx([0.0, 0.0, 0.0, 0.5, 1.0, 1.5, 2.0])
+    stats = scheduler.stats()
+    assert stats['throttled'] == 4
+    assert stats['throttle_wait_s'] == pytest.approx(2.0)
+    assert stats['retries'] == 0
+
+
+def test_transient_errors_are_retried_with_bounded_backoff():
+    clock = FakeClock()
+    backend = StubBackend(clock, errors=[Exception('Too many concurrent aggregations'),
+                                         TimeoutError('read timed out')])
+    scheduler = make_scheduler(clock, max_retries=3, base_delay=0.5, max_delay=30.0)
+
+    assert scheduler.call(backend.get_info, 'ok') == 'ok'
+
+    assert len(backend.calls) == 3
+    assert len(clock.sleeps) == 2
+    for attempt, delay in enumerate(clock.sleeps):
+        assert 0 <= delay <= 0.5 * 2 ** attempt
+    stats = scheduler.stats()
+    assert (stats['attempts'], stats['retries'], stats['succeeded'], stats['failed']) == \
+        (3, 2, 1, 0)
+
+
+def test_persistent_transient_error_raises_after_max_retries():
+    clock = FakeClock()
+    backend = StubBackend(clock, errors=[Exception('HTTP 503 Service Unavailable')] * 5)
+    scheduler = make_scheduler(clock, max_retries=2)
+
+    with pytest.raises(RemoteCallFailed):
+        scheduler.call(backend.get_info, 'never')
+
+    assert len(backend.calls) == 3
+    stats = scheduler.stats()
+    assert (stats['retries'], stats['failed']) == (2, 1)
+
+
+def test_permanent_error_is_not_retried():
+    clock = FakeClock()
+    backend = StubBackend(clock, errors=[ValueError('Image.select: band not found')])
+    scheduler = make_scheduler(clock, max_retries=4)
+
+    with pytest.raises(ValueError):
+        scheduler.call(backend.get_info, 'never')
+
+    assert len(backend.calls) == 1
+    assert clock.sleeps == []
+    assert scheduler.stats()['retries'] == 0
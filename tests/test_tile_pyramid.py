@@ -0,0 +1,37 @@
+"""Tile pyramid rendering, reuse and size-bounded LRU eviction."""
+
+import os
+
+import numpy as np
+
+from tile_pyramid import TilePyramid, evict_pyramids
+
+
+def index_layer():
+    values = np.linspace(0, 1, 64 * 64, dtype=np.float32).reshape(64, 64)
+    return {'values': values, 'geotransform': (-71.0, 0.001, 0.0, -30.0, 0.0, -0.001),
+            'range': (0.0, 1.0)}
+
+
+def test_pyramid_is_reused_once_rendered(tmp_path):
+    pyramid = TilePyramid(str(tmp_path), 'a')
+    meta = pyramid.build({'iron_oxide': index_layer()}, zooms=(9, 11))
+
+    assert meta['bytes'] > 0
+    assert TilePyramid(str(tmp_path), 'a').build({'iron_oxide': index_layer()},
+                                                 zooms=(9, 11)) == meta
+
+
+def test_least_recently_used_pyramids_are_evicted(tmp_path):
+    root = str(tmp_path)
+    sizes = {}
+    for name in ('old', 'used', 'new'):
+        sizes[name] = TilePyramid(root, name).build({'iron_oxide': index_layer()},
+                                                    zooms=(9, 11))['bytes']
+    for age, name in enumerate(('new', 'used', 'old')):
+        meta = os.path.join(root, name, 'meta.json')
+        os.utime(meta, (1000 - age, 1000 - age))
+    assert TilePyramid(root, 'used').cached() is not None  # touched: most recent
+
+    assert evict_pyramids(root, max_bytes=sizes['used'] + sizes['new'], keep=['new']) == 1
+    assert sorted(os.listdir(root)) == ['new', 'used']
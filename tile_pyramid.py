@@ -0,0 +1,318 @@
+"""
+Tile Pyramid
+============
+Cached XYZ map tiles of analysis rasters, for web map overlays.
+
+Index rasters (colormapped between robust percentiles) and cluster label
+rasters (colored by cluster priority) are rendered into 256 px Web
+Mercator PNG tiles for a range of zoom levels, and written under
+``<root>/<analysis id>/<layer>/<z>/<x>/<y>.png`` next to a ``meta.json``
+describing the layers. Rendering samples the raster at every tile pixel
+center (nearest neighbour) and encodes PNGs with zlib only, so no imaging
+library is needed. A pyramid whose ``meta.json`` exists is reused as is:
+after the first render, serving tiles costs nothing but reading files.
+The cache root is bounded in size with least-recently-used eviction of
+whole pyramids (like the sample cache).
+"""
+
+import json
+import math
+import os
+import shutil
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from instrumentation import record
+
+
+TILE_SIZE = 256
+
+# Zoom levels rendered (inclusive): regional context down to ~8 m/px
+TILE_ZOOMS = (9, 14)
+
+# Sequential palette of index layers, low to high (RGB anchors)
+INDEX_PALETTE = [(49, 54, 149), (69, 117, 180), (171, 217, 233),
+                 (254, 224, 144), (244, 109, 67), (165, 0, 38)]
+INDEX_ALPHA = 170
+
+# Total size budget of the pyramids under a cache root
+TILE_CACHE_BYTES = 512 * 1024 ** 2
+
+# Cluster layer colors by priority (RGBA, as the map's zone colors)
+PRIORITY_RGBA = {
+    'High': (255, 0, 0, 190),
+    'Medium': (255, 165, 0, 170),
+    'Low': (255, 255, 0, 70)
+}
+
+
+def tile_bounds_range(bounds, zoom):
+    """
+    Tiles covering a (west, south, east, north) box at a zoom level.
+
+    Returns:
+        tuple: (x_min, x_max, y_min, y_max), inclusive
+    """
+    west, south, east, north = bounds
+    n = 2 ** zoom
+
+    def tile_x(lon):
+        return min(n - 1, max(0, int((lon + 180) / 360 * n)))
+
+    def tile_y(lat):
+        lat = max(min(lat, 85.0511), -85.0511)
+        y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+        return min(n - 1, max(0, int(y)))
+
+    return tile_x(west), tile_x(east), tile_y(north), tile_y(south)
+
+
+def tile_pixel_centers(zoom, x, y):
+    """Lon (TILE_SIZE,) and lat (TILE_SIZE,) of the pixel centers of a tile."""
+    n = 2 ** zoom
+    offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lon = (x + offsets) / n * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return lon, lat
+
+
+def raster_bounds(shape, geotransform):
+    """(west, south, east, north) of a north-up raster."""
+    x0, dx, _, y0, _, dy = geotransform
+    xs = (x0, x0 + shape[1] * dx)
+    ys = (y0, y0 + shape[0] * dy)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def sample_tile(values, geotransform, zoom, x, y, fill):
+    """
+    Raster values at every pixel center of a tile (nearest neighbour).
+
+    Returns:
+        np.ndarray: (TILE_SIZE, TILE_SIZE) values, ``fill`` off the raster
+    """
+    x0, dx, _, y0, _, dy = geotransform
+    lon, lat = tile_pixel_centers(zoom, x, y)
+    cols = np.floor((lon - x0) / dx).astype(np.int64)
+    rows = np.floor((lat - y0) / dy).astype(np.int64)
+    col_ok = (cols >= 0) & (cols < values.shape[1])
+    row_ok = (rows >= 0) & (rows < values.shape[0])
+
+    out = np.full((TILE_SIZE, TILE_SIZE), fill, dtype=values.dtype)
+    if col_ok.any() and row_ok.any():
+        out[np.ix_(row_ok, col_ok)] = values[np.ix_(rows[row_ok], cols[col_ok])]
+    return out
+
+
+def index_lut(palette=INDEX_PALETTE, alpha=INDEX_ALPHA):
+    """(256, 4) uint8 lookup table interpolating the palette."""
+    anchors = np.linspace(0, 1, len(palette))
+    steps = np.linspace(0, 1, 256)
+    lut = np.empty((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.round(np.interp(steps, anchors, [c[channel] for c in palette]))
+    lut[:, 3] = alpha
+    return lut
+
+
+def colorize_index(values, value_range, lut):
+    """RGBA tile of index values; NaN is transparent."""
+    vmin, vmax = value_range
+    valid = np.isfinite(values)
+    scaled = np.zeros(values.shape, dtype=np.float32)
+    np.subtract(values, vmin, out=scaled, where=valid)
+    scaled *= 255 / max(vmax - vmin, 1e-12)
+    rgba = lut[np.clip(scaled, 0, 255).astype(np.uint8)]
+    rgba[~valid] = 0
+    return rgba
+
+
+def colorize_labels(labels, palette):
+    """RGBA tile of cluster labels; negative labels are transparent."""
+    palette = np.vstack([palette, np.zeros((1, 4), dtype=np.uint8)])
+    return palette[np.where(labels < 0, len(palette) - 1, labels)]
+
+
+def encode_png(rgba):
+    """Encode an (h, w, 4) uint8 array as an RGBA PNG."""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # filter byte 0 per row
+    raw[:, 1:] = rgba.reshape(height, -1)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + \
+            struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+def robust_range(values, percentiles=(2, 98)):
+    """Color range of an index raster: percentiles of its finite values."""
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return 0.0, 1.0
+    low, high = np.percentile(finite, percentiles)
+    return float(low), float(max(high, low + 1e-6))
+
+
+def _write_atomic(path, data):
+    """Write a file so concurrent readers never see it half written."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+_evict_lock = threading.Lock()
+
+
+def evict_pyramids(root, max_bytes=TILE_CACHE_BYTES, keep=()):
+    """
+    Drop least recently used pyramids under ``root`` until their total
+    size is under ``max_bytes``.
+
+    Only complete pyramids (with a ``meta.json``) are considered; their
+    size is the tile byte count recorded in it and their last use the
+    ``meta.json`` modification time (touched on every cache hit).
+
+    Args:
+        keep (iterable): Analysis ids never evicted (e.g. just rendered)
+
+    Returns:
+        int: Pyramids removed
+    """
+    keep = set(keep)
+    removed = 0
+    with _evict_lock:
+        try:
+            names = os.listdir(root)
+        except OSError:
+            return 0
+        entries = []
+        for name in names:
+            meta_path = os.path.join(root, name, 'meta.json')
+            try:
+                with open(meta_path) as f:
+                    size = int(json.load(f).get('bytes', 0))
+                entries.append((os.stat(meta_path).st_mtime, size, name))
+            except (OSError, ValueError):
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            if name in keep:
+                continue
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            total -= size
+            removed += 1
+    if removed:
+        record('tile_pyramids_evicted', removed)
+    return removed
+
+
+class TilePyramid:
+    """
+    On-disk XYZ tile pyramid of one analysis.
+
+    Args:
+        root (str): Tile cache directory (e.g. a static file root)
+        analysis_id (str): Identifier of the analysis (see analysis_id)
+        max_bytes (int): Size budget of all pyramids under ``root``,
+            enforced after each render (see evict_pyramids)
+    """
+
+    def __init__(self, root, analysis_id, max_bytes=TILE_CACHE_BYTES):
+        self.root = root
+        self.analysis_id = analysis_id
+        self.max_bytes = max_bytes
+        self.path = os.path.join(root, analysis_id)
+
+    def url(self, layer):
+        """Tile URL template of a layer, relative to the cache root."""
+        return f"{self.analysis_id}/{layer}/{{z}}/{{x}}/{{y}}.png"
+
+    def cached(self):
+        """The pyramid's metadata if it has been rendered, else None."""
+        meta_path = os.path.join(self.path, 'meta.json')
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            # Touch the pyramid so it becomes most recently used
+            os.utime(meta_path)
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def build(self, layers, zooms=TILE_ZOOMS, max_workers=4):
+        """
+        Render every tile of the layers (skipped when already cached).
+
+        Args:
+            layers (dict): Layer name -> dict with ``values`` (2D raster),
+                ``geotransform`` and either ``palette`` ((k, 4) uint8 RGBA
+                per label, for integer label rasters) or ``range`` ((vmin,
+                vmax), for float index rasters with NaN as no-data)
+            zooms (tuple): (min_zoom, max_zoom), inclusive
+            max_workers (int): Tiles rendered concurrently
+
+        Returns:
+            dict: analysis_id, zooms, total tile bytes and per-layer url,
+            bounds, tile count and legend (value range or cluster colors)
+        """
+        meta = self.cached()
+        if meta is not None and set(layers) <= set(meta['layers']):
+            record('tile_cache_hits')
+            return meta
+
+        lut = index_lut()
+        jobs = []
+        meta = {'analysis_id': self.analysis_id, 'zooms': list(zooms), 'layers': {}}
+        for name, layer in layers.items():
+            values = layer['values']
+            bounds = raster_bounds(values.shape, layer['geotransform'])
+            tiles = []
+            for zoom in range(zooms[0], zooms[1] + 1):
+                x_min, x_max, y_min, y_max = tile_bounds_range(bounds, zoom)
+                tiles += [(zoom, x, y) for x in range(x_min, x_max + 1)
+                          for y in range(y_min, y_max + 1)]
+            jobs += [(name, layer) + tile for tile in tiles]
+
+            info = {'url': self.url(name), 'bounds': list(bounds), 'tiles': len(tiles)}
+            if 'palette' in layer:
+                info['colors'] = [list(map(int, color)) for color in layer['palette']]
+            else:
+                info['range'] = list(layer['range'])
+            meta['layers'][name] = info
+
+        def render(job):
+            name, layer, zoom, x, y = job
+            if 'palette' in layer:
+                labels = sample_tile(layer['values'], layer['geotransform'], zoom, x, y, -1)
+                rgba = colorize_labels(labels, layer['palette'])
+            else:
+                values = sample_tile(layer['values'], layer['geotransform'], zoom, x, y,
+                                     np.nan)
+                rgba = colorize_index(values, layer['range'], lut)
+            directory = os.path.join(self.path, name, str(zoom), str(x))
+            os.makedirs(directory, exist_ok=True)
+            png = encode_png(rgba)
+            _write_atomic(os.path.join(directory, f"{y}.png"), png)
+            return len(png)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            meta['bytes'] = sum(executor.map(render, jobs))
+
+        # Written last: its presence marks a complete pyramid
+        _write_atomic(os.path.join(self.path, 'meta.json'), json.dumps(meta).encode('utf-8'))
+        record('tiles_rendered', len(jobs))
+        evict_pyramids(self.root, self.max_bytes, keep=[self.analysis_id])
+        return meta